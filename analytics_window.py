@@ -0,0 +1,90 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor, QPalette, QFont
+from inventory_analytics import group_fields
+
+class AnalyticsWindow(QWidget):
+    """Item counts and Cost totals grouped by Funding, Location, Status or
+    Condition, read from the InventoryAnalytics aggregates."""
+
+    headers = ["Value", "Items", "Total Cost", "Average Cost"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.analytics = None
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Inventory Analytics")
+        self.setFixedSize(700, 500)
+
+        # Set default font for the entire widget
+        self.setFont(QFont("Arial", 14))
+
+        # Set background color
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor("#f0f0f0"))
+        self.setPalette(palette)
+
+        layout = QVBoxLayout()
+
+        group_layout = QHBoxLayout()
+        group_layout.addWidget(QLabel("Group by:"))
+        self.group_combo = QComboBox()
+        self.group_combo.addItems(group_fields)
+        self.group_combo.currentIndexChanged.connect(self.refresh)
+        group_layout.addWidget(self.group_combo)
+        layout.addLayout(group_layout)
+
+        self.table = QTableWidget(0, len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh)
+        button_layout.addWidget(refresh_button)
+        back_button = QPushButton("Back")
+        back_button.clicked.connect(self.go_back)
+        button_layout.addWidget(back_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def set_analytics(self, analytics):
+        self.analytics = analytics
+
+    def refresh(self):
+        # The aggregates are kept current, so this only reads them
+        if self.analytics is None or not self.analytics.ready:
+            self.table.setRowCount(0)
+            self.total_label.setText("The inventory is still loading. Try again in a moment.")
+            return
+
+        rows = self.analytics.summary(self.group_combo.currentText())
+        self.table.setRowCount(len(rows))
+        for row, (value, count, total, average) in enumerate(rows):
+            cells = [value or "(none)", str(count), f"${total:,.2f}",
+                     "" if average is None else f"${average:,.2f}"]
+            for column, text in enumerate(cells):
+                cell = QTableWidgetItem(text)
+                if column > 0:
+                    cell.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, cell)
+
+        count, total = self.analytics.totals_overall()
+        self.total_label.setText(f"{count} items, total cost ${total:,.2f}")
+
+    def go_back(self):
+        main_window = self.window()
+        if hasattr(main_window, 'show_home'):
+            main_window.show_home()
+        else:
+            print("Error: MainWindow does not have a show_home method")
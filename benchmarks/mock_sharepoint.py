@@ -0,0 +1,476 @@
+"""A local stand-in for the parts of the SharePoint REST API the app uses:
+list items (paged, filtered, by ID), item updates with ETags, item creates,
+$batch requests of those, list and field metadata, the current user and the
+form digest. Lists are generated in memory at a given size, every response
+can be delayed to imitate network latency, and requests can be throttled as
+SharePoint does."""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from email import message_from_bytes
+from email.message import Message
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+json_content_type = "application/json;odata=verbose;charset=utf-8"
+
+locations = ["Room 101", "Room 102", "Library", "Gym", "Office", "Lab A", "Lab B", "Storage"]
+statuses = ["Active", "Loaned", "Repair", "Retired"]
+conditions = ["New", "Good", "Fair", "Poor"]
+fundings = ["General", "Grant", "PTA", "Donation"]
+kinds = ["Laptop", "Chromebook", "Projector", "Monitor", "Printer", "Tablet", "Camera", "Speaker"]
+
+field_types = {
+    "Title": "Text", "field_1": "Note", "field_2": "Text", "field_3": "Text", "Condition": "Choice",
+    "AssignedTo": "User", "field_4": "DateTime", "field_5": "Currency", "field_6": "Text", "field_7": "Text",
+    "Description": "Note", "Priority": "Choice", "PersonReportingIssue": "User", "InventoryItem": "Lookup",
+    "Status": "Choice", "Created": "DateTime"
+}
+indexed_fields = {"field_2", "field_7"}
+
+def make_inventory(size, seed=1):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    items = []
+    for item_id in range(1, size + 1):
+        kind = rng.choice(kinds)
+        items.append({
+            "ID": item_id,
+            "Title": f"{kind} {item_id}",
+            "field_1": f"{kind} for {rng.choice(locations)}, batch {item_id % 97}",
+            "field_2": f"SN{item_id:07d}",
+            "field_3": rng.choice(locations),
+            "Condition": rng.choice(conditions),
+            "AssignedToId": rng.choice([None, 7, 8, 9, 10]),
+            "field_4": (start + timedelta(days=item_id % 1500)).strftime("%Y-%m-%dT08:00:00Z"),
+            "field_5": round(rng.uniform(20, 2000), 2),
+            "field_6": rng.choice(fundings),
+            "field_7": rng.choice(statuses),
+            "owshiddenversion": 1,
+            "Modified": (start + timedelta(minutes=item_id)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        })
+    return items
+
+def make_tickets(size, inventory_size, seed=2):
+    rng = random.Random(seed)
+    return [{
+        "ID": ticket_id,
+        "Title": f"Ticket {ticket_id}",
+        "Description": "Does not power on",
+        "Priority": rng.choice(["Low", "Medium", "High"]),
+        "PersonReportingIssueId": 7,
+        "InventoryItemId": rng.randint(1, max(inventory_size, 1)),
+        "Status": rng.choice(["Open", "In Progress", "Closed"]),
+        "Created": "2024-01-01T00:00:00Z",
+        "owshiddenversion": 1,
+        "Modified": "2024-01-01T00:00:00Z"
+    } for ticket_id in range(1, size + 1)]
+
+# --- $filter evaluation ---------------------------------------------------
+
+token_pattern = re.compile(r"\s*(datetime'[^']*'|'(?:[^']|'')*'|\(|\)|,|[A-Za-z_][\w/]*|-?\d+(?:\.\d+)?)")
+
+def _tokens(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = token_pattern.match(text, position)
+        if match is None:
+            raise ValueError(f"Bad filter near: {text[position:]}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+def _literal(token):
+    if token.startswith("datetime'"):
+        return token[9:-1]
+    if token.startswith("'"):
+        return token[1:-1].replace("''", "'")
+    try:
+        return float(token) if "." in token else int(token)
+    except ValueError:
+        return ("field", token)
+
+class FilterParser:
+    def __init__(self, text):
+        self.tokens = _tokens(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.peek()}")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == "or":
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_term()]
+        while self.peek() == "and":
+            self.take()
+            nodes.append(self.parse_term())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_term(self):
+        token = self.take()
+        if token == "(":
+            node = self.parse_or()
+            self.take()
+            return node
+        if self.peek() == "(":
+            # substringof('x', Field) or startswith(Field, 'x')
+            self.take()
+            args = [_literal(self.take())]
+            while self.peek() == ",":
+                self.take()
+                args.append(_literal(self.take()))
+            self.take()
+            return (token.lower(), args)
+        op = self.take()
+        return ("cmp", token, op, _literal(self.take()))
+
+def _value(item, operand):
+    if isinstance(operand, tuple):
+        return item.get(operand[1])
+    return operand
+
+def _compare(actual, op, wanted):
+    if actual is None:
+        return op == "ne" if wanted is not None else op == "eq"
+    if isinstance(wanted, str) and isinstance(actual, str):
+        actual, wanted = actual.lower(), wanted.lower()
+    elif isinstance(wanted, (int, float)) and not isinstance(actual, (int, float)):
+        try:
+            actual = float(actual)
+        except (TypeError, ValueError):
+            return False
+    if op == "eq":
+        return actual == wanted
+    if op == "ne":
+        return actual != wanted
+    if op == "gt":
+        return actual > wanted
+    if op == "ge":
+        return actual >= wanted
+    if op == "lt":
+        return actual < wanted
+    if op == "le":
+        return actual <= wanted
+    raise ValueError(f"Unknown operator {op}")
+
+def matches(node, item):
+    kind = node[0]
+    if kind == "and":
+        return all(matches(child, item) for child in node[1])
+    if kind == "or":
+        return any(matches(child, item) for child in node[1])
+    if kind == "cmp":
+        return _compare(item.get(node[1]), node[2], _value(item, node[3]))
+    if kind == "substringof":
+        wanted, actual = (_value(item, arg) for arg in node[1])
+        return actual is not None and str(wanted).lower() in str(actual).lower()
+    if kind == "startswith":
+        actual, wanted = (_value(item, arg) for arg in node[1])
+        return actual is not None and str(actual).lower().startswith(str(wanted).lower())
+    raise ValueError(f"Unsupported filter function {kind}")
+
+def _id_lookup(node):
+    # "ID eq 1 or ID eq 2 ..." -> [1, 2, ...], answered without a scan
+    children = node[1] if node[0] == "or" else [node]
+    if all(child[0] == "cmp" and child[1] == "ID" and child[2] == "eq" for child in children):
+        return [child[3] for child in children]
+    return None
+
+def _after_id(node):
+    # The "ID gt N" keyset condition, so a page starts at N rather than at the top of the list
+    children = node[1] if node[0] == "and" else [node]
+    for child in children:
+        if child[0] == "cmp" and child[1] == "ID" and child[2] == "gt":
+            return child[3]
+    return 0
+
+# --- HTTP ------------------------------------------------------------------
+
+class MockList:
+    def __init__(self, title, items):
+        self.title = title
+        self.items = items
+        self.ids = [item["ID"] for item in items]
+        self.by_id = {item["ID"]: item for item in items}
+        self.lock = threading.Lock()
+
+    def entity_type(self):
+        return f"SP.Data.{self.title}ListItem"
+
+class MockSharePoint:
+    """Serves the lists on 127.0.0.1 at a free port. latency is added to
+    every response, in seconds. With throttle_every, every nth request is
+    refused with 429 and a Retry-After of retry_after seconds."""
+
+    def __init__(self, inventory_size=1000, ticket_count=100, latency=0.0, default_page_size=100,
+                 throttle_every=0, retry_after=1):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self._count_lock = threading.Lock()
+        self.default_page_size = default_page_size
+        self.lists = {
+            "inventory": MockList("Inventory", make_inventory(inventory_size)),
+            "tickets": MockList("Tickets", make_tickets(ticket_count, inventory_size))
+        }
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/sites/Mock"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; with Nagle on, a
+            # kept-alive connection waits out the client's delayed ACK on each
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                mock.handle(self, "GET")
+
+            def do_POST(self):
+                mock.handle(self, "POST")
+
+        return Handler
+
+    def handle(self, request, method):
+        with self._count_lock:
+            self.requests += 1
+            throttled = self.throttle_every and self.requests % self.throttle_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            status, body, headers = 429, {"error": {"message": {"value": "Too many requests"}}}, {"Retry-After": str(self.retry_after)}
+            # The request body still has to be read off the connection
+            request.rfile.read(int(request.headers.get("Content-Length") or 0))
+        else:
+            status, body, headers = self._respond(request, method)
+
+        # A $batch answer is already encoded, with its own Content-Type
+        if isinstance(body, bytes):
+            payload = body
+        else:
+            payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        headers = dict({"Content-Type": json_content_type}, **headers)
+        request.send_response(status)
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def _respond(self, request, method):
+        length = int(request.headers.get("Content-Length") or 0)
+        raw = request.rfile.read(length) if length else b""
+        if method == "POST" and urlsplit(request.path).path.lower().endswith("/_api/$batch"):
+            return self.batch(raw, request.headers)
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError as e:
+            return 400, {"error": {"message": {"value": str(e)}}}, {}
+        return self._route_or_error(method, request.path, body, request.headers)
+
+    def _route_or_error(self, method, target, body, headers):
+        try:
+            return self.route(method, target, body, headers)
+        except KeyError as e:
+            return 404, {"error": {"message": {"value": f"Not found: {e}"}}}, {}
+        except ValueError as e:
+            return 400, {"error": {"message": {"value": str(e)}}}, {}
+
+    def batch(self, raw, headers):
+        """Answer an OData v3 $batch: each application/http part, including
+        those inside a changeset, is routed as its own request and answered
+        in order, flat, as the SDK reads the response."""
+        message = message_from_bytes(f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode("ascii") + raw)
+        if not message.is_multipart():
+            return 400, {"error": {"message": {"value": "Expected a multipart/mixed batch"}}}, {}
+
+        boundary = f"batchresponse_{uuid.uuid4()}"
+        parts = []
+        for part in message.walk():
+            if part.get_content_type() != "application/http":
+                continue
+            # The SDK's parts come back from the email package with bare \n line ends
+            text = part.get_payload(decode=True).decode("utf-8").replace("\r\n", "\n")
+            head, _, body = text.strip().partition("\n\n")
+            lines = head.split("\n")
+            method, target, _ = lines[0].split(" ", 2)
+            sub_headers = Message()
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                sub_headers[name.strip()] = value.strip()
+            try:
+                sub_body = json.loads(body) if body.strip() else {}
+            except ValueError as e:
+                status, answer, answer_headers = 400, {"error": {"message": {"value": str(e)}}}, {}
+            else:
+                status, answer, answer_headers = self._route_or_error(method.upper(), target, sub_body, sub_headers)
+
+            answer_headers = dict({"Content-Type": json_content_type}, **answer_headers)
+            response = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+            response += [f"{name}: {value}" for name, value in answer_headers.items()]
+            # The SDK takes the last line of a part as its body, so the JSON stays on one line
+            response += ["", json.dumps(answer) if answer is not None else ""]
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-Transfer-Encoding: binary\r\n\r\n" + "\r\n".join(response) + "\r\n")
+        payload = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        return 200, payload, {"Content-Type": f"multipart/mixed; boundary={boundary}"}
+
+    def route(self, method, target, body, headers):
+        parts = urlsplit(target)
+        path = unquote(parts.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        lower = path.lower()
+
+        if lower.endswith("/_api/contextinfo"):
+            return 200, {"d": {"GetContextWebInformation": {
+                "FormDigestValue": "mock-digest", "FormDigestTimeoutSeconds": 1800,
+                "LibraryVersion": "16.0", "SiteFullUrl": self.url, "WebFullUrl": self.url}}}, {}
+        if lower.endswith("/_api/web/currentuser"):
+            return 200, {"d": {"Id": 7, "Title": "Benchmark User", "Email": "bench@example.org",
+                               "LoginName": "i:0#.f|membership|bench@example.org"}}, {}
+        if lower.endswith("/_api/web"):
+            return 200, {"d": {"Title": "Mock", "Url": self.url}}, {}
+
+        match = re.search(r"/lists/getbytitle\('((?:[^']|'')+)'\)(/items(?:\((\d+)\)|/getbyid\((\d+)\))?|/fields)?(/parentlist)?$", path, re.I)
+        if match is None:
+            raise KeyError(path)
+        target = self.lists[match.group(1).replace("''", "'").lower()]
+        section = (match.group(2) or "").lower()
+
+        if section == "" or match.group(5):
+            return 200, {"d": {"Id": target.title, "Title": target.title, "ItemCount": len(target.items),
+                               "ListItemEntityTypeFullName": target.entity_type()}}, {}
+        if section == "/fields":
+            return 200, self.fields(target, query), {}
+        if match.group(3) or match.group(4):
+            item_id = int(match.group(3) or match.group(4))
+            # Updates are POSTed with X-HTTP-Method: MERGE, which a $batch part carries as its method
+            if method in ("POST", "MERGE"):
+                return self.update(target, item_id, body, headers)
+            item = target.by_id[item_id]
+            return 200, {"d": self.entity(target, item, query)}, {"ETag": f'"{item["owshiddenversion"]}"'}
+        if method == "POST":
+            return self.create(target, body)
+        return 200, self.collection(target, query), {}
+
+    def entity(self, target, item, query):
+        selected = query.get("$select")
+        if selected and "*" not in selected:
+            names = [name.strip() for name in selected.split(",")]
+            item = {name: item.get(name) for name in names}
+        entity = dict(item)
+        entity["__metadata"] = {"type": target.entity_type(), "etag": f'"{item.get("owshiddenversion", 1)}"'}
+        return entity
+
+    def collection(self, target, query):
+        top = int(query.get("$top", self.default_page_size))
+        node = FilterParser(query["$filter"]).parse() if query.get("$filter") else None
+        skip_after = 0
+        token = query.get("$skiptoken")
+        if token:
+            skip_after = int(re.search(r"p_ID=(\d+)", unquote(token)).group(1))
+
+        results = []
+        if node is not None and _id_lookup(node) is not None:
+            wanted = sorted(item_id for item_id in _id_lookup(node) if item_id > skip_after)
+            candidates = (target.by_id[item_id] for item_id in wanted if item_id in target.by_id)
+        else:
+            start = bisect_right(target.ids, max(skip_after, _after_id(node) if node is not None else 0))
+            candidates = (target.items[i] for i in range(start, len(target.items)))
+        for item in candidates:
+            if node is None or matches(node, item):
+                results.append(item)
+                if len(results) > top:
+                    break
+
+        body = {"results": [self.entity(target, item, query) for item in results[:top]]}
+        if len(results) > top and "$top" not in query:
+            # Only unbounded reads page on; an explicit $top is the whole answer
+            next_query = dict(query)
+            next_query["$skiptoken"] = f"Paged=TRUE&p_ID={results[top - 1]['ID']}"
+            encoded = "&".join(f"{key}={quote(str(value), safe='')}" for key, value in next_query.items())
+            body["__next"] = f"{self.url}/_api/Web/lists/GetByTitle('{target.title}')/items?{encoded}"
+        return {"d": body}
+
+    def fields(self, target, query):
+        node = FilterParser(query["$filter"]).parse() if query.get("$filter") else None
+        fields = [{"InternalName": name, "TypeAsString": field_type, "Indexed": name in indexed_fields}
+                  for name, field_type in field_types.items()]
+        return {"d": {"results": [field for field in fields if node is None or matches(node, field)]}}
+
+    def _properties(self, body):
+        return {key: value for key, value in body.items() if key != "__metadata"}
+
+    def update(self, target, item_id, body, headers):
+        with target.lock:
+            item = target.by_id[item_id]
+            if_match = headers.get("IF-MATCH")
+            if if_match and if_match != "*" and if_match != f'"{item["owshiddenversion"]}"':
+                return 412, {"error": {"code": "-2130575305", "message": {"value": "Version conflict."}}}, {}
+            item.update(self._properties(body))
+            item["owshiddenversion"] += 1
+            item["Modified"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+            return 204, None, {"ETag": f'"{item["owshiddenversion"]}"'}
+
+    def create(self, target, body):
+        with target.lock:
+            item = self._properties(body)
+            item["ID"] = (target.ids[-1] if target.ids else 0) + 1
+            item["owshiddenversion"] = 1
+            item["Modified"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+            target.items.append(item)
+            target.ids.append(item["ID"])
+            target.by_id[item["ID"]] = item
+            return 201, {"d": self.entity(target, item, {})}, {}
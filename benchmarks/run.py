@@ -0,0 +1,275 @@
+"""Time the SharePoint data paths against the local stand-in server.
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --latency 20
+
+Each run is appended to benchmarks/results/history.jsonl with the commit it
+ran on, and compared with the last run of the same sizes and latency. A case
+whose median got slower than the threshold is reported, and the exit status
+is 1 so a script can stop on it."""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from office365.runtime.auth.authentication_context import AuthenticationContext
+from benchmarks.mock_sharepoint import MockSharePoint
+from list_schema import inventory_schema
+from odata_filter import eq
+from sharepoint_session import ScheduledClientContext, _count_response
+import sharepoint_utils
+
+# Items per bulk update / bulk create case
+bulk_size = 100
+
+results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+history_path = os.path.join(results_dir, "history.jsonl")
+
+class BenchmarkToken:
+    # The SDK only reads these two attributes off a token
+    tokenType = "Bearer"
+    accessToken = "benchmark"
+
+class BenchmarkSession:
+    """Stands in for SharePointSession: one ClientContext per thread on the
+    mock site, with a fixed bearer token instead of a sign-in."""
+
+    def __init__(self, site_url):
+        self.site_url = site_url
+        self.username = "bench@example.org"
+        self.current_user = None
+        self._auth_context = AuthenticationContext(site_url)
+        self._auth_context.with_access_token(lambda: BenchmarkToken())
+        self._local = threading.local()
+
+    def discard_context(self):
+        self._local.ctx = None
+
+    def context(self):
+        if getattr(self._local, "ctx", None) is None:
+            self._local.ctx = ScheduledClientContext(self.site_url, self._auth_context)
+            self._local.ctx.pending_request().afterExecute += _count_response
+        return self._local.ctx
+
+def measure(fn, repeat, setup=None):
+    # One untimed warm-up call, then repeat timed ones; seconds per call
+    if setup is not None:
+        setup()
+    fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "repeat": repeat
+    }
+
+def sharepoint_cases(session, size):
+    list_name = sharepoint_utils.inventory_list_name
+    page_size = 100
+    later_page = min(10, max(size // page_size, 1))
+    middle_id = max(size // 2, 1)
+    state = {"etag": sharepoint_utils.get_sharepoint_item(session, list_name, middle_id)["ETag"]}
+
+    def first_page():
+        sharepoint_utils.get_sharepoint_list_items(session, list_name, page_size=page_size, page_number=1)
+
+    def later_page_fetch():
+        sharepoint_utils.get_sharepoint_list_items(session, list_name, page_size=page_size, page_number=later_page)
+
+    def indexed_search():
+        query = eq("S/N", f"SN{middle_id:07d}")
+        sharepoint_utils.get_sharepoint_list_items(session, list_name, page_size=page_size, query=query)
+
+    def contains_search():
+        sharepoint_utils.get_sharepoint_list_items(session, list_name, page_size=page_size,
+                                                   field="Location", value="Lab")
+
+    def get_item():
+        sharepoint_utils.get_sharepoint_item(session, list_name, middle_id)
+
+    def update_item():
+        state["etag"] = sharepoint_utils.update_sharepoint_item(
+            session, list_name, middle_id, {"Location": "Library"}, etag=state["etag"])
+
+    def add_issue():
+        sharepoint_utils.add_issue_to_sharepoint(session, "Tickets", "Benchmark issue", "Does not power on",
+                                                 "Medium", 7, item_id=middle_id)
+
+    # Bulk edit and scan audits write through update_sharepoint_items, imports
+    # through add_sharepoint_items; both go out as $batch requests
+    bulk_ids = range(1, min(size, bulk_size) + 1)
+
+    def update_items():
+        state["bulk"] = state.get("bulk", 0) + 1
+        errors = sharepoint_utils.update_sharepoint_items(
+            session, list_name, {item_id: {"Location": f"Audit {state['bulk']}"} for item_id in bulk_ids})
+        if errors:
+            raise RuntimeError(f"{len(errors)} bulk updates failed")
+
+    def add_items():
+        state["added"] = state.get("added", 0) + 1
+        items = [{"Item": "Benchmark item", "S/N": f"BENCH{state['added']:04d}-{i:03d}"} for i in range(bulk_size)]
+        results = sharepoint_utils.add_sharepoint_items(session, list_name, items, unique_field="S/N")
+        if any(result is not None for result in results):
+            raise RuntimeError("Bulk create failed")
+
+    return [
+        ("list_first_page", first_page, None),
+        # Page 1 resets the cursors, so each timed call walks forward again
+        (f"list_page_{later_page}", later_page_fetch, first_page),
+        ("search_indexed", indexed_search, None),
+        ("search_contains", contains_search, None),
+        ("get_item", get_item, None),
+        ("update_item", update_item, None),
+        ("add_issue", add_issue, None),
+        (f"update_items_{len(bulk_ids)}", update_items, None),
+        (f"add_items_{bulk_size}", add_items, None)
+    ]
+
+def render_case(session, size, repeat):
+    """Time appending rows to the inventory table model and painting the
+    view under the offscreen platform. Returns None without PyQt6."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication, QTableView
+        from inventory_model import InventoryTableModel
+    except ImportError:
+        return None
+
+    app = QApplication.instance() or QApplication([])
+    items = []
+    for page in sharepoint_utils.iter_sharepoint_list_items(session, sharepoint_utils.inventory_list_name):
+        items.extend(page)
+        if len(items) >= min(size, 10000):
+            break
+
+    view = QTableView()
+    view.resize(1200, 800)
+    view.show()
+
+    def render():
+        model = InventoryTableModel(inventory_schema.listed_names)
+        view.setModel(model)
+        for start in range(0, len(items), 100):
+            model.append_page(items[start:start + 100], start + 100 < len(items))
+        view.viewport().repaint()
+        app.processEvents()
+
+    result = measure(render, repeat)
+    result["rows"] = len(items)
+    view.close()
+    return result
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(results_dir)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes, latency, repeat, with_qt=True, throttle_every=0, retry_after=1):
+    results = {}
+    for size in sizes:
+        with MockSharePoint(inventory_size=size, ticket_count=max(size // 10, 1), latency=latency,
+                            throttle_every=throttle_every, retry_after=retry_after) as mock:
+            session = BenchmarkSession(mock.url)
+            # Index flags as the app would have them after its first schema refresh
+            metadata = sharepoint_utils.get_list_field_metadata(
+                session, sharepoint_utils.inventory_list_name, [field.internal_name for field in inventory_schema.fields])
+            inventory_schema.apply_metadata(metadata)
+
+            for name, fn, setup in sharepoint_cases(session, size):
+                results[f"{name}@{size}"] = measure(fn, repeat, setup)
+                print(f"{name}@{size}: {results[f'{name}@{size}']['median_ms']:.1f} ms")
+            if with_qt:
+                rendered = render_case(session, size, repeat)
+                if rendered is not None:
+                    results[f"render_table@{size}"] = rendered
+                    print(f"render_table@{size}: {rendered['median_ms']:.1f} ms ({rendered['rows']} rows)")
+    return results
+
+def previous_run(config):
+    try:
+        with open(history_path) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return None
+    matching = [entry for entry in runs if entry.get("config") == config]
+    return matching[-1] if matching else None
+
+def regressions(results, baseline, threshold, floor_ms=1.0):
+    # Cases whose median grew by more than threshold (and by more than floor_ms, to ignore noise on tiny timings)
+    slower = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        after_ms, before_ms = result["median_ms"], before["median_ms"]
+        if after_ms > before_ms * (1 + threshold) and after_ms - before_ms > floor_ms:
+            slower.append((name, before_ms, after_ms))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SharePoint data paths against a local mock server.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated Inventory list sizes")
+    parser.add_argument("--latency", type=float, default=0, help="Added latency per request, in ms")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every nth request with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with a 429, in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per case")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--no-qt", action="store_true", help="Skip the table rendering case")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the history")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    config = {"sizes": sizes, "latency_ms": args.latency, "repeat": args.repeat}
+    if args.throttle_every:
+        config["throttle_every"] = args.throttle_every
+        config["retry_after"] = args.retry_after
+
+    results = run(sizes, args.latency / 1000, args.repeat, with_qt=not args.no_qt,
+                  throttle_every=args.throttle_every, retry_after=args.retry_after)
+    entry = {
+        "commit": current_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "config": config,
+        "results": results
+    }
+
+    baseline = previous_run(config)
+    if not args.no_save:
+        os.makedirs(results_dir, exist_ok=True)
+        with open(history_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    if baseline is None:
+        print("No earlier run with these settings to compare with.")
+        return 0
+    slower = regressions(results, baseline, args.threshold)
+    for name, before_ms, after_ms in slower:
+        print(f"REGRESSION {name}: {before_ms:.1f} ms -> {after_ms:.1f} ms (vs {baseline['commit']})")
+    if not slower:
+        print(f"No regressions against {baseline['commit']} ({baseline['created']}).")
+    return 1 if slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
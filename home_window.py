@@ -6,6 +6,9 @@ class HomeWindow(QWidget):
     show_inventory_requested = pyqtSignal()
     show_submit_ticket_requested = pyqtSignal()
     show_item_dashboard_requested = pyqtSignal()
+    show_tickets_requested = pyqtSignal()
+    show_analytics_requested = pyqtSignal()
+    show_scan_requested = pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -14,7 +17,7 @@ class HomeWindow(QWidget):
     def init_ui(self):
         # Set window title and size
         self.setWindowTitle("Home Window")
-        self.setFixedSize(450, 300)
+        self.setFixedSize(450, 400)
 
         # Set default font for the entire widget
         self.setFont(QFont("Arial", 16))
@@ -35,10 +38,22 @@ class HomeWindow(QWidget):
         item_dashboard_button.clicked.connect(self.show_item_dashboard_requested.emit)
         layout.addWidget(item_dashboard_button)
 
+        scan_button = QPushButton("Scan Mode")
+        scan_button.clicked.connect(self.show_scan_requested.emit)
+        layout.addWidget(scan_button)
+
         inventory_button = QPushButton("Inventory List")
         inventory_button.clicked.connect(self.show_inventory_requested.emit)
         layout.addWidget(inventory_button)
 
+        tickets_button = QPushButton("Tickets")
+        tickets_button.clicked.connect(self.show_tickets_requested.emit)
+        layout.addWidget(tickets_button)
+
+        analytics_button = QPushButton("Analytics")
+        analytics_button.clicked.connect(self.show_analytics_requested.emit)
+        layout.addWidget(analytics_button)
+
 
         self.setLayout(layout)
 
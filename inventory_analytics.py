@@ -0,0 +1,150 @@
+import logging
+import math
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Columns the aggregates are grouped by, and the column they total
+group_fields = ("Funding", "Location", "Status", "Condition")
+value_field = "Cost"
+
+def _cost(value):
+    if value in ("", None):
+        return math.nan
+    try:
+        return float(str(value).strip().replace("$", "").replace(",", ""))
+    except ValueError:
+        return math.nan
+
+def _group_value(value):
+    return "" if value is None else str(value).strip()
+
+class InventoryAnalytics:
+    """The inventory's Cost and group columns held as NumPy arrays: costs as
+    floats (NaN when empty) and each group column as integer codes into its
+    distinct values. Item counts and Cost totals per value are computed with
+    bincount when built, then adjusted row by row as items change, so a
+    summary never has to look at the rows again.
+
+    Attach it to the search index with watch(), which builds it and then
+    passes on every change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self.rows = {}  # item ID -> row
+        self.size = 0
+        self.cost = np.full(capacity, math.nan)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.codes = {field: np.zeros(capacity, dtype=np.int32) for field in group_fields}
+        self.values = {field: [] for field in group_fields}
+        self.value_codes = {field: {} for field in group_fields}
+        # Per group value: items, items with a cost, and the Cost total
+        self.counts = {field: np.zeros(0, dtype=np.int64) for field in group_fields}
+        self.costed = {field: np.zeros(0, dtype=np.int64) for field in group_fields}
+        self.totals = {field: np.zeros(0) for field in group_fields}
+
+    def _code(self, field, value):
+        value = _group_value(value)
+        code = self.value_codes[field].get(value)
+        if code is None:
+            code = self.value_codes[field][value] = len(self.values[field])
+            self.values[field].append(value)
+            # Aggregates built by bincount are sized to the values seen so far
+            if len(self.counts[field]) <= code:
+                self.counts[field] = np.append(self.counts[field], 0)
+                self.costed[field] = np.append(self.costed[field], 0)
+                self.totals[field] = np.append(self.totals[field], 0.0)
+        return code
+
+    def build(self, items):
+        with self._lock:
+            self._reset(len(items))
+            for row, item in enumerate(items):
+                self.rows[int(item["ID"])] = row
+                self.cost[row] = _cost(item.get(value_field))
+                for field in group_fields:
+                    self.codes[field][row] = self._code(field, item.get(field))
+            self.size = len(items)
+            self.live[:self.size] = True
+
+            has_cost = ~np.isnan(self.cost)
+            cost = np.where(has_cost, self.cost, 0.0)
+            for field in group_fields:
+                codes = self.codes[field]
+                width = len(self.values[field])
+                self.counts[field] = np.bincount(codes, minlength=width).astype(np.int64)
+                self.costed[field] = np.bincount(codes, weights=has_cost, minlength=width).astype(np.int64)
+                self.totals[field] = np.bincount(codes, weights=cost, minlength=width)
+            self.ready = True
+        logger.debug(f"Analytics built over {len(items)} items")
+
+    def _grow(self):
+        # Double the row arrays when an added item doesn't fit
+        capacity = max(len(self.cost) * 2, 64)
+        self.cost = np.concatenate([self.cost, np.full(capacity - len(self.cost), math.nan)])
+        self.live = np.concatenate([self.live, np.zeros(capacity - len(self.live), dtype=bool)])
+        for field in group_fields:
+            codes = self.codes[field]
+            self.codes[field] = np.concatenate([codes, np.zeros(capacity - len(codes), dtype=np.int32)])
+
+    def _apply(self, row, sign):
+        cost = self.cost[row]
+        for field in group_fields:
+            code = self.codes[field][row]
+            self.counts[field][code] += sign
+            if not math.isnan(cost):
+                self.costed[field][code] += sign
+                self.totals[field][code] += sign * cost
+
+    def update(self, items, deleted_ids=()):
+        with self._lock:
+            if not self.ready:
+                return
+            for item_id in deleted_ids:
+                row = self.rows.pop(int(item_id), None)
+                if row is not None:
+                    self._apply(row, -1)
+                    self.live[row] = False
+            for item in items:
+                item_id = int(item["ID"])
+                row = self.rows.get(item_id)
+                if row is not None:
+                    self._apply(row, -1)
+                else:
+                    if self.size == len(self.cost):
+                        self._grow()
+                    row = self.rows[item_id] = self.size
+                    self.size += 1
+                self.cost[row] = _cost(item.get(value_field))
+                for field in group_fields:
+                    self.codes[field][row] = self._code(field, item.get(field))
+                self.live[row] = True
+                self._apply(row, 1)
+
+    def summary(self, field):
+        """[(value, items, total cost, average cost or None)] for one group
+        field, largest total first."""
+        with self._lock:
+            counts = self.counts[field].copy()
+            costed = self.costed[field].copy()
+            totals = self.totals[field].copy()
+            values = list(self.values[field])
+
+        present = np.flatnonzero(counts > 0)
+        averages = np.divide(totals, costed, out=np.full(len(totals), math.nan), where=costed > 0)
+        order = present[np.lexsort((-counts[present], -totals[present]))]
+        return [(values[code], int(counts[code]), round(float(totals[code]), 2),
+                 None if math.isnan(averages[code]) else round(float(averages[code]), 2))
+                for code in order]
+
+    def totals_overall(self):
+        # (items, total cost)
+        with self._lock:
+            live = self.live[:self.size]
+            cost = self.cost[:self.size][live]
+            return int(live.sum()), round(float(np.nansum(cost)), 2)
@@ -0,0 +1,159 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from list_schema import inventory_schema
+
+logger = logging.getLogger(__name__)
+
+cache_dir = os.path.join(os.path.expanduser("~"), ".advtechhelp")
+cache_path = os.path.join(cache_dir, "inventory_cache.sqlite3")
+schema_path = os.path.join(cache_dir, "inventory_schema.json")
+
+# Display name -> cache column
+columns = {field.display_name: field.cache_column for field in inventory_schema.fields}
+columns["ETag"] = "etag"
+
+class InventoryCache:
+    """On-disk copy of the Inventory list, kept current by delta syncs so the
+    inventory screen can render without waiting on SharePoint."""
+
+    def __init__(self, path=cache_path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            column_defs = ", ".join(f"{column} TEXT" for column in columns.values())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, {column_defs})")
+            # Caches written by older versions may lack newer columns
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(items)")}
+            for column in columns.values():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE items ADD COLUMN {column} TEXT")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call keeps the cache usable from sync threads
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def is_empty(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+    def get_state(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _row_to_item(self, row):
+        # Typed as the server's rows are (Decimal, date, user ID), so sorting,
+        # export and analytics see the same values whichever source answered
+        decoders = inventory_schema.display_decoders
+        item = {"ID": row[0], "Item ID": row[0]}
+        for display_name, value in zip(columns, row[1:]):
+            if display_name in decoders:
+                item[display_name] = decoders[display_name](value)
+            else:
+                item[display_name] = "" if value is None else value
+        return item
+
+    def get_item(self, item_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT id, {', '.join(columns.values())} FROM items WHERE id = ?",
+                               (int(item_id),)).fetchone()
+        return self._row_to_item(row) if row else None
+
+    def get_all_items(self):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(columns.values())} FROM items ORDER BY id").fetchall()
+        return [self._row_to_item(row) for row in rows]
+
+    def get_page(self, page_size=100, page_number=1, field=None, value=None):
+        where = ""
+        params = []
+        if field and value and field in columns:
+            where = f"WHERE {columns[field]} LIKE ?"
+            params.append(f"%{value}%")
+
+        with self._connect() as conn:
+            total_items_count = conn.execute(f"SELECT COUNT(*) FROM items {where}", params).fetchone()[0]
+            total_pages = max((total_items_count + page_size - 1) // page_size, 1)
+            page_number = min(max(page_number, 1), total_pages)
+            rows = conn.execute(
+                f"SELECT id, {', '.join(columns.values())} FROM items {where} ORDER BY id LIMIT ? OFFSET ?",
+                params + [page_size, (page_number - 1) * page_size]
+            ).fetchall()
+
+        items = [self._row_to_item(row) for row in rows]
+        return items, page_number < total_pages, page_number, total_pages
+
+    def _to_row(self, item):
+        return [int(item["ID"])] + [None if item.get(name) is None else str(item.get(name)) for name in columns]
+
+    def upsert_items(self, items):
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO items (id, {', '.join(columns.values())}) VALUES ({placeholders})",
+                             [self._to_row(item) for item in items])
+
+    def store_items(self, items):
+        # Upserts items and returns them as cache rows, the shape get_item gives
+        rows = [self._to_row(item) for item in items]
+        self.upsert_items(items)
+        return [self._row_to_item(row) for row in rows]
+
+    def update_fields(self, item_id, properties):
+        item = self.get_item(item_id)
+        if item is not None:
+            item.update(properties)
+            self.upsert_items([item])
+
+    def apply_changes(self, changed_items, current_ids, modified):
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        rows = [self._to_row(item) for item in changed_items]
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO items (id, {', '.join(columns.values())}) VALUES ({placeholders})", rows)
+
+            cached_ids = {row[0] for row in conn.execute("SELECT id FROM items")}
+            deleted_ids = cached_ids - {int(item_id) for item_id in current_ids}
+            conn.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in deleted_ids])
+
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('modified', ?)", (modified,))
+        logger.debug(f"Cache sync: {len(rows)} changed, {len(deleted_ids)} deleted")
+        # Returned as cache rows so callers see the same shape get_item gives
+        return [self._row_to_item(row) for row in rows], sorted(deleted_ids)
+
+    def sync(self, session, list_name="Inventory"):
+        from sharepoint_utils import get_sharepoint_list_changes
+        modified_since = self.get_state("modified")
+        changed_items, current_ids, modified = get_sharepoint_list_changes(session, list_name, modified_since)
+        return self.apply_changes(changed_items, current_ids, modified)
+
+def store_reloaded_items(item_ids, items, cache=None, search_index=None, item_cache=None):
+    """Put items read back after a bulk write into every local copy, so each
+    carries its new version. With items None (the read back failed) the
+    memoized copies are dropped instead, and the dashboard fetches them
+    again when they are opened."""
+    if items is None:
+        if item_cache is not None:
+            item_cache.invalidate(item_ids)
+        return
+    if cache is not None:
+        items = cache.store_items(items)
+    if search_index is not None:
+        search_index.update(items)
+    if item_cache is not None:
+        item_cache.put_many(items)
@@ -0,0 +1,126 @@
+import argparse
+import csv
+import getpass
+import logging
+import os
+from sharepoint_utils import iter_sharepoint_list_items, open_sharepoint_session
+from list_schema import inventory_schema
+from odata_filter import eq, all_of
+
+logger = logging.getLogger(__name__)
+
+export_columns = ["ID"] + inventory_schema.display_names
+
+class ExportError(ValueError):
+    pass
+
+class CsvRowWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write_page(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetRowWriter:
+    """Writes each page as its own row group, so only one page is in memory."""
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Writing .parquet files requires the pyarrow package.")
+        self.pa = pyarrow
+        self.columns = columns
+        types = {"ID": pyarrow.int64(), "Cost": pyarrow.float64()}
+        self.schema = pyarrow.schema([(column, types.get(column, pyarrow.string())) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def _value(self, column, value):
+        if value in ("", None):
+            return None
+        if column == "ID":
+            return int(value)
+        if column == "Cost":
+            return float(value)
+        return str(value)
+
+    def write_page(self, rows):
+        arrays = [
+            self.pa.array([self._value(column, row.get(column)) for row in rows], type=self.schema.field(column).type)
+            for column in self.columns
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def export_inventory(session, path, columns=None, field=None, value=None, filters=None,
+                     list_name="Inventory", page_size=500, progress=None):
+    """Stream the list to a .csv or .parquet file page by page. field/value is
+    the same server-side "contains" search the inventory screen uses; filters
+    maps column -> exact value; indexed columns are filtered by SharePoint,
+    the rest on each page as it arrives.
+    Returns the number of rows written."""
+    columns = columns or export_columns
+    unknown = [column for column in columns if column not in export_columns]
+    if unknown:
+        raise ExportError(f"Unknown columns: {', '.join(unknown)}")
+    filters = filters or {}
+    unknown = [column for column in filters if column not in export_columns]
+    if unknown:
+        raise ExportError(f"Unknown filter columns: {', '.join(unknown)}")
+    query = all_of(*(eq(column, wanted) for column, wanted in filters.items())) if filters else None
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        writer = CsvRowWriter(path, columns)
+    elif extension == ".parquet":
+        writer = ParquetRowWriter(path, columns)
+    else:
+        raise ExportError(f"Unsupported export type: {extension}")
+
+    written = 0
+    try:
+        for rows in iter_sharepoint_list_items(session, list_name, page_size=page_size, field=field, value=value, query=query):
+            if rows:
+                writer.write_page(rows)
+                written += len(rows)
+            if progress is not None:
+                progress(written)
+    finally:
+        writer.close()
+
+    logger.info(f"Exported {written} rows from {list_name} to {path}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Inventory list to CSV or Parquet.")
+    parser.add_argument("output", help="Output file, .csv or .parquet")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--columns", help="Comma-separated columns to export (default: all)")
+    parser.add_argument("--search", nargs=2, metavar=("FIELD", "VALUE"), help="Only rows whose FIELD contains VALUE")
+    parser.add_argument("--where", action="append", default=[], metavar="COLUMN=VALUE",
+                        help="Only rows where COLUMN equals VALUE; may be repeated")
+    args = parser.parse_args()
+
+    filters = {}
+    for condition in args.where:
+        column, _, wanted = condition.partition("=")
+        filters[column.strip()] = wanted.strip()
+    columns = [column.strip() for column in args.columns.split(",")] if args.columns else None
+    field, value = args.search if args.search else (None, None)
+
+    session = open_sharepoint_session(args.username, getpass.getpass("Password: "))
+    count = export_inventory(session, args.output, columns=columns, field=field, value=value, filters=filters,
+                             progress=lambda written: print(f"\r{written} rows", end="", flush=True))
+    print(f"\rExported {count} rows to {args.output}")
+
+if __name__ == '__main__':
+    main()
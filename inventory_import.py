@@ -0,0 +1,223 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, date
+from sharepoint_utils import add_sharepoint_items, existing_serials as server_serials
+from list_schema import inventory_schema
+from inventory_cache import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Spreadsheet headers accepted for each inventory field: the display name,
+# the SharePoint internal name or one of these, compared case-insensitively
+extra_aliases = {
+    "S/N": ("sn", "serial", "serial number"),
+    "Assigned To": ("assigned to", "assignedtoid")
+}
+column_aliases = {
+    field.display_name: (field.display_name.lower(), field.internal_name.lower()) + extra_aliases.get(field.display_name, ())
+    for field in inventory_schema.fields
+}
+
+date_formats = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%Y/%m/%d")
+
+class ImportFileError(ValueError):
+    pass
+
+def read_rows(path):
+    """Yield each data row of a CSV or XLSX file as a header -> value dict,
+    reading the file incrementally."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    elif extension in (".xlsx", ".xlsm"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFileError("Reading .xlsx files requires the openpyxl package.")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [str(header or "").strip() for header in next(rows, [])]
+            for row in rows:
+                yield dict(zip(headers, row))
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError(f"Unsupported file type: {extension}")
+
+def map_columns(headers):
+    column_map = {}
+    for header in headers:
+        key = str(header or "").strip().lower()
+        for display_name, aliases in column_aliases.items():
+            if key in aliases:
+                column_map[header] = display_name
+    if "Item" not in column_map.values():
+        raise ImportFileError("The file needs an Item (or Title) column.")
+    return column_map
+
+def coerce_row(row, column_map, user_directory=None):
+    # Same encodings update_sharepoint_item expects: Cost as a number,
+    # Date as yyyy-MM-dd and Assigned To as a user ID, looked up in
+    # user_directory when it is a name or email
+    item = {}
+    for header, display_name in column_map.items():
+        value = row.get(header)
+        if value is None:
+            continue
+        if display_name == "Cost":
+            if isinstance(value, str):
+                value = re.sub(r"[$,\s]", "", value)
+            if value in ("", None):
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                raise ImportFileError(f"Cost '{row.get(header)}' is not a number")
+        elif display_name == "Date":
+            value = _coerce_date(value)
+            if value is None:
+                continue
+        elif display_name == "Assigned To":
+            value = str(value).strip()
+            if not value:
+                continue
+            if user_directory is not None:
+                try:
+                    value = str(user_directory.resolve(value))
+                except ValueError as e:
+                    raise ImportFileError(f"Assigned To: {e}")
+            elif not value.isdigit():
+                raise ImportFileError(f"Assigned To '{value}' is not a user ID")
+        else:
+            value = str(value).strip()
+        item[display_name] = value
+
+    if not item.get("Item"):
+        raise ImportFileError("Item is empty")
+    return item
+
+def _coerce_date(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value).strip()
+    if not value:
+        return None
+    for date_format in date_formats:
+        try:
+            return datetime.strptime(value.split("T")[0], date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ImportFileError(f"Date '{value}' is not a recognised date")
+
+checkpoint_dir = os.path.join(cache_dir, "imports")
+
+def checkpoint_path(path):
+    # Kept with the app's own data, since the spreadsheet's folder may be
+    # read-only or a share. The key includes size and mtime, so an edited
+    # file starts a fresh import.
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(checkpoint_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+def load_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"rows_done": 0, "created": 0, "skipped": 0, "errors": []}
+
+def clear_checkpoint(path):
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
+
+def _save_checkpoint(path, state):
+    # Write then rename so a crash never leaves a truncated checkpoint
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    temp_path = checkpoint_path(path) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, checkpoint_path(path))
+
+def import_inventory(session, path, existing_serials, list_name="Inventory", batch_size=100, progress=None,
+                     user_directory=None):
+    """Stream rows from path into the list in batched creates. Rows whose S/N
+    already exists (in existing_serials or earlier in the file) are skipped.
+    Assigned To may be a user ID, or a name or email found in user_directory.
+    With existing_serials None (no local copy of the list yet) each batch's
+    S/Ns are checked on the server instead. Progress is checkpointed after
+    every batch, so running the import again on the same file resumes after
+    the last committed batch. Returns the final checkpoint state;
+    state["errors"] lists (row number, message)."""
+    state = load_checkpoint(path)
+    resume_after = state["rows_done"]
+    check_server = existing_serials is None
+    seen_serials = set() if check_server else {str(serial).strip().lower() for serial in existing_serials if serial}
+    if resume_after:
+        logger.info(f"Resuming import of {path} after row {resume_after}")
+
+    batch = []
+    column_map = None
+    row_number = 0
+
+    def flush():
+        if check_server:
+            found = server_serials(session, list_name, [item.get("S/N") for _, item in batch])
+            kept = [(number, item) for number, item in batch
+                    if str(item.get("S/N", "")).strip().lower() not in found]
+            state["skipped"] += len(batch) - len(kept)
+            batch[:] = kept
+        results = add_sharepoint_items(session, list_name, [item for _, item in batch], unique_field="S/N")
+        for (number, _), error in zip(batch, results):
+            if error is None:
+                state["created"] += 1
+            else:
+                state["errors"].append((number, error))
+        state["rows_done"] = row_number
+        _save_checkpoint(path, state)
+        batch.clear()
+        if progress is not None:
+            progress(dict(state))
+
+    for row_number, row in enumerate(read_rows(path), start=1):
+        if column_map is None:
+            column_map = map_columns(row.keys())
+
+        try:
+            item = coerce_row(row, column_map, user_directory)
+        except ImportFileError as e:
+            if row_number > resume_after:
+                state["errors"].append((row_number, str(e)))
+            continue
+
+        # Rows before the checkpoint still seed the duplicate check
+        serial = str(item.get("S/N", "")).strip().lower()
+        if serial and serial in seen_serials:
+            if row_number > resume_after:
+                state["skipped"] += 1
+            continue
+        if serial:
+            seen_serials.add(serial)
+        if row_number <= resume_after:
+            continue
+
+        batch.append((row_number, item))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    state["rows_done"] = row_number
+    state["finished"] = True
+    _save_checkpoint(path, state)
+    logger.info(f"Imported {path}: {state['created']} created, {state['skipped']} duplicates skipped, {len(state['errors'])} errors")
+    return state
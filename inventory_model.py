@@ -0,0 +1,99 @@
+from array import array
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, pyqtSignal
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+class InventoryTableModel(QAbstractTableModel):
+    """Inventory rows kept as one list per column rather than one dict per row.
+    Rows arrive a page at a time: when the view scrolls near the end it calls
+    fetchMore, which asks the owner for the next page via fetch_requested."""
+
+    fetch_requested = pyqtSignal(int)
+
+    def __init__(self, keys, parent=None):
+        super().__init__(parent)
+        self.keys = keys
+        self.headers = ['Edit'] + keys
+        self.ids = array('q')
+        self.columns = [[] for _ in keys]
+        self.next_page = 1
+        self.has_more = False
+        self.pending = False
+
+    def reset(self):
+        self.beginResetModel()
+        self.ids = array('q')
+        self.columns = [[] for _ in self.keys]
+        self.next_page = 1
+        self.has_more = True
+        self.pending = False
+        self.endResetModel()
+
+    def append_page(self, items, has_next):
+        self.pending = False
+        self.has_more = has_next
+        self.next_page += 1
+        if not items:
+            return
+
+        first = len(self.ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        for item in items:
+            self.ids.append(int(item['ID']))
+            for column, key in zip(self.columns, self.keys):
+                value = item.get(key, '')
+                column.append('' if value is None else str(value))
+        self.endInsertRows()
+
+    def fetch_failed(self):
+        self.pending = False
+
+    def item_id(self, row):
+        return self.ids[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if index.column() == 0:
+            return 'Edit'
+        return self.columns[index.column() - 1][index.row()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more and not self.pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self.pending = True
+            self.fetch_requested.emit(self.next_page)
+
+class EditButtonDelegate(QStyledItemDelegate):
+    """Paints the Edit column as a push button without creating a widget per row."""
+
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data()
+        button.state = QStyle.StateFlag.State_Enabled
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            button.state |= QStyle.StateFlag.State_MouseOver
+        QApplication.style().drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and option.rect.contains(event.position().toPoint()):
+            self.clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
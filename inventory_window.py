@@ -1,25 +1,84 @@
 import sys
+from collections import OrderedDict
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-                             QTableWidget, QTableWidgetItem, QComboBox, QLineEdit,
-                             QLabel, QMessageBox, QApplication)
-from PyQt6.QtCore import pyqtSignal
+                             QTableView, QHeaderView, QAbstractItemView, QComboBox, QLineEdit,
+                             QLabel, QMessageBox, QApplication, QDialog, QFormLayout,
+                             QDialogButtonBox, QFileDialog)
+from PyQt6.QtCore import pyqtSignal, Qt, QTimer
 from PyQt6.QtGui import QColor, QPalette, QFont
-from sharepoint_utils import get_sharepoint_list_items
+from sharepoint_utils import get_sharepoint_list_items, update_and_reload_items, needs_scan, serial_is_indexed
+from workers import JobRunner
+from request_scheduler import background
+from inventory_model import InventoryTableModel, EditButtonDelegate
+from inventory_import import import_inventory, load_checkpoint, clear_checkpoint
+from inventory_export import export_inventory
+from list_schema import inventory_schema
+from inventory_cache import store_reloaded_items
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+class BulkEditDialog(QDialog):
+    def __init__(self, count, unversioned=0, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Bulk Edit")
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"Set a field on {count} selected items:"))
+        # Items someone else changed meanwhile are skipped, like a dashboard save
+        note = "Items changed by someone else since they were loaded are left as they are."
+        if unversioned:
+            note += f"\n{unversioned} of them have not been loaded yet and are overwritten."
+        layout.addWidget(QLabel(note))
+
+        form_layout = QFormLayout()
+        self.field_combo = QComboBox()
+        self.field_combo.addItems(["Location", "Assigned To", "Status", "Condition", "Funding", "Date", "Cost"])
+        self.value_input = QLineEdit()
+        form_layout.addRow("Field:", self.field_combo)
+        form_layout.addRow("New value:", self.value_input)
+        layout.addLayout(form_layout)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+
+    def values(self):
+        return self.field_combo.currentText(), self.value_input.text()
 
 class InventoryWindow(QWidget):
     item_selected = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.username = ""
-        self.password = ""
-        self.current_page = 1
-        self.total_pages = 1
+        self.session = None
+        self.cache = None
+        self.search_index = None
+        self.user_directory = None
+        self.item_cache = None
+        self.search_results = None
+        self.sync_again = False
+        # Rows per server request; the local cache can hand out bigger chunks
+        self.page_size = 100
+        self.cache_page_size = 500
         self.current_field = None
         self.current_value = None
+        self.from_cache = False
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
+        # Background reconciliation doesn't put the screen in a busy state
+        self.sync_jobs = JobRunner(self)
+        # Server pages fetched ahead of the scroll, keyed by (field, value, page)
+        self.page_cache = OrderedDict()
+        self.max_cached_pages = 8
+        self.prefetching = None
+        self.waiting_for = None
+        self.prefetch_jobs = JobRunner(self)
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(300)
+        self.prefetch_timer.timeout.connect(self.prefetch_search)
         self.init_ui()
 
     def init_ui(self):
@@ -37,9 +96,13 @@ class InventoryWindow(QWidget):
         # Search controls
         search_layout = QHBoxLayout()
         self.field_combo = QComboBox()
-        self.field_combo.addItems(["Item", "Description", "S/N", "Location", "Condition", "Assigned To", "Date", "Cost", "Funding"])
+        self.field_combo.addItems(inventory_schema.listed_names)
         self.value_input = QLineEdit()
         self.value_input.setPlaceholderText("Enter search value")
+        self.value_input.returnPressed.connect(self.search_items)
+        # With the local index ready, search as the user types
+        self.value_input.textChanged.connect(self.search_as_you_type)
+        self.field_combo.currentTextChanged.connect(self.search_as_you_type)
         self.search_button = QPushButton("Search")
         self.search_button.clicked.connect(self.search_items)
         search_layout.addWidget(self.field_combo)
@@ -47,24 +110,36 @@ class InventoryWindow(QWidget):
         search_layout.addWidget(self.search_button)
         layout.addLayout(search_layout)
 
-        # Inventory table
-        self.table = QTableWidget()
-        self.table.setColumnCount(10)
-        self.table.setHorizontalHeaderLabels(['Edit', 'Item', 'Description', 'S/N', 'Location', 'Condition', 'Assigned To', 'Date', 'Cost', 'Funding'])
+        # Inventory table, filled a page at a time as the user scrolls
+        self.model = InventoryTableModel(inventory_schema.listed_names, self)
+        self.model.fetch_requested.connect(self.fetch_page)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setMouseTracking(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.edit_delegate = EditButtonDelegate(self.table)
+        self.edit_delegate.clicked.connect(lambda row: self.edit_item(self.model.item_id(row)))
+        self.table.setItemDelegateForColumn(0, self.edit_delegate)
+        self.table.doubleClicked.connect(lambda index: self.edit_item(self.model.item_id(index.row())))
         layout.addWidget(self.table)
 
-        # Navigation buttons
-        nav_layout = QHBoxLayout()
-        self.prev_button = QPushButton("Previous")
-        self.prev_button.clicked.connect(self.prev_page)  # Connect prev_button to prev_page
-        self.next_button = QPushButton("Next")
-        self.next_button.clicked.connect(self.next_page)  # Connect next_button to next_page
-        self.page_label = QLabel()
-        self.page_label.setFont(QFont("Arial", 14))
-        nav_layout.addWidget(self.prev_button)
-        nav_layout.addWidget(self.page_label)
-        nav_layout.addWidget(self.next_button)
-        layout.addLayout(nav_layout)
+        status_layout = QHBoxLayout()
+        self.status_label = QLabel()
+        self.status_label.setFont(QFont("Arial", 14))
+        self.bulk_edit_button = QPushButton("Bulk Edit Selected")
+        self.bulk_edit_button.clicked.connect(self.bulk_edit)
+        self.import_button = QPushButton("Import...")
+        self.import_button.clicked.connect(self.import_file)
+        status_layout.addWidget(self.status_label)
+        self.export_button = QPushButton("Export...")
+        self.export_button.clicked.connect(self.export_file)
+        status_layout.addWidget(self.import_button)
+        status_layout.addWidget(self.export_button)
+        status_layout.addWidget(self.bulk_edit_button)
+        layout.addLayout(status_layout)
 
         self.back_button = QPushButton("Back")
         self.back_button.clicked.connect(self.go_back)
@@ -72,53 +147,324 @@ class InventoryWindow(QWidget):
 
         self.setLayout(layout)
 
-    def set_credentials(self, username, password):
-        self.username = username
-        self.password = password
+    def set_cache(self, cache, search_index, item_cache):
+        self.cache = cache
+        self.search_index = search_index
+        self.item_cache = item_cache
+
+    def set_user_directory(self, user_directory):
+        self.user_directory = user_directory
+
+    def set_session(self, session):
+        if session is not self.session:
+            # Pages already fetched for this session (e.g. by the login warm-up) stay usable
+            self.page_cache.clear()
+        self.session = session
         self.load_items()
+        self.sync_cache()
 
-    def load_items(self, page=1, field=None, value=None):
-        items, has_next, page_number, total_pages = get_sharepoint_list_items(
-            self.username, self.password, "Inventory", page_size=100, page_number=page, field=field, value=value
-        )
-        logging.debug(f"Loaded items: {items}")
-        self.populate_table(items)
-        self.current_page = page_number
-        self.total_pages = total_pages
+    def load_items(self, field=None, value=None):
+        if not value:
+            field, value = None, None
+        # A prefetch for another search is no longer useful
+        if self.prefetching is not None and self.prefetching[:2] != (field, value):
+            self.prefetch_jobs.cancel("prefetch")
+            self.prefetching = None
+        self.waiting_for = None
         self.current_field = field
         self.current_value = value
-        self.update_navigation()
-
-    def populate_table(self, items):
-        self.table.setRowCount(len(items))
-        for row, item in enumerate(items):
-            edit_button = QPushButton("Edit")
-            if 'ID' in item:
-                edit_button.clicked.connect(lambda _, item_id=item['ID']: self.edit_item(item_id))
-            else:
-                logging.error(f"Item does not have 'ID' key: {item}")
-                continue
-            self.table.setCellWidget(row, 0, edit_button)
-            for col, key in enumerate(['Item', 'Description', 'S/N', 'Location', 'Condition', 'Assigned To', 'Date', 'Cost', 'Funding'], start=1):
-                self.table.setItem(row, col, QTableWidgetItem(str(item.get(key, ''))))
-
-    def update_navigation(self):
-        self.prev_button.setEnabled(self.current_page > 1)
-        self.next_button.setEnabled(self.current_page < self.total_pages)
-        self.page_label.setText(f"Page {self.current_page} of {self.total_pages}")
+        self.jobs.cancel("page")
+        # Pick the source once per listing so page numbers stay consistent
+        self.search_results = None
+        self.from_cache = False
+        if self.search_index is not None and self.search_index.ready:
+            self.search_results = self.search_index.search(field, value or '')
+        else:
+            self.from_cache = self.cache is not None and not self.cache.is_empty()
+        self.model.reset()
+        self.model.fetchMore()
 
-    def search_items(self):
+    def fetch_page(self, page):
+        field = self.current_field
+        value = self.current_value
+        if self.search_results is not None:
+            start = (page - 1) * self.cache_page_size
+            page_ids = self.search_results[start:start + self.cache_page_size]
+            items = [self.search_index.get(item_id) for item_id in page_ids]
+            self.show_page([item for item in items if item is not None],
+                           start + self.cache_page_size < len(self.search_results))
+        elif self.from_cache:
+            items, has_next, _, _ = self.cache.get_page(
+                page_size=self.cache_page_size, page_number=page, field=field, value=value
+            )
+            self.show_page(items, has_next)
+        else:
+            self.fetch_server_page(page)
+
+    def fetch_server_page(self, page):
+        key = (self.current_field, self.current_value, page)
+        if key in self.page_cache:
+            self.page_cache.move_to_end(key)
+            self.on_server_page(key, self.page_cache[key])
+        elif self.prefetching == key:
+            # Already on its way; show it when it lands
+            self.waiting_for = key
+        else:
+            self.jobs.submit(
+                "page", get_sharepoint_list_items,
+                self.session, "Inventory", page_size=self.page_size, page_number=page, field=key[0], value=key[1],
+                search_index=self.search_index,
+                on_result=lambda result: self.on_server_page(key, result[:2]),
+                on_error=self.on_load_error
+            )
+
+    def on_server_page(self, key, page):
+        self.store_page(key, page)
+        self.show_page(*page)
+        field, value, number = key
+        if page[1]:
+            self.prefetch(field, value, number + 1)
+
+    def store_page(self, key, page):
+        self.page_cache[key] = page
+        self.page_cache.move_to_end(key)
+        while len(self.page_cache) > self.max_cached_pages:
+            self.page_cache.popitem(last=False)
+
+    def prefetch(self, field, value, page):
+        key = (field, value, page)
+        if self.session is None or key in self.page_cache or self.prefetching == key:
+            return
+        self.prefetching = key
+        self.prefetch_jobs.submit(
+            "prefetch", background(get_sharepoint_list_items),
+            self.session, "Inventory", page_size=self.page_size, page_number=page, field=field, value=value,
+            search_index=self.search_index,
+            on_result=lambda result: self.on_prefetched(key, result[:2]),
+            on_error=lambda e: self.on_prefetch_error(key, e)
+        )
+
+    def on_prefetched(self, key, page):
+        self.prefetching = None
+        self.store_page(key, page)
+        if self.waiting_for == key:
+            self.waiting_for = None
+            self.on_server_page(key, page)
+
+    def on_prefetch_error(self, key, e):
+        self.prefetching = None
+        if self.waiting_for == key:
+            self.waiting_for = None
+            self.on_load_error(e)
+        else:
+            logging.debug(f"Prefetch of page {key[2]} failed: {str(e)}")
+
+    def prefetch_search(self):
+        # While there's no local index, fetch the first page of what's being
+        # typed so pressing Search shows it straight away. A search that needs
+        # a scan of the list waits for Search instead of starting one at every
+        # pause in typing; the scan can't be stopped once it is running.
         field = self.field_combo.currentText()
         value = self.value_input.text()
-        self.load_items(page=1, field=field, value=value)
+        if value and not needs_scan(field, value):
+            self.prefetch(field, value, 1)
+
+    def show_page(self, items, has_next):
+        logging.debug(f"Loaded {len(items)} items")
+        self.item_cache.put_many(items)
+        self.model.append_page(items, has_next)
+        self.update_status()
+
+    def on_load_error(self, e):
+        self.model.fetch_failed()
+        QMessageBox.warning(self, "Error", f"Could not load inventory: {str(e)}")
 
-    def prev_page(self):
-        if self.current_page > 1:
-            self.load_items(page=self.current_page - 1, field=self.current_field, value=self.current_value)
+    def sync_cache(self):
+        if self.cache is None:
+            return
+        if self.sync_jobs.is_running("sync"):
+            # Run once more when the current pass finishes
+            self.sync_again = True
+            return
+        self.sync_jobs.submit("sync", background(self.run_sync), self.session,
+                              on_result=self.on_cache_synced, on_error=self.on_sync_error)
 
-    def next_page(self):
-        if self.current_page < self.total_pages:
-            self.load_items(page=self.current_page + 1, field=self.current_field, value=self.current_value)
+    def run_sync(self, session):
+        # Runs on the worker pool. Building the index here, before the first
+        # sync, keeps index and cache from racing each other. An empty cache
+        # (first login) is indexed after its first sync instead, so a ready
+        # index always holds the inventory.
+        if not self.search_index.ready and not self.cache.is_empty():
+            self.search_index.build(self.cache.get_all_items())
+        if session is None:
+            return [], []
+        changed_items, deleted_ids = self.cache.sync(session)
+        if self.search_index.ready:
+            self.search_index.update(changed_items, deleted_ids)
+        else:
+            self.search_index.build(self.cache.get_all_items())
+        self.item_cache.put_many(changed_items)
+        self.item_cache.invalidate(deleted_ids)
+        return changed_items, deleted_ids
+
+    def on_sync_error(self, e):
+        logging.error(f"Inventory cache sync failed: {str(e)}")
+        self.sync_finished()
+
+    def sync_finished(self):
+        if self.sync_again:
+            self.sync_again = False
+            self.sync_cache()
+
+    def bulk_edit(self):
+        item_ids = [self.model.item_id(index.row()) for index in self.table.selectionModel().selectedRows()]
+        if not item_ids:
+            QMessageBox.warning(self, "Error", "Select one or more items first.")
+            return
+
+        etags = self.loaded_etags(item_ids)
+        dialog = BulkEditDialog(len(item_ids), len(item_ids) - len(etags), self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        field, value = dialog.values()
+        if field == "Assigned To" and self.user_directory is not None:
+            try:
+                user_id = self.user_directory.resolve(value)
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", str(e))
+                return
+            value = "" if user_id is None else str(user_id)
+        updates = {item_id: {field: value} for item_id in item_ids}
+        self.jobs.submit("bulk", update_and_reload_items, self.session, "Inventory", updates, etags=etags,
+                         on_result=lambda result: self.on_bulk_edit_done(updates, *result),
+                         on_error=lambda e: QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}"))
+
+    def loaded_etags(self, item_ids):
+        # The versions the user is looking at, so a bulk edit doesn't
+        # overwrite changes made since
+        etags = {}
+        for item_id in item_ids:
+            item = self.search_index.get(item_id) if self.search_index is not None else None
+            if item is None and self.item_cache is not None:
+                item = self.item_cache.get(item_id)
+            if item is None and self.cache is not None:
+                item = self.cache.get_item(item_id)
+            if item is not None and item.get("ETag"):
+                etags[item_id] = item["ETag"]
+        return etags
+
+    def on_bulk_edit_done(self, updates, errors, items):
+        # Reflect the successful updates locally, new versions included,
+        # without waiting for a sync
+        store_reloaded_items([item_id for item_id in updates if item_id not in errors], items,
+                             self.cache, self.search_index, self.item_cache)
+        self.page_cache.clear()
+        self.load_items(field=self.current_field, value=self.current_value)
+
+        if errors:
+            details = "\n".join(f"Item {item_id}: {error}" for item_id, error in sorted(errors.items())[:20])
+            QMessageBox.warning(self, "Bulk Edit", f"{len(updates) - len(errors)} of {len(updates)} items updated. Failed:\n{details}")
+        else:
+            QMessageBox.information(self, "Bulk Edit", f"{len(updates)} items updated successfully!")
+
+    def import_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Inventory", "", "Spreadsheets (*.csv *.xlsx)")
+        if not path:
+            return
+
+        checkpoint = load_checkpoint(path)
+        if checkpoint["rows_done"]:
+            answer = QMessageBox.question(
+                self, "Import",
+                f"This file was already imported up to row {checkpoint['rows_done']}. Resume from there?\n"
+                "Choose No to start over.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
+            )
+            if answer == QMessageBox.StandardButton.Cancel:
+                return
+            if answer == QMessageBox.StandardButton.No:
+                clear_checkpoint(path)
+
+        existing_serials = None
+        if self.search_index is not None and self.search_index.ready:
+            existing_serials = [item.get('S/N') for item in self.search_index.snapshot()]
+        elif self.cache is not None and self.cache.get_state("modified") is not None:
+            # Synced at least once, so the cache holds the whole list
+            existing_serials = [item.get('S/N') for item in self.cache.get_all_items()]
+        elif not serial_is_indexed():
+            # No local copy to dedupe against, and checking each batch on the
+            # server would walk the whole list
+            QMessageBox.information(self, "Import", "The inventory is still loading. Try the import again in a moment.")
+            return
+
+        self.status_label.setText("Importing...")
+        self.jobs.submit("import", import_inventory, self.session, path, existing_serials,
+                         user_directory=self.user_directory,
+                         on_progress=lambda state: self.status_label.setText(
+                             f"Importing: row {state['rows_done']}, {state['created']} created"),
+                         on_result=self.on_import_done,
+                         on_error=lambda e: QMessageBox.warning(self, "Import", f"Import stopped: {str(e)}\n"
+                                                                "Run the import again on the same file to resume."))
+
+    def on_import_done(self, state):
+        self.page_cache.clear()
+        self.sync_cache()
+        message = f"{state['created']} items created, {state['skipped']} duplicate serial numbers skipped."
+        if state["errors"]:
+            details = "\n".join(f"Row {row}: {error}" for row, error in state["errors"][:20])
+            QMessageBox.warning(self, "Import", f"{message}\n{len(state['errors'])} rows failed:\n{details}")
+        else:
+            QMessageBox.information(self, "Import", message)
+        self.update_status()
+
+    def export_file(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Inventory", "inventory.csv", "CSV (*.csv);;Parquet (*.parquet)")
+        if not path:
+            return
+
+        # Exports the current search, straight from SharePoint
+        self.jobs.submit("export", export_inventory, self.session, path,
+                         field=self.current_field, value=self.current_value,
+                         on_progress=lambda written: self.status_label.setText(f"Exporting: {written} rows"),
+                         on_result=lambda written: self.on_export_done(path, written),
+                         on_error=lambda e: QMessageBox.warning(self, "Export", f"Export failed: {str(e)}"))
+
+    def on_export_done(self, path, written):
+        self.update_status()
+        QMessageBox.information(self, "Export", f"Exported {written} items to {path}.")
+
+    def set_busy(self, busy):
+        self.import_button.setEnabled(not busy)
+        self.export_button.setEnabled(not busy)
+        self.bulk_edit_button.setEnabled(not busy)
+        if busy:
+            self.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.unsetCursor()
+
+    def on_cache_synced(self, changes):
+        changed_items, deleted_ids = changes
+        if changed_items or deleted_ids:
+            self.page_cache.clear()
+        if (changed_items or deleted_ids) and self.isVisible():
+            self.load_items(field=self.current_field, value=self.current_value)
+        self.sync_finished()
+
+    def update_status(self):
+        loaded = self.model.rowCount()
+        more = ", scroll for more" if self.model.has_more else ""
+        self.status_label.setText(f"{loaded} items loaded{more}")
+
+    def search_as_you_type(self):
+        if self.search_index is not None and self.search_index.ready:
+            self.search_items()
+        elif self.session is not None and not self.from_cache:
+            self.prefetch_timer.start()
+
+    def search_items(self):
+        field = self.field_combo.currentText()
+        value = self.value_input.text()
+        self.load_items(field=field, value=value)
 
     def edit_item(self, item_id):
         self.item_selected.emit(str(item_id))
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+class ItemCache:
+    """Recently seen inventory items by ID, shared by every screen. List loads
+    fill it, so opening an item from the list needs no request. Entries expire
+    after ttl seconds and the least recently used are evicted past max_items."""
+
+    def __init__(self, max_items=5000, ttl=10 * 60):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, item_id):
+        key = int(item_id)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            stored_at, item = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return dict(item)
+
+    def put_many(self, items):
+        now = time.monotonic()
+        with self._lock:
+            for item in items:
+                key = int(item['ID'])
+                self._items[key] = (now, dict(item))
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def put(self, item):
+        self.put_many([item])
+
+    def update_fields(self, item_id, properties):
+        key = int(item_id)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                entry[1].update(properties)
+
+    def invalidate(self, item_ids):
+        with self._lock:
+            for item_id in item_ids:
+                self._items.pop(int(item_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -1,17 +1,35 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
-                             QLineEdit, QPushButton, QMessageBox, QLabel, QDateEdit)
-from PyQt6.QtCore import pyqtSignal, QDate
+                             QLineEdit, QPushButton, QMessageBox, QLabel, QDateEdit, QCompleter)
+from PyQt6.QtCore import pyqtSignal, QDate, Qt, QTimer
 from PyQt6.QtGui import QColor, QPalette, QFont
-from sharepoint_utils import get_sharepoint_list_items, get_sharepoint_item, update_sharepoint_item
+from sharepoint_utils import get_sharepoint_item, find_items_by_serial, serial_is_indexed
+from workers import JobRunner
+from list_schema import inventory_schema
 
 class ItemDashboardWindow(QWidget):
     report_issue_requested = pyqtSignal(str)
+    show_tickets_requested = pyqtSignal(int)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.username = ""
-        self.password = ""
+        self.session = None
         self.item_id = ""
+        self.etag = None
+        self.fields = {}
+        self.original_values = {}
+        self.cache = None
+        self.search_index = None
+        self.outbox = None
+        self.user_directory = None
+        self.item_cache = None
+        self.ticket_store = None
+        # A search waiting for the local index to finish loading
+        self.pending_search = None
+        self.index_timer = QTimer(self)
+        self.index_timer.setInterval(500)
+        self.index_timer.timeout.connect(self.run_pending_search)
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
         self.init_ui()
 
     def init_ui(self):
@@ -52,15 +70,33 @@ class ItemDashboardWindow(QWidget):
         self.report_issue_button.clicked.connect(self.report_issue)
         layout.addWidget(self.report_issue_button)
 
+        self.tickets_button = QPushButton("Tickets")
+        self.tickets_button.clicked.connect(self.show_tickets)
+        layout.addWidget(self.tickets_button)
+
         self.back_button = QPushButton("Back")
         self.back_button.clicked.connect(self.go_back)
         layout.addWidget(self.back_button)
 
         self.setLayout(layout)
 
-    def set_credentials(self, username, password):
-        self.username = username
-        self.password = password
+    def set_session(self, session):
+        self.session = session
+
+    def set_cache(self, cache, search_index, item_cache):
+        self.cache = cache
+        self.search_index = search_index
+        self.item_cache = item_cache
+
+    def set_ticket_store(self, ticket_store):
+        self.ticket_store = ticket_store
+
+    def set_user_directory(self, user_directory):
+        self.user_directory = user_directory
+
+    def set_outbox(self, outbox):
+        self.outbox = outbox
+        self.outbox.op_applied.connect(self.on_op_applied)
 
     def search_item(self):
         search_value = self.search_input.text()
@@ -68,22 +104,81 @@ class ItemDashboardWindow(QWidget):
             QMessageBox.warning(self, "Error", "Please enter an Item Name or Serial Number.")
             return
 
-        try:
-            items, _, _, _ = get_sharepoint_list_items(self.username, self.password, 'Inventory', field='S/N', value=search_value)
-            if not items:
-                items, _, _, _ = get_sharepoint_list_items(self.username, self.password, 'Inventory', field='Item', value=search_value)
-            
-            if items:
-                self.load_item(items[0]['ID'])
-            else:
-                QMessageBox.information(self, "No results", "No items found matching your search.")
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', str(e))
+        self.cancel_pending_search()
+        if self.search_index is not None and self.search_index.ready:
+            self.search_index_for(search_value)
+            return
+
+        if serial_is_indexed():
+            # An exact S/N is one small request; shares the "item" key with
+            # load_item, so a new search supersedes both
+            self.jobs.submit("item", find_items_by_serial, self.session, search_value.strip(),
+                             on_result=lambda items: self.on_server_search_result(search_value, items),
+                             on_error=lambda e: QMessageBox.critical(self, 'Error', str(e)))
+        else:
+            self.wait_for_index(search_value)
+
+    def search_index_for(self, search_value):
+        # An exact serial number first, so a scanned tag never picks a partial match
+        item_ids = (self.search_index.find_serial(search_value) or self.search_index.search('S/N', search_value)
+                    or self.search_index.search('Item', search_value))
+        items = [self.search_index.get(item_id) for item_id in item_ids[:1]]
+        self.item_cache.put_many(items)
+        self.on_search_result(items)
+
+    def on_server_search_result(self, search_value, items):
+        if items:
+            self.on_search_result(items)
+        else:
+            self.wait_for_index(search_value)
+
+    def wait_for_index(self, search_value):
+        # The "contains" searches would each walk the whole list on the
+        # server, so they wait for the local index instead
+        self.pending_search = search_value
+        self.search_button.setText("Loading inventory...")
+        self.index_timer.start()
+
+    def run_pending_search(self):
+        if self.search_index is None or not self.search_index.ready:
+            return
+        search_value = self.pending_search
+        self.cancel_pending_search()
+        if search_value is not None:
+            self.search_index_for(search_value)
+
+    def cancel_pending_search(self):
+        self.index_timer.stop()
+        self.pending_search = None
+        self.search_button.setText("Search")
+
+    def on_search_result(self, items):
+        self.item_cache.put_many(items)
+        if items:
+            self.load_item(items[0]['ID'])
+        else:
+            QMessageBox.information(self, "No results", "No items found matching your search.")
 
     def load_item(self, item_id):
         self.item_id = item_id
-        item = get_sharepoint_item(self.username, self.password, "Inventory", item_id)
-        self.populate_form(item)
+        self.jobs.cancel("item")
+        self.cancel_pending_search()
+
+        # Items seen in a list load open with no request at all
+        item = self.item_cache.get(item_id)
+        if item is not None:
+            self.populate_form(item)
+            return
+
+        self.jobs.submit("item", self.fetch_item, item_id,
+                         on_result=self.populate_form,
+                         on_error=lambda e: QMessageBox.warning(self, "Error", f"Could not load item: {str(e)}"))
+
+    def fetch_item(self, item_id):
+        # Runs on the worker pool
+        item = get_sharepoint_item(self.session, "Inventory", item_id)
+        self.item_cache.put(item)
+        return item
 
     def populate_form(self, item):
         # Clear existing widgets
@@ -92,38 +187,110 @@ class ItemDashboardWindow(QWidget):
 
         # Add new widgets
         self.fields = {}
+        self.etag = item.get('ETag')
         for key, value in item.items():
-            if key != 'ID':  # Skip the ID field
+            if key not in ('ID', 'Item ID', 'ETag'):  # Skip the ID and version fields
                 if key == 'Date':
                     date_edit = QDateEdit()
                     date_edit.setDisplayFormat("yyyy-MM-dd")
                     if value:
-                        date = QDate.fromString(value.split('T')[0], "yyyy-MM-dd")
+                        date = QDate.fromString(str(value).split('T')[0], "yyyy-MM-dd")
                         date_edit.setDate(date)
                     self.form_layout.addRow(key, date_edit)
                     self.fields[key] = date_edit
+                elif key == 'Assigned To' and self.user_directory is not None:
+                    # Shown and entered by name; resolved to a user ID on save
+                    line_edit = QLineEdit(self.user_directory.display(value))
+                    completer = QCompleter(self.user_directory.names(), line_edit)
+                    completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+                    completer.setFilterMode(Qt.MatchFlag.MatchContains)
+                    line_edit.setCompleter(completer)
+                    self.form_layout.addRow(key, line_edit)
+                    self.fields[key] = line_edit
                 else:
-                    line_edit = QLineEdit(str(value))
+                    line_edit = QLineEdit('' if value is None else str(value))
                     self.form_layout.addRow(key, line_edit)
                     self.fields[key] = line_edit
 
-    def save_changes(self):
-        if not self.item_id:
-            QMessageBox.warning(self, "Error", "No item loaded. Please search for an item first.")
+        # Compare against what the widgets show, so e.g. an empty date isn't "changed"
+        self.original_values = self.form_values()
+        self.update_ticket_count()
+
+    def update_ticket_count(self):
+        # Answered by the local ticket store, so it costs no request
+        if self.ticket_store is None or not self.item_id:
+            self.tickets_button.setText("Tickets")
             return
+        count = self.ticket_store.open_count(self.item_id)
+        self.tickets_button.setText(f"Tickets ({count} open)" if count else "Tickets")
 
-        updated_properties = {}
+    def form_values(self):
+        values = {}
         for key, widget in self.fields.items():
             if isinstance(widget, QDateEdit):
-                updated_properties[key] = widget.date().toString("yyyy-MM-dd")
+                values[key] = widget.date().toString("yyyy-MM-dd")
             else:
-                updated_properties[key] = widget.text()
+                values[key] = widget.text()
+        return values
+
+    def save_changes(self):
+        if not self.item_id:
+            QMessageBox.warning(self, "Error", "No item loaded. Please search for an item first.")
+            return
 
+        # Only send the fields the user actually changed
+        changed_values = {key: value for key, value in self.form_values().items()
+                          if self.original_values.get(key) != value}
+        if not changed_values:
+            QMessageBox.information(self, "No changes", "There are no changes to save.")
+            return
+
+        updated_properties = dict(changed_values)
+        if "Assigned To" in updated_properties and self.user_directory is not None:
+            try:
+                user_id = self.user_directory.resolve(updated_properties["Assigned To"])
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", str(e))
+                return
+            updated_properties["Assigned To"] = "" if user_id is None else str(user_id)
+        # Checked now, while the form is still open to correct it, rather
+        # than shown as saved and rejected when the outbox sends it
         try:
-            update_sharepoint_item(self.username, self.password, "Inventory", self.item_id, updated_properties)
-            QMessageBox.information(self, "Success", "Item updated successfully!")
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+            inventory_schema.encode(updated_properties)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        # Accepted locally right away; the outbox sends it when it can.
+        # Conflicts are reported by the main window when the replay hits them.
+        self.outbox.enqueue("update", {"list_name": "Inventory", "item_id": self.item_id,
+                                       "properties": updated_properties, "etag": self.etag})
+        self.original_values.update(changed_values)
+
+        # Keep local search results current without waiting for the next
+        # sync, typed as the server's rows are
+        local_properties = inventory_schema.decode_display(updated_properties)
+        if self.search_index is not None:
+            self.search_index.update_fields(self.item_id, local_properties)
+        if self.cache is not None:
+            self.cache.update_fields(self.item_id, local_properties)
+        self.item_cache.update_fields(self.item_id, local_properties)
+        QMessageBox.information(self, "Success", "Item saved. Changes are sent to SharePoint in the background.")
+
+    def on_op_applied(self, op):
+        # Pick up the new version so the next save doesn't look like a conflict
+        if op["kind"] == "update" and str(op["payload"]["item_id"]) == str(self.item_id) and op.get("result"):
+            self.etag = op["result"]
+
+    def set_busy(self, busy):
+        self.search_button.setEnabled(not busy)
+        self.save_button.setEnabled(not busy)
+        self.report_issue_button.setEnabled(not busy)
+        self.tickets_button.setEnabled(not busy)
+        if busy:
+            self.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.unsetCursor()
             
     def report_issue(self):
         if not self.item_id:
@@ -131,6 +298,12 @@ class ItemDashboardWindow(QWidget):
             return
         self.report_issue_requested.emit(str(self.item_id))
 
+    def show_tickets(self):
+        if not self.item_id:
+            QMessageBox.warning(self, "Error", "No item loaded. Please search for an item first.")
+            return
+        self.show_tickets_requested.emit(int(self.item_id))
+
     def go_back(self):
         main_window = self.window()
         if hasattr(main_window, 'show_home'):
@@ -139,7 +312,12 @@ class ItemDashboardWindow(QWidget):
             print("Error: MainWindow does not have a show_home method")
 
     def clear_form(self):
+        self.jobs.cancel("item")
+        self.cancel_pending_search()
         self.item_id = ""
+        self.etag = None
+        self.original_values = {}
+        self.tickets_button.setText("Tickets")
         for i in reversed(range(self.form_layout.count())): 
             self.form_layout.itemAt(i).widget().setParent(None)
         self.fields = {}
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+logger = logging.getLogger(__name__)
+
+class FieldDef:
+    """One list column: the app's display name, the SharePoint internal name,
+    the SharePoint field type (TypeAsString) and the local cache column.
+    listed columns are shown in the inventory table and search box; indexed
+    ones can be filtered on server-side past the list view threshold."""
+
+    __slots__ = ("display_name", "internal_name", "field_type", "cache_column", "listed", "indexed")
+
+    def __init__(self, display_name, internal_name, field_type, cache_column, listed=True, indexed=False):
+        self.display_name = display_name
+        self.internal_name = internal_name
+        self.field_type = field_type
+        self.cache_column = cache_column
+        self.listed = listed
+        self.indexed = indexed
+
+# The Inventory list as the app sees it. Adding a column here adds it to the
+# queries, the cache, the table, search and export. Types are defaults until
+# the list's own field metadata has been loaded, and no column but ID is
+# assumed to be indexed until then.
+inventory_fields = (
+    FieldDef("Item", "Title", "Text", "item"),
+    FieldDef("Description", "field_1", "Note", "description"),
+    FieldDef("S/N", "field_2", "Text", "sn"),
+    FieldDef("Location", "field_3", "Text", "location"),
+    FieldDef("Condition", "Condition", "Choice", "condition"),
+    FieldDef("Assigned To", "AssignedTo", "User", "assigned_to"),
+    FieldDef("Date", "field_4", "DateTime", "date"),
+    FieldDef("Cost", "field_5", "Currency", "cost"),
+    FieldDef("Funding", "field_6", "Text", "funding"),
+    FieldDef("Status", "field_7", "Text", "status", listed=False),
+)
+
+# The Tickets list. Inventory Item is a lookup to the Inventory list, which
+# links a ticket to the item it was reported against.
+ticket_fields = (
+    FieldDef("Title", "Title", "Text", "title"),
+    FieldDef("Description", "Description", "Note", "description", listed=False),
+    FieldDef("Priority", "Priority", "Choice", "priority"),
+    FieldDef("Status", "Status", "Choice", "status"),
+    FieldDef("Reported By", "PersonReportingIssue", "User", "reported_by"),
+    FieldDef("Inventory Item", "InventoryItem", "Lookup", "item_id"),
+    FieldDef("Created", "Created", "DateTime", "created"),
+)
+
+number_types = ("Number", "Currency")
+user_types = ("User",)
+lookup_types = ("Lookup",)
+date_types = ("DateTime",)
+text_types = ("Text", "Note", "Choice")
+
+def _decode_text(value):
+    return "" if value is None else value
+
+def _decode_number(value):
+    if value in ("", None):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+def _decode_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).split("T")[0])
+    except ValueError:
+        return None
+
+def _decode_user(value):
+    # A user or lookup ID; text copies (the cache, a form) give it as a string
+    if value in ("", None):
+        return ""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+def _encode_text(value):
+    return value
+
+def _encode_number(value):
+    if value in ("", None):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' is not a number")
+
+def _encode_date(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if not value:
+        return None
+    try:
+        date.fromisoformat(str(value).split("T")[0])
+    except ValueError:
+        raise ValueError(f"'{value}' is not a yyyy-MM-dd date")
+    return value
+
+def _encode_user(value):
+    if value in ("", None):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value}' is not a user ID")
+
+def _codecs(field_type):
+    # (decode, encode) for a SharePoint field type
+    if field_type in number_types:
+        return _decode_number, _encode_number
+    if field_type in date_types:
+        return _decode_date, _encode_date
+    if field_type in user_types or field_type in lookup_types:
+        return _decode_user, _encode_user
+    return _decode_text, _encode_text
+
+class ListSchema:
+    """Registry for one list's columns. Everything per-field that used to be
+    spelled out at each call site (the $select list, value encoders and
+    decoders, filterable names, table headers) is precomputed here from the
+    field definitions, and rebuilt when the list's metadata says a type or
+    index is different."""
+
+    def __init__(self, fields):
+        self._lock = threading.Lock()
+        self.fields = tuple(fields)
+        self.version = None
+        self._compile()
+
+    def _compile(self):
+        by_display = {}
+        decoders = []
+        display_decoders = {}
+        for field in self.fields:
+            decode, encode = _codecs(field.field_type)
+            # Person and lookup fields are read, written and filtered as <name>Id
+            wire_name = field.internal_name
+            if field.field_type in user_types or field.field_type in lookup_types:
+                wire_name = f"{field.internal_name}Id"
+            by_display[field.display_name] = (field, wire_name, encode)
+            decoders.append((wire_name, decode))
+            display_decoders[field.display_name] = decode
+
+        self.by_display = by_display
+        self.decoders = tuple(decoders)
+        self.display_decoders = display_decoders
+        self.select = ["ID", "owshiddenversion"] + [wire_name for wire_name, _ in decoders]
+        self.display_names = [field.display_name for field in self.fields]
+        self.listed_names = [field.display_name for field in self.fields if field.listed]
+        self.record_keys = ("ID", "Item ID") + tuple(self.display_names) + ("ETag",)
+        self.positions = {name: i for i, name in enumerate(self.display_names)}
+
+    def internal_name(self, display_name):
+        return self.by_display[display_name][1]
+
+    def encode(self, display_props):
+        # Display-name properties -> the internal names and values SharePoint
+        # expects. Raises ValueError naming the field for a value its type
+        # can't take, before anything is sent.
+        encoded = {}
+        for display_name, value in display_props.items():
+            entry = self.by_display.get(display_name)
+            if entry is not None:
+                _, wire_name, encode = entry
+                try:
+                    encoded[wire_name] = encode(value)
+                except ValueError as e:
+                    raise ValueError(f"{display_name}: {e}")
+        return encoded
+
+    def decode_display(self, display_props):
+        # Display-name values in text form (a cache row, form input) -> the
+        # typed values decode gives for the same fields
+        decoders = self.display_decoders
+        return {name: decoders[name](value) if name in decoders else value for name, value in display_props.items()}
+
+    def decode(self, properties, etag=None):
+        values = tuple(decode(properties.get(wire_name)) for wire_name, decode in self.decoders)
+        return InventoryRecord(self, properties.get("ID"), values, etag)
+
+    def field_info(self, display_name):
+        """(filter name, field type, indexed) for a display name, or None.
+        ID is always there and always indexed."""
+        if display_name in ("ID", "Item ID"):
+            return "ID", "Counter", True
+        entry = self.by_display.get(display_name)
+        if entry is None:
+            return None
+        field, wire_name, _ = entry
+        return wire_name, field.field_type, field.indexed
+
+    def fingerprint(self, metadata):
+        text = json.dumps(sorted(metadata.items()))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def apply_metadata(self, metadata, version=None):
+        """Take field types and index flags from the list's metadata
+        (internal name -> {"type": TypeAsString, "indexed": bool}).
+        Returns True if anything changed."""
+        with self._lock:
+            fields = []
+            changed = False
+            for field in self.fields:
+                meta = metadata.get(field.internal_name, {})
+                field_type = meta.get("type", field.field_type)
+                indexed = meta.get("indexed", field.indexed)
+                changed = changed or field_type != field.field_type or indexed != field.indexed
+                fields.append(FieldDef(field.display_name, field.internal_name, field_type,
+                                       field.cache_column, field.listed, indexed))
+            self.version = version or self.fingerprint(metadata)
+            if changed:
+                self.fields = tuple(fields)
+                self._compile()
+                logger.info(f"List schema updated: {metadata}")
+            return changed
+
+    def load(self, path):
+        # Metadata saved by an earlier run, so the first queries need no metadata request
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            self.apply_metadata(saved["fields"], saved["version"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self, path, metadata):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": self.version, "fields": metadata}, f)
+        os.replace(temp_path, path)
+
+class InventoryRecord(Mapping):
+    """One list row with typed values (a date for DateTime columns, a Decimal
+    for Number and Currency). Slots keep a page of rows smaller than a dict
+    per row, and the read-only mapping interface, keyed by display name,
+    lets it go anywhere the mapped item dicts went."""
+
+    __slots__ = ("schema", "id", "etag", "values")
+
+    def __init__(self, schema, item_id, values, etag=None):
+        self.schema = schema
+        self.id = int(item_id)
+        self.etag = etag
+        # Display values in schema order
+        self.values = values
+
+    def __getitem__(self, key):
+        if key in ("ID", "Item ID"):
+            return self.id
+        if key == "ETag":
+            return self.etag
+        return self.values[self.schema.positions[key]]
+
+    def __iter__(self):
+        return iter(self.schema.record_keys)
+
+    def __len__(self):
+        return len(self.schema.record_keys)
+
+    def __repr__(self):
+        return f"InventoryRecord({dict(self)!r})"
+
+inventory_schema = ListSchema(inventory_fields)
+ticket_schema = ListSchema(ticket_fields)
@@ -1,14 +1,22 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import pyqtSignal, Qt
 from PyQt6.QtGui import QColor, QPalette, QFont
 
-from sharepoint_utils import test_sharepoint_connection
+from workers import JobRunner
+
+def open_session(username, password):
+    # Runs on the worker pool. The office365 SDK is slow to import, so it is
+    # loaded here (or by the startup warm-up) instead of before the form shows.
+    from sharepoint_utils import open_sharepoint_session
+    return open_sharepoint_session(username, password)
 
 class LoginWindow(QWidget):
-    login_successful = pyqtSignal(str, str)
+    login_successful = pyqtSignal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
         self.init_ui()
 
     def init_ui(self):
@@ -41,6 +49,7 @@ class LoginWindow(QWidget):
 
         self.login_button = QPushButton("Login")
         self.login_button.clicked.connect(self.login)
+        self.password_input.returnPressed.connect(self.login)
         layout.addWidget(self.login_button)
 
         self.setLayout(layout)
@@ -48,10 +57,19 @@ class LoginWindow(QWidget):
     def login(self):
         username = self.username_input.text()
         password = self.password_input.text()
-        try:
-            test_sharepoint_connection(username, password)
-            self.login_successful.emit(username, password)
-        except ValueError as e:
+        self.jobs.submit("login", open_session, username, password,
+                         on_result=self.login_successful.emit, on_error=self.on_login_error)
+
+    def on_login_error(self, e):
+        if isinstance(e, ValueError):
             QMessageBox.warning(self, "Login Error", str(e))
-        except Exception as e:
+        else:
             QMessageBox.critical(self, "Unexpected Error", f"An unexpected error occurred: {str(e)}")
+
+    def set_busy(self, busy):
+        self.login_button.setEnabled(not busy)
+        self.login_button.setText("Signing in..." if busy else "Login")
+        if busy:
+            self.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.unsetCursor()
@@ -1,12 +1,27 @@
+import time
+started = time.perf_counter()
+
+import importlib
+import logging
+import os
 import sys
-from PyQt6.QtWidgets import QApplication, QMainWindow, QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QColor, QPalette
+from PyQt6.QtWidgets import QApplication, QMainWindow, QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QMessageBox
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QColor, QPalette, QShortcut, QKeySequence
 from login_window import LoginWindow
-from home_window import HomeWindow
-from inventory_window import InventoryWindow
-from item_dashboard_window import ItemDashboardWindow
-from report_issue_window import ReportIssueWindow
+from inventory_cache import InventoryCache, schema_path, store_reloaded_items
+from list_schema import inventory_schema
+from search_index import InventorySearchIndex
+from offline_queue import Outbox
+from user_directory import UserDirectory
+from workers import JobRunner
+from item_cache import ItemCache
+from ticket_store import TicketStore
+
+logger = logging.getLogger(__name__)
+
+def elapsed_ms():
+    return (time.perf_counter() - started) * 1000
 
 class CenteredWidget(QWidget):
     def __init__(self, child_widget):
@@ -38,60 +53,327 @@ class MainWindow(QMainWindow):
         self.central_widget = QStackedWidget()
         self.setCentralWidget(self.central_widget)
 
+        self.session = None
         self.login_window = CenteredWidget(LoginWindow(self))
-        self.home_window = CenteredWidget(HomeWindow(self))
-        self.inventory_window = CenteredWidget(InventoryWindow(self))
-        self.item_dashboard_window = CenteredWidget(ItemDashboardWindow(self))
-        self.report_issue_window = CenteredWidget(ReportIssueWindow(self))
-
         self.central_widget.addWidget(self.login_window)
-        self.central_widget.addWidget(self.home_window)
-        self.central_widget.addWidget(self.inventory_window)
-        self.central_widget.addWidget(self.item_dashboard_window)
-        self.central_widget.addWidget(self.report_issue_window)
-
         self.central_widget.setCurrentWidget(self.login_window)
 
+        # The other screens are built on first use, so only the login form
+        # has to be ready before the window first paints
+        self.screens = {}
+        self.screen_builders = {
+            "home": self.build_home,
+            "inventory": self.build_inventory,
+            "item_dashboard": self.build_item_dashboard,
+            "report_issue": self.build_report_issue,
+            "tickets": self.build_tickets,
+            "analytics": self.build_analytics,
+            "scan": self.build_scan
+        }
+
+        # Local inventory copy; it is indexed and reconciled after login
+        inventory_schema.load(schema_path)
+        self.inventory_cache = InventoryCache()
+        self.search_index = InventorySearchIndex()
+        self.item_cache = ItemCache()
+        self.ticket_store = TicketStore()
+
+        # Site users for person fields; refreshed in the background after login
+        self.user_directory = UserDirectory()
+        self.jobs = JobRunner(self)
+
+        # Edits and tickets are journaled locally and sent in the background
+        self.outbox = Outbox(parent=self)
+        self.outbox.pending_changed.connect(self.show_pending_count)
+        self.outbox.op_applied.connect(self.on_outbox_applied)
+        self.outbox.op_conflicted.connect(self.on_outbox_conflict)
+        self.outbox.op_failed.connect(self.on_outbox_failed)
+        self.show_pending_count(self.outbox.pending_count())
+
         # Connect signals
         self.login_window.child_widget.login_successful.connect(self.on_login_successful)
-        self.home_window.child_widget.show_inventory_requested.connect(self.show_inventory)
-        self.home_window.child_widget.show_submit_ticket_requested.connect(self.show_submit_ticket)
-        self.home_window.child_widget.show_item_dashboard_requested.connect(self.show_item_dashboard)
-        self.inventory_window.child_widget.item_selected.connect(self.show_item_dashboard_with_item)
-        self.item_dashboard_window.child_widget.report_issue_requested.connect(self.show_report_issue)
-
-    def on_login_successful(self, username, password):
-        self.username = username
-        self.password = password
-        self.item_dashboard_window.child_widget.set_credentials(username, password)
-        self.report_issue_window.child_widget.set_credentials(username, password)
+        QShortcut(QKeySequence("Ctrl+Shift+M"), self).activated.connect(self.show_metrics)
+        self.startup_marks = [("main window", elapsed_ms())]
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if len(self.startup_marks) == 1:
+            # Runs once the event loop has painted the login form
+            QTimer.singleShot(0, self.on_first_paint)
+
+    def closeEvent(self, event):
+        if self.session is not None:
+            self.session.close()
+        super().closeEvent(event)
+
+    def on_first_paint(self):
+        self.startup_marks.append(("login shown", elapsed_ms()))
+        logger.info("Startup: " + ", ".join(f"{label} at {ms:.0f} ms" for label, ms in self.startup_marks))
+        # Load the SharePoint SDK while the user types their password
+        self.jobs.submit("warmup", importlib.import_module, "sharepoint_utils",
+                         on_result=lambda _: logger.info(f"Startup: SharePoint client loaded at {elapsed_ms():.0f} ms"))
+
+    def show_metrics(self):
+        from metrics_panel import MetricsPanel
+        MetricsPanel(self).exec()
+
+    def screen(self, name):
+        if name not in self.screens:
+            built_at = time.perf_counter()
+            screen = CenteredWidget(self.screen_builders[name]())
+            self.central_widget.addWidget(screen)
+            self.screens[name] = screen
+            logger.debug(f"Built {name} screen in {(time.perf_counter() - built_at) * 1000:.0f} ms")
+        return self.screens[name]
+
+    def show_screen(self, name):
+        screen = self.screen(name)
+        self.central_widget.setCurrentWidget(screen)
+        return screen.child_widget
+
+    def build_home(self):
+        from home_window import HomeWindow
+        home = HomeWindow(self)
+        home.show_inventory_requested.connect(self.show_inventory)
+        home.show_submit_ticket_requested.connect(self.show_submit_ticket)
+        home.show_item_dashboard_requested.connect(self.show_item_dashboard)
+        home.show_tickets_requested.connect(self.show_tickets)
+        home.show_analytics_requested.connect(self.show_analytics)
+        home.show_scan_requested.connect(self.show_scan)
+        return home
+
+    def build_inventory(self):
+        from inventory_window import InventoryWindow
+        inventory = InventoryWindow(self)
+        inventory.set_cache(self.inventory_cache, self.search_index, self.item_cache)
+        inventory.set_user_directory(self.user_directory)
+        inventory.session = self.session
+        inventory.item_selected.connect(self.show_item_dashboard_with_item)
+        return inventory
+
+    def build_item_dashboard(self):
+        from item_dashboard_window import ItemDashboardWindow
+        dashboard = ItemDashboardWindow(self)
+        dashboard.set_cache(self.inventory_cache, self.search_index, self.item_cache)
+        dashboard.set_ticket_store(self.ticket_store)
+        dashboard.set_user_directory(self.user_directory)
+        dashboard.set_outbox(self.outbox)
+        dashboard.set_session(self.session)
+        dashboard.report_issue_requested.connect(self.show_report_issue)
+        dashboard.show_tickets_requested.connect(self.show_item_tickets)
+        return dashboard
+
+    def build_report_issue(self):
+        from report_issue_window import ReportIssueWindow
+        report = ReportIssueWindow(self)
+        report.set_item_cache(self.item_cache)
+        report.set_outbox(self.outbox)
+        report.set_session(self.session)
+        return report
+
+    def build_tickets(self):
+        from tickets_window import TicketsWindow
+        tickets = TicketsWindow(self)
+        tickets.set_store(self.ticket_store)
+        tickets.set_user_directory(self.user_directory)
+        tickets.set_session(self.session)
+        tickets.item_selected.connect(self.show_item_dashboard_with_item)
+        return tickets
+
+    def build_scan(self):
+        from scan_window import ScanWindow
+        scan = ScanWindow(self)
+        scan.set_cache(self.inventory_cache, self.search_index, self.item_cache)
+        scan.set_session(self.session)
+        scan.item_selected.connect(self.show_item_dashboard_with_item)
+        return scan
+
+    def build_analytics(self):
+        # NumPy is only loaded if the analytics screen is opened
+        from analytics_window import AnalyticsWindow
+        from inventory_analytics import InventoryAnalytics
+        analytics = InventoryAnalytics()
+        # Built from the search index now (or when it is), then kept in step with it
+        self.search_index.watch(analytics)
+        window = AnalyticsWindow(self)
+        window.set_analytics(analytics)
+        return window
+
+    def on_login_successful(self, session):
+        if self.session is not None and self.session is not session:
+            # Signed in again: the old sign-in's contexts and connections go
+            self.session.close()
+        self.session = session
         self.show_home()
+        for name in ("item_dashboard", "report_issue", "tickets", "scan"):
+            if name in self.screens:
+                self.screens[name].child_widget.set_session(session)
+        # Building the inventory screen here also starts indexing and the cache sync
+        inventory = self.screen("inventory").child_widget
+        inventory.session = session
+        inventory.sync_cache()
+        self.outbox.set_session(session)
+        # Only needed when the inventory screen will list from SharePoint
+        page_size = inventory.page_size if self.inventory_cache.is_empty() else None
+        self.jobs.submit("login_warmup", self.warm_up, session, page_size,
+                         on_result=self.on_warmed_up,
+                         on_error=lambda e: logger.warning(f"Error warming up: {str(e)}", exc_info=e))
+
+    def warm_up(self, session, page_size):
+        # Runs on the worker pool; the stages run side by side on their own bounded pool
+        from sharepoint_utils import get_current_user, get_sharepoint_list_items, refresh_list_schema
+        from request_scheduler import background
+        from warmup import warm_up
+        stages = {
+            "current_user": lambda: get_current_user(session),
+            "schema": lambda: refresh_list_schema(session, inventory_schema, schema_path),
+            "tickets": lambda: self.ticket_store.sync(session),
+            "users": lambda: self.user_directory.refresh(session)
+        }
+        if page_size is not None:
+            stages["inventory_page"] = lambda: get_sharepoint_list_items(session, "Inventory", page_size=page_size)
+        # Behind anything the user asks for in the meantime
+        return warm_up({name: background(stage) for name, stage in stages.items()})
+
+    def on_warmed_up(self, results):
+        for name, (_, _, error) in results.items():
+            if error is not None:
+                logger.warning(f"Error warming up {name}: {str(error)}", exc_info=error)
+        if "inventory_page" in results and results["inventory_page"][2] is None:
+            items, has_next, _, _ = results["inventory_page"][1]
+            self.item_cache.put_many(items)
+            self.screen("inventory").child_widget.store_page((None, None, 1), (items, has_next))
+        if results["tickets"][2] is None:
+            self.on_tickets_changed()
+
+    def on_tickets_changed(self):
+        # Open counts come from the local store, so refreshing them is cheap
+        if "item_dashboard" in self.screens:
+            self.screens["item_dashboard"].child_widget.update_ticket_count()
+        if "tickets" in self.screens:
+            self.screens["tickets"].child_widget.reload()
+
+    def show_pending_count(self, count):
+        if count:
+            self.statusBar().showMessage(f"{count} change(s) waiting to be sent to SharePoint")
+        else:
+            self.statusBar().clearMessage()
+
+    def describe_op(self, op):
+        payload = op["payload"]
+        if op["kind"] == "update":
+            return f"your edit to item {payload['item_id']} ({', '.join(payload['properties'])})"
+        return f"your ticket \"{payload['title']}\""
+
+    def on_outbox_applied(self, op):
+        # A sent edit changes the item's version everywhere it is kept
+        if op["kind"] == "update":
+            item_id = op["payload"]["item_id"]
+            properties = {"ETag": op.get("result")}
+            self.item_cache.update_fields(item_id, properties)
+            self.search_index.update_fields(item_id, properties)
+            self.inventory_cache.update_fields(item_id, properties)
+        elif op["kind"] == "issue" and op.get("result") is not None:
+            # The new ticket shows up without waiting for the next sync
+            self.ticket_store.upsert_tickets([op["result"]])
+            self.on_tickets_changed()
+
+    def on_outbox_conflict(self, op):
+        box = QMessageBox(QMessageBox.Icon.Warning, "Conflict",
+                          f"Someone else changed the item before {self.describe_op(op)} was sent.\n\n"
+                          "Overwrite their changes with yours, or discard yours?", parent=self)
+        overwrite_button = box.addButton("Overwrite", QMessageBox.ButtonRole.AcceptRole)
+        box.addButton("Discard Mine", QMessageBox.ButtonRole.DestructiveRole)
+        box.exec()
+        if box.clickedButton() is overwrite_button:
+            self.outbox.retry(op["id"], dict(op["payload"], etag=None))
+        else:
+            self.outbox.discard(op["id"])
+            self.restore_item(op)
+
+    def on_outbox_failed(self, op):
+        box = QMessageBox(QMessageBox.Icon.Warning, "Not Sent",
+                          f"SharePoint rejected {self.describe_op(op)}:\n{op['error']}", parent=self)
+        retry_button = box.addButton("Retry", QMessageBox.ButtonRole.AcceptRole)
+        box.addButton("Discard", QMessageBox.ButtonRole.DestructiveRole)
+        box.exec()
+        if box.clickedButton() is retry_button:
+            self.outbox.retry(op["id"])
+        else:
+            self.outbox.discard(op["id"])
+            self.restore_item(op)
+
+    def restore_item(self, op):
+        # A discarded edit was already shown locally. A delta sync won't undo
+        # it (SharePoint's copy hasn't changed), so re-read the item.
+        if op["kind"] != "update" or self.session is None:
+            return
+        from sharepoint_utils import get_sharepoint_item
+        item_id = op["payload"]["item_id"]
+        self.jobs.submit(f"restore:{item_id}", get_sharepoint_item, self.session, op["payload"]["list_name"], item_id,
+                         on_result=lambda item: self.on_item_restored(item_id, item),
+                         on_error=lambda e: self.on_item_restored(item_id, None))
+
+    def on_item_restored(self, item_id, item):
+        # Without a fresh copy, at least stop opening the discarded values
+        store_reloaded_items([item_id], None if item is None else [item],
+                             self.inventory_cache, self.search_index, self.item_cache)
+        if item is not None and "item_dashboard" in self.screens:
+            dashboard = self.screens["item_dashboard"].child_widget
+            if str(dashboard.item_id) == str(item_id):
+                dashboard.populate_form(item)
+        if "inventory" in self.screens:
+            inventory = self.screens["inventory"].child_widget
+            inventory.page_cache.clear()
+            if inventory.isVisible():
+                inventory.load_items(field=inventory.current_field, value=inventory.current_value)
 
     def show_home(self):
-        self.central_widget.setCurrentWidget(self.home_window)
+        self.show_screen("home")
 
     def show_inventory(self):
-        self.inventory_window.child_widget.set_credentials(self.username, self.password)
-        self.central_widget.setCurrentWidget(self.inventory_window)
+        self.show_screen("inventory").set_session(self.session)
 
     def show_submit_ticket(self):
-        self.report_issue_window.child_widget.reset_fields()
-        self.central_widget.setCurrentWidget(self.report_issue_window)
+        self.show_screen("report_issue").reset_fields()
 
     def show_item_dashboard(self):
-        self.item_dashboard_window.child_widget.clear_form()
-        self.central_widget.setCurrentWidget(self.item_dashboard_window)
+        self.show_screen("item_dashboard").clear_form()
+
+    def show_tickets(self):
+        tickets = self.show_screen("tickets")
+        tickets.set_session(self.session)
+        tickets.show_all()
+
+    def show_scan(self):
+        scan = self.show_screen("scan")
+        scan.set_session(self.session)
+        scan.start()
+
+    def show_analytics(self):
+        try:
+            analytics = self.show_screen("analytics")
+        except ImportError as e:
+            QMessageBox.warning(self, "Analytics", f"The analytics view needs NumPy: {str(e)}")
+            return
+        analytics.refresh()
+
+    def show_item_tickets(self, item_id):
+        tickets = self.show_screen("tickets")
+        tickets.set_session(self.session)
+        tickets.show_item(item_id)
 
     def show_item_dashboard_with_item(self, item_id):
-        self.item_dashboard_window.child_widget.load_item(item_id)
-        self.central_widget.setCurrentWidget(self.item_dashboard_window)
+        self.show_screen("item_dashboard").load_item(item_id)
 
     def show_report_issue(self, item_id):
-        self.report_issue_window.child_widget.set_credentials(self.username, self.password)
-        self.report_issue_window.child_widget.set_item_id(item_id)
-        self.central_widget.setCurrentWidget(self.report_issue_window)
+        report = self.show_screen("report_issue")
+        report.set_session(self.session)
+        report.set_item_id(item_id)
 
 if __name__ == '__main__':
+    # Per-request detail only when asked for, e.g. ADVTECHHELP_LOG_LEVEL=DEBUG
+    logging.basicConfig(level=os.environ.get("ADVTECHHELP_LOG_LEVEL", "INFO").upper())
     app = QApplication(sys.argv)
     main_window = MainWindow()
     main_window.show()
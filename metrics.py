@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Histogram bucket upper bounds, in seconds
+duration_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Recent durations kept per operation for the percentiles
+sample_size = 2048
+
+class OperationStats:
+    __slots__ = ("calls", "errors", "retries", "items", "bytes", "total_seconds", "buckets", "recent")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.items = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * (len(duration_buckets) + 1)
+        self.recent = deque(maxlen=sample_size)
+
+    def add(self, seconds, items, size, retries, failed):
+        self.calls += 1
+        self.errors += failed
+        self.retries += retries
+        self.items += items
+        self.bytes += size
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(duration_buckets):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+class Operation:
+    """What one timed call saw. items is set by the caller; bytes and retries
+    are added by the request hooks and retry paths while it is running."""
+
+    __slots__ = ("name", "items", "bytes", "retries")
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.retries = 0
+
+class Metrics:
+    """Duration, size, item count and retry figures for every SharePoint
+    operation, kept in memory for the life of the app."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {}
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def timed(self, name):
+        operation = Operation(name)
+        stack = self._stack()
+        stack.append(operation)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield operation
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+            with self._lock:
+                stats = self.stats.get(name)
+                if stats is None:
+                    stats = self.stats[name] = OperationStats()
+                stats.add(seconds, operation.items, operation.bytes, operation.retries, failed)
+
+    def add_bytes(self, size):
+        # Called from the request hook; counts toward the innermost running operation
+        stack = self._stack()
+        if stack:
+            stack[-1].bytes += size
+
+    def add_retry(self, count=1):
+        stack = self._stack()
+        if stack:
+            stack[-1].retries += count
+
+    def add_items(self, count):
+        stack = self._stack()
+        if stack:
+            stack[-1].items += count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "items": stats.items,
+                    "bytes": stats.bytes,
+                    "total_seconds": round(stats.total_seconds, 4),
+                    "p50_seconds": stats.percentile(0.5),
+                    "p95_seconds": stats.percentile(0.95),
+                    "buckets": dict(zip([str(bound) for bound in duration_buckets] + ["+Inf"], stats.buckets))
+                }
+                for name, stats in sorted(self.stats.items())
+            }
+
+    def to_json(self):
+        return json.dumps({"generated": time.time(), "operations": self.snapshot()}, indent=2)
+
+    def to_openmetrics(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+
+        snapshot = self.snapshot()
+        family("sharepoint_operation_seconds", "histogram", "Duration of SharePoint operations.")
+        for name, stats in snapshot.items():
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                lines.append(f'sharepoint_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'sharepoint_operation_seconds_sum{{operation="{name}"}} {stats["total_seconds"]}')
+            lines.append(f'sharepoint_operation_seconds_count{{operation="{name}"}} {stats["calls"]}')
+        for metric, key, help_text in (
+            ("sharepoint_operation_errors", "errors", "Failed SharePoint operations."),
+            ("sharepoint_operation_retries", "retries", "Retries inside SharePoint operations."),
+            ("sharepoint_operation_items", "items", "Items read or written by SharePoint operations."),
+            ("sharepoint_operation_response_bytes", "bytes", "Response bytes received by SharePoint operations.")
+        ):
+            family(metric, "counter", help_text)
+            for name, stats in snapshot.items():
+                lines.append(f'{metric}_total{{operation="{name}"}} {stats[key]}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # .json, or OpenMetrics text for anything else (e.g. .prom, .txt)
+        text = self.to_json() if path.lower().endswith(".json") else self.to_openmetrics()
+        with open(path, "w") as f:
+            f.write(text)
+
+metrics = Metrics()
+
+def instrumented(name, count=None):
+    """Time every call of the decorated function under name. count maps the
+    return value to the number of items it carried."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.timed(name) as operation:
+                result = fn(*args, **kwargs)
+                if count is not None:
+                    operation.items = count(result)
+                return result
+        return wrapper
+    return decorate
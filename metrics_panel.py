@@ -0,0 +1,54 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
+                             QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox)
+from metrics import metrics
+
+class MetricsPanel(QDialog):
+    """Debug view of the SharePoint call metrics, opened with Ctrl+Shift+M."""
+
+    headers = ["Operation", "Calls", "Errors", "Retries", "Items", "KB", "p50 ms", "p95 ms"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("SharePoint Metrics")
+        self.resize(700, 400)
+
+        layout = QVBoxLayout()
+        self.table = QTableWidget(0, len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh)
+        export_button = QPushButton("Export...")
+        export_button.clicked.connect(self.export)
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(export_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        def ms(seconds):
+            return "" if seconds is None else f"{seconds * 1000:.0f}"
+
+        snapshot = metrics.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, (name, stats) in enumerate(snapshot.items()):
+            values = [name, stats["calls"], stats["errors"], stats["retries"], stats["items"],
+                      f"{stats['bytes'] / 1024:.1f}", ms(stats["p50_seconds"]), ms(stats["p95_seconds"])]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Metrics", "sharepoint_metrics.json",
+                                              "JSON (*.json);;OpenMetrics (*.prom *.txt)")
+        if not path:
+            return
+        try:
+            metrics.export(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Export", f"Could not write {path}: {str(e)}")
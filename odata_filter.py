@@ -0,0 +1,158 @@
+from decimal import Decimal, InvalidOperation
+from list_schema import number_types, date_types, user_types, lookup_types, text_types
+
+class Condition:
+    """One field test: op is "eq", "startswith" or "contains". Fields are
+    display names, values are what the user typed. A condition renders to an
+    OData filter when SharePoint can answer it without scanning the list, and
+    can always be checked locally against a mapped item."""
+
+    __slots__ = ("field", "op", "value")
+
+    def __init__(self, field, op, value):
+        if op not in ("eq", "startswith", "contains"):
+            raise ValueError(f"Unknown filter operator: {op}")
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def fields(self):
+        return {self.field}
+
+    def matches(self, item):
+        # Case-insensitive, like SharePoint's own comparisons
+        actual = item.get(self.field)
+        if self.op == "eq" and isinstance(actual, Decimal):
+            try:
+                return actual == Decimal(str(self.value).strip().replace("$", "").replace(",", ""))
+            except InvalidOperation:
+                return False
+        actual = "" if actual is None else str(actual).lower()
+        wanted = str(self.value).lower()
+        if self.op == "eq":
+            return actual == wanted
+        if self.op == "startswith":
+            return actual.startswith(wanted)
+        return wanted in actual
+
+    def render(self, schema):
+        """OData filter text, or None if the condition should be checked
+        locally: anything on a non-indexed column (which fails past the list
+        view threshold) and every "contains" (which can't use an index)."""
+        info = schema.field_info(self.field)
+        if info is None or self.op == "contains":
+            return None
+        name, field_type, indexed = info
+        if not indexed:
+            return None
+        if self.op == "startswith":
+            if field_type not in text_types:
+                return None
+            return f"startswith({name}, {_text_literal(self.value)})"
+        if field_type in text_types:
+            return f"{name} eq {_text_literal(self.value)}"
+        if field_type in date_types:
+            day = _date_literal(self.value)
+            if day is None:
+                return None
+            return f"({name} ge datetime'{day}T00:00:00Z' and {name} le datetime'{day}T23:59:59Z')"
+        if field_type in number_types or field_type in user_types or field_type in lookup_types or field_type == "Counter":
+            number = _number_literal(self.value, integer=field_type not in number_types)
+            return None if number is None else f"{name} eq {number}"
+        return None
+
+    def __repr__(self):
+        return f"{self.op}({self.field!r}, {self.value!r})"
+
+class _Group:
+    __slots__ = ("conditions",)
+    joiner = None
+
+    def __init__(self, *conditions):
+        self.conditions = tuple(conditions)
+
+    def fields(self):
+        return set().union(*(condition.fields() for condition in self.conditions))
+
+    def render(self, schema):
+        parts = [condition.render(schema) for condition in self.conditions]
+        if not parts or None in parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        return "(" + f" {self.joiner} ".join(parts) + ")"
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.conditions!r}"
+
+class AllOf(_Group):
+    __slots__ = ()
+    joiner = "and"
+
+    def matches(self, item):
+        return all(condition.matches(item) for condition in self.conditions)
+
+class AnyOf(_Group):
+    __slots__ = ()
+    joiner = "or"
+
+    def matches(self, item):
+        return any(condition.matches(item) for condition in self.conditions)
+
+def eq(field, value):
+    return Condition(field, "eq", value)
+
+def startswith(field, value):
+    return Condition(field, "startswith", value)
+
+def contains(field, value):
+    return Condition(field, "contains", value)
+
+def all_of(*conditions):
+    return AllOf(*conditions)
+
+def any_of(*conditions):
+    return AnyOf(*conditions)
+
+def _text_literal(value):
+    # OData string literals escape a quote by doubling it
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _number_literal(value, integer=False):
+    text = str(value).strip().replace("$", "").replace(",", "")
+    try:
+        return str(int(text)) if integer else repr(float(text))
+    except ValueError:
+        return None
+
+def _date_literal(value):
+    text = str(value).strip().split("T")[0]
+    parts = text.split("-")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    return text
+
+def split_for_server(query, schema):
+    """Split a query into (OData filter or None, residual query or None).
+    The filter is what SharePoint can answer from its indexes; the residual
+    is checked locally on the rows the filter returns. Items match the query
+    exactly when they pass both."""
+    if query is None:
+        return None, None
+    rendered = query.render(schema)
+    if rendered is not None:
+        return rendered, None
+    if isinstance(query, AllOf):
+        # Send the indexed parts and keep the rest
+        server_parts = []
+        residual = []
+        for condition in query.conditions:
+            part, rest = split_for_server(condition, schema)
+            if part is not None:
+                server_parts.append(part)
+            if rest is not None:
+                residual.append(rest)
+        server_filter = " and ".join(server_parts) if server_parts else None
+        return server_filter, (AllOf(*residual) if residual else None)
+    # An OR with any local part has to be checked locally as a whole
+    return None, query
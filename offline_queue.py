@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from inventory_cache import cache_dir
+from workers import JobRunner
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+outbox_path = os.path.join(cache_dir, "outbox.sqlite3")
+
+# Retry delays grow 5s, 10s, 20s ... up to five minutes
+retry_base_delay = 5
+retry_max_delay = 5 * 60
+flush_interval = 30 * 1000  # milliseconds
+
+class Outbox(QObject):
+    """Durable journal of edits and tickets. Work is accepted immediately and
+    replayed to SharePoint in order by a background flusher. A network
+    failure stops the replay and retries later with backoff, so later
+    operations never overtake earlier ones. Conflicts and rejected
+    operations are parked and reported instead of blocking the queue."""
+
+    pending_changed = pyqtSignal(int)
+    op_applied = pyqtSignal(object)
+    op_conflicted = pyqtSignal(object)
+    op_failed = pyqtSignal(object)
+
+    def __init__(self, path=outbox_path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.session = None
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS ops (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                error TEXT
+            )""")
+            # Anything interrupted mid-send is retried on the next run
+            conn.execute("UPDATE ops SET status = 'pending' WHERE status = 'sending'")
+
+        self.jobs = JobRunner(self)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start(flush_interval)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _to_op(self, row):
+        op = dict(row)
+        op["payload"] = json.loads(op["payload"])
+        return op
+
+    def set_session(self, session):
+        self.session = session
+        for op in self.parked():
+            if op["status"] == "conflict":
+                self.op_conflicted.emit(op)
+            else:
+                self.op_failed.emit(op)
+        self.flush()
+
+    def enqueue(self, kind, payload):
+        with self._lock, self._connect() as conn:
+            op_id = None
+            if kind == "update":
+                # Fold into an unsent update of the same item, keeping its ETag
+                rows = conn.execute("SELECT id, payload FROM ops WHERE kind = 'update' AND status = 'pending'").fetchall()
+                for row in rows:
+                    existing_payload = json.loads(row["payload"])
+                    if str(existing_payload["item_id"]) == str(payload["item_id"]):
+                        existing_payload["properties"].update(payload["properties"])
+                        conn.execute("UPDATE ops SET payload = ? WHERE id = ?", (json.dumps(existing_payload), row["id"]))
+                        op_id = row["id"]
+                        break
+
+            if op_id is None:
+                op_id = conn.execute(
+                    "INSERT INTO ops (kind, payload, created) VALUES (?, ?, ?)",
+                    (kind, json.dumps(payload), datetime.now().isoformat(timespec="seconds"))
+                ).lastrowid
+        logger.debug(f"Queued {kind} operation {op_id}")
+        self.pending_changed.emit(self.pending_count())
+        self.flush()
+        return op_id
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM ops WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    def parked(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM ops WHERE status IN ('conflict', 'failed') ORDER BY id").fetchall()
+        return [self._to_op(row) for row in rows]
+
+    def discard(self, op_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ops WHERE id = ?", (op_id,))
+        self.pending_changed.emit(self.pending_count())
+
+    def retry(self, op_id, payload=None):
+        # Put a parked operation back in line, optionally with a new payload
+        with self._connect() as conn:
+            if payload is not None:
+                conn.execute("UPDATE ops SET payload = ? WHERE id = ?", (json.dumps(payload), op_id))
+            conn.execute("UPDATE ops SET status = 'pending', attempts = 0, next_attempt = 0, error = NULL WHERE id = ?",
+                         (op_id,))
+        self.pending_changed.emit(self.pending_count())
+        self.flush()
+
+    def flush(self):
+        if self.session is None or self.jobs.is_running("flush"):
+            return
+        self.jobs.submit("flush", self.replay, self.session, on_result=self.on_replayed,
+                         on_error=lambda e: logger.error(f"Outbox replay failed: {str(e)}"))
+
+    def replay(self, session):
+        # Runs on the worker pool. Returns (event, op) pairs for the GUI thread.
+        from sharepoint_utils import ItemConflictError
+        events = []
+        while True:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT * FROM ops WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+                if row is None or row["next_attempt"] > time.time():
+                    return events
+                conn.execute("UPDATE ops SET status = 'sending' WHERE id = ?", (row["id"],))
+            op = self._to_op(row)
+
+            try:
+                with metrics.timed(f"outbox_{op['kind']}") as timing:
+                    timing.items = 1
+                    timing.retries = op["attempts"]
+                    op["result"] = self.apply(session, op)
+            except ItemConflictError as e:
+                self._park(op, "conflict", str(e))
+                events.append(("conflict", op))
+                continue
+            except Exception as e:
+                if self._is_rejected(e):
+                    self._park(op, "failed", str(e))
+                    events.append(("failed", op))
+                    continue
+                # Probably offline: keep the order and try again later
+                attempts = op["attempts"] + 1
+                delay = min(retry_base_delay * 2 ** (attempts - 1), retry_max_delay)
+                with self._connect() as conn:
+                    conn.execute("UPDATE ops SET status = 'pending', attempts = ?, next_attempt = ?, error = ? WHERE id = ?",
+                                 (attempts, time.time() + delay, str(e), op["id"]))
+                logger.warning(f"Operation {op['id']} failed (attempt {attempts}), retrying in {delay}s: {str(e)}")
+                return events
+
+            with self._lock, self._connect() as conn:
+                conn.execute("DELETE FROM ops WHERE id = ?", (op["id"],))
+                if op["kind"] == "update" and op["result"]:
+                    self._rebase_updates(conn, op)
+            events.append(("applied", op))
+
+    def _rebase_updates(self, conn, applied):
+        # A later save of the same item, made while this one was being sent,
+        # was based on the version this one replaced. Point it at the version
+        # this one created, or it would conflict with the user's own edit.
+        payload = applied["payload"]
+        rows = conn.execute("SELECT id, payload FROM ops WHERE kind = 'update' AND status = 'pending'").fetchall()
+        for row in rows:
+            later = json.loads(row["payload"])
+            if str(later["item_id"]) == str(payload["item_id"]) and later.get("etag") and \
+                    later.get("etag") == payload.get("etag"):
+                later["etag"] = applied["result"]
+                conn.execute("UPDATE ops SET payload = ? WHERE id = ?", (json.dumps(later), row["id"]))
+
+    def apply(self, session, op):
+        from sharepoint_utils import update_sharepoint_item, add_issue_to_sharepoint, get_user_id
+        payload = op["payload"]
+        if op["kind"] == "update":
+            return update_sharepoint_item(session, payload["list_name"], payload["item_id"],
+                                          payload["properties"], payload.get("etag"))
+        if op["kind"] == "issue":
+            user_id = get_user_id(session)
+            return add_issue_to_sharepoint(session, "Tickets", payload["title"], payload["description"],
+                                           payload["priority"], user_id, payload.get("item_id"))
+        raise ValueError(f"Unknown operation kind: {op['kind']}")
+
+    def _is_rejected(self, e):
+        # SharePoint understood the request and refused it; retrying won't help
+        from office365.runtime.client_request_exception import ClientRequestException
+        if isinstance(e, ClientRequestException) and e.response is not None:
+            status = e.response.status_code
+            return 400 <= status < 500 and status not in (401, 403, 408, 429)
+        return isinstance(e, ValueError)
+
+    def _park(self, op, status, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE ops SET status = ?, error = ? WHERE id = ?", (status, error, op["id"]))
+        op["status"] = status
+        op["error"] = error
+        logger.warning(f"Operation {op['id']} parked as {status}: {error}")
+
+    def on_replayed(self, events):
+        for event, op in events:
+            if event == "applied":
+                self.op_applied.emit(op)
+            elif event == "conflict":
+                self.op_conflicted.emit(op)
+            else:
+                self.op_failed.emit(op)
+        self.pending_changed.emit(self.pending_count())
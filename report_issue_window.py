@@ -1,16 +1,20 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QFormLayout, QLineEdit, QTextEdit, QComboBox, QPushButton, QMessageBox
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import pyqtSignal, Qt
 from PyQt6.QtGui import QColor, QPalette, QFont
-from sharepoint_utils import add_issue_to_sharepoint, get_user_id, get_sharepoint_item
+from sharepoint_utils import get_sharepoint_item
+from workers import JobRunner
 
 class ReportIssueWindow(QWidget):
     issue_reported = pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.username = ""
-        self.password = ""
+        self.session = None
         self.item_id = ""
+        self.outbox = None
+        self.item_cache = None
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
         self.init_ui()
 
     def init_ui(self):
@@ -56,9 +60,14 @@ class ReportIssueWindow(QWidget):
 
         self.setLayout(layout)
 
-    def set_credentials(self, username, password):
-        self.username = username
-        self.password = password
+    def set_session(self, session):
+        self.session = session
+
+    def set_outbox(self, outbox):
+        self.outbox = outbox
+
+    def set_item_cache(self, item_cache):
+        self.item_cache = item_cache
 
     def set_item_id(self, item_id):
         self.item_id = item_id
@@ -66,14 +75,24 @@ class ReportIssueWindow(QWidget):
             self.prefill_title()
 
     def prefill_title(self):
-        try:
-            item = get_sharepoint_item(self.username, self.password, "Inventory", self.item_id)
+        # Usually opened from the dashboard, which already has the item
+        item = self.item_cache.get(self.item_id) if self.item_cache is not None else None
+        if item is not None:
+            self.on_item_loaded(item)
+            return
+
+        self.jobs.submit("prefill", get_sharepoint_item, self.session, "Inventory", self.item_id,
+                         on_result=self.on_item_loaded,
+                         on_error=lambda e: print(f"Error prefilling title: {str(e)}"))
+
+    def on_item_loaded(self, item):
+        # Don't overwrite a title the user already started typing
+        if not self.title_input.text():
             item_name = item.get('Item', '')
             self.title_input.setText(f"Issue with {item_name}")
-        except Exception as e:
-            print(f"Error prefilling title: {str(e)}")
 
     def reset_fields(self):
+        self.jobs.cancel("prefill")
         self.title_input.clear()
         self.description_input.clear()
         self.priority_combo.setCurrentIndex(0)
@@ -88,26 +107,20 @@ class ReportIssueWindow(QWidget):
             QMessageBox.warning(self, "Error", "Title and description are required.")
             return
 
-        try:
-            user_id = get_user_id(self.username, self.password, self.username)
-
-            add_issue_to_sharepoint(
-                self.username, 
-                self.password, 
-                "Tickets", 
-                title, 
-                description, 
-                priority, 
-                user_id,
-                self.item_id
-            )
-
-            QMessageBox.information(self, "Success", "Issue reported successfully!")
-            self.issue_reported.emit()
-            self.reset_fields()
-            self.go_back()
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}")
+        # Journaled first so the ticket survives a dropped connection
+        self.outbox.enqueue("issue", {"title": title, "description": description,
+                                      "priority": priority, "item_id": self.item_id})
+        QMessageBox.information(self, "Success", "Issue reported. It is sent to SharePoint in the background.")
+        self.issue_reported.emit()
+        self.reset_fields()
+        self.go_back()
+
+    def set_busy(self, busy):
+        self.submit_button.setEnabled(not busy)
+        if busy:
+            self.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.unsetCursor()
 
     def go_back(self):
         main_window = self.window()
@@ -0,0 +1,161 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from functools import wraps
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# SharePoint's throttling responses; the request was not processed, so any
+# method can be sent again
+throttled_statuses = (429, 503)
+
+def retry_after_seconds(response):
+    """The Retry-After header in seconds (it may be a number or an HTTP
+    date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+class RequestScheduler:
+    """Every SharePoint HTTP request goes through send(). At most
+    max_in_flight run at once, and interactive requests are let through
+    before background ones, which can never take the last
+    reserved_interactive slots. Throttled responses are retried: a
+    Retry-After pauses all requests for as long as it says, since
+    SharePoint throttles the whole user or app; without one the request
+    backs off on its own with jittered exponential delays of at most
+    max_delay."""
+
+    def __init__(self, max_in_flight=8, reserved_interactive=2, max_attempts=6, base_delay=1.0, max_delay=60.0):
+        self.max_in_flight = max_in_flight
+        self.reserved_interactive = reserved_interactive
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._waiting = []
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    def current_priority(self):
+        return getattr(self._local, "priority", INTERACTIVE)
+
+    @contextmanager
+    def priority(self, priority):
+        previous = self.current_priority()
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def _limit(self, priority):
+        if priority == INTERACTIVE:
+            return self.max_in_flight
+        return max(self.max_in_flight - self.reserved_interactive, 1)
+
+    def _acquire(self, priority):
+        ticket = (priority, next(self._order))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._waiting[0] == ticket and self._in_flight < self._limit(priority):
+                    heapq.heappop(self._waiting)
+                    self._in_flight += 1
+                    # The next in line may be able to go too
+                    self._condition.notify_all()
+                    return
+                self._condition.wait(wait if wait > 0 else None)
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _pause(self, seconds):
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def backoff(self, attempt):
+        # Half fixed, half random, so throttled clients don't all come back at once
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def send(self, send, request, prepare=None):
+        priority = self.current_priority()
+        if prepare is not None:
+            # Before taking a slot: signing a write fetches a form digest,
+            # which is a scheduled request of its own and needs a slot too
+            prepare(request)
+        attempt = 1
+        while True:
+            self._acquire(priority)
+            try:
+                response = send(request)
+            finally:
+                self._release()
+            if response.status_code not in throttled_statuses or attempt >= self.max_attempts:
+                return response
+
+            retry_after = retry_after_seconds(response)
+            metrics.add_retry()
+            if retry_after is not None:
+                # Honoured in full: coming back early only gets throttled harder
+                logger.warning(f"Throttled ({response.status_code}); pausing requests for {retry_after:.1f}s")
+                self._pause(retry_after)
+            else:
+                delay = self.backoff(attempt)
+                logger.warning(f"Throttled ({response.status_code}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+            attempt += 1
+
+    def attach(self, client_request, transport):
+        # Route an SDK request object's HTTP calls through send(). transport
+        # sends a request that is already prepared, in place of the SDK's
+        # execute_request_direct, which runs beforeExecute itself
+        client_request.execute_request_direct = lambda request: self.send(
+            transport, request, prepare=client_request.beforeExecute.notify)
+        return client_request
+
+scheduler = RequestScheduler()
+
+def carry_priority(fn):
+    """Wrap fn to run at the calling thread's priority, for work handed to
+    another thread (an executor), which would otherwise run as interactive."""
+    priority = scheduler.current_priority()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with scheduler.priority(priority):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def background(fn):
+    """Wrap fn so the SharePoint requests it makes on its thread are
+    scheduled as background work (prefetch, sync, warm-up)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with scheduler.priority(BACKGROUND):
+            return fn(*args, **kwargs)
+    return wrapper
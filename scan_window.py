@@ -0,0 +1,261 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton,
+                             QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QMessageBox)
+from PyQt6.QtCore import pyqtSignal, QTimer
+from PyQt6.QtGui import QColor, QPalette, QFont
+from sharepoint_utils import find_items_by_serial, serial_is_indexed, update_and_reload_items
+from workers import JobRunner
+from inventory_cache import store_reloaded_items
+
+class ScanWindow(QWidget):
+    """Scan mode for inventory walks with a USB barcode scanner (which types
+    the tag and presses Enter). Each S/N is resolved through the search
+    index's exact serial map and added to the scan list; an audit pass then
+    marks every item found as seen at one location in a single bulk update."""
+
+    item_selected = pyqtSignal(str)
+
+    headers = ["S/N", "Item", "Location", "Result"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.session = None
+        self.cache = None
+        self.search_index = None
+        self.item_cache = None
+        # One entry per scanned tag: {"serial", "item_id", "item", "location", "result"}
+        self.scans = []
+        self.scanned = {}
+        # Scans waiting for the search index, when S/N isn't indexed on the server
+        self.waiting = []
+        self.index_timer = QTimer(self)
+        self.index_timer.setInterval(500)
+        self.index_timer.timeout.connect(self.resolve_waiting)
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Scan Mode")
+        self.setFixedSize(700, 600)
+
+        # Set default font for the entire widget
+        self.setFont(QFont("Arial", 14))
+
+        # Set background color
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor("#f0f0f0"))
+        self.setPalette(palette)
+
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+
+        self.scan_input = QLineEdit()
+        self.scan_input.setPlaceholderText("Scan or type a serial number")
+        self.scan_input.returnPressed.connect(self.handle_scan)
+        form_layout.addRow("S/N:", self.scan_input)
+
+        self.location_input = QLineEdit()
+        self.location_input.setPlaceholderText("Where this audit pass is taking place")
+        form_layout.addRow("Location:", self.location_input)
+        layout.addLayout(form_layout)
+
+        self.open_checkbox = QCheckBox("Open each item as it is scanned")
+        layout.addWidget(self.open_checkbox)
+
+        self.table = QTableWidget(0, len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.doubleClicked.connect(lambda index: self.open_scan(index.row()))
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        button_layout = QHBoxLayout()
+        self.mark_seen_button = QPushButton("Mark Seen at Location")
+        self.mark_seen_button.clicked.connect(self.mark_seen)
+        button_layout.addWidget(self.mark_seen_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear_scans)
+        button_layout.addWidget(clear_button)
+        back_button = QPushButton("Back")
+        back_button.clicked.connect(self.go_back)
+        button_layout.addWidget(back_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def set_session(self, session):
+        self.session = session
+
+    def set_cache(self, cache, search_index, item_cache):
+        self.cache = cache
+        self.search_index = search_index
+        self.item_cache = item_cache
+
+    def start(self):
+        # Ready for the scanner as soon as the screen shows
+        self.scan_input.setFocus()
+        self.update_status()
+
+    def handle_scan(self):
+        serial = self.scan_input.text().strip()
+        self.scan_input.clear()
+        if not serial:
+            return
+
+        key = serial.lower()
+        if key in self.scanned:
+            # Scanned twice in one pass; point at the first scan instead of adding a row
+            self.table.selectRow(self.scanned[key])
+            self.status_label.setText(f"{serial} was already scanned.")
+            return
+        self.scanned[key] = len(self.scans)
+
+        if self.search_index is not None and self.search_index.ready:
+            self.add_scan(serial, self.find_in_index(serial))
+            return
+
+        # A row now, filled in when the answer comes, so the scan order is kept
+        self.add_scan(serial, None)
+        if serial_is_indexed():
+            # One small request while the local index is still loading
+            self.jobs.submit(f"scan:{key}", find_items_by_serial, self.session, serial,
+                             on_result=lambda items: self.resolve_scan(key, items),
+                             on_error=lambda e: self.resolve_scan(key, None, str(e)))
+        else:
+            # Without an S/N index every lookup would walk the whole list, so
+            # the scan waits for the local index instead
+            self.scans[-1]["result"] = "Waiting for the inventory to load..."
+            self.show_scan(len(self.scans) - 1)
+            self.waiting.append(key)
+            self.index_timer.start()
+
+    def find_in_index(self, serial):
+        items = [self.search_index.get(item_id) for item_id in self.search_index.find_serial(serial)]
+        return [item for item in items if item is not None]
+
+    def resolve_waiting(self):
+        if self.search_index is None or not self.search_index.ready:
+            return
+        self.index_timer.stop()
+        waiting, self.waiting = self.waiting, []
+        for key in waiting:
+            row = self.scanned.get(key)
+            if row is not None:
+                self.resolve_scan(key, self.find_in_index(self.scans[row]["serial"]))
+
+    def add_scan(self, serial, items):
+        self.scans.append({"serial": serial, "item_id": None, "item": "", "location": "", "result": "Looking up..."})
+        self.table.setRowCount(len(self.scans))
+        if items is None:
+            self.show_scan(len(self.scans) - 1)
+        else:
+            self.resolve_scan(serial.lower(), items)
+        self.table.scrollToBottom()
+
+    def resolve_scan(self, key, items, error=None):
+        row = self.scanned.get(key)
+        if row is None:
+            # The list was cleared while SharePoint was answering
+            return
+        scan = self.scans[row]
+        if error is not None:
+            scan["result"] = f"Lookup failed: {error}"
+        elif not items:
+            scan["result"] = "Not found"
+        elif len(items) > 1:
+            # The same tag on several items needs a person to sort out
+            scan["result"] = f"{len(items)} items share this S/N"
+        else:
+            item = items[0]
+            if self.item_cache is not None:
+                self.item_cache.put(item)
+            scan["item_id"] = int(item['ID'])
+            scan["item"] = item.get('Item', '')
+            scan["location"] = item.get('Location', '') or ''
+            scan["result"] = "Found"
+            if self.open_checkbox.isChecked():
+                self.item_selected.emit(str(scan["item_id"]))
+        self.show_scan(row)
+        self.update_status()
+
+    def show_scan(self, row):
+        scan = self.scans[row]
+        for column, value in enumerate([scan["serial"], scan["item"], scan["location"], scan["result"]]):
+            self.table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def open_scan(self, row):
+        item_id = self.scans[row]["item_id"]
+        if item_id is not None:
+            self.item_selected.emit(str(item_id))
+
+    def update_status(self):
+        found = sum(1 for scan in self.scans if scan["item_id"] is not None)
+        self.status_label.setText(f"{len(self.scans)} scanned, {found} found")
+
+    def mark_seen(self):
+        location = self.location_input.text().strip()
+        if not location:
+            QMessageBox.warning(self, "Error", "Enter the location of this audit pass first.")
+            return
+        found = [scan for scan in self.scans if scan["item_id"] is not None]
+        if not found:
+            QMessageBox.warning(self, "Error", "No scanned items have been found yet.")
+            return
+
+        # Items already recorded at this location need no write
+        updates = {scan["item_id"]: {"Location": location} for scan in found if scan["location"] != location}
+        if not updates:
+            QMessageBox.information(self, "Audit", f"All {len(found)} items are already recorded at {location}.")
+            return
+        self.jobs.submit("mark_seen", update_and_reload_items, self.session, "Inventory", updates,
+                         on_result=lambda result: self.on_marked_seen(location, updates, *result, len(found)),
+                         on_error=lambda e: QMessageBox.warning(self, "Error", f"An error occurred: {str(e)}"))
+
+    def on_marked_seen(self, location, updates, errors, items, found_count):
+        # Reflect the moves locally, new versions included, without waiting for
+        # a sync; also after the scan list was cleared meanwhile
+        store_reloaded_items([item_id for item_id in updates if item_id not in errors], items,
+                             self.cache, self.search_index, self.item_cache)
+
+        for row, scan in enumerate(self.scans):
+            if scan["item_id"] in errors:
+                scan["result"] = f"Not updated: {errors[scan['item_id']]}"
+            elif scan["item_id"] in updates:
+                scan["location"] = location
+                scan["result"] = f"Moved to {location}"
+            else:
+                continue
+            self.show_scan(row)
+
+        moved = len(updates) - len(errors)
+        message = f"{found_count} items seen at {location}; {moved} moved there."
+        if errors:
+            QMessageBox.warning(self, "Audit", f"{message}\n{len(errors)} could not be updated.")
+        else:
+            QMessageBox.information(self, "Audit", message)
+
+    def clear_scans(self):
+        # A running mark_seen is left to finish: SharePoint applies it either
+        # way, and its result carries the new versions for the local copies
+        self.index_timer.stop()
+        self.waiting = []
+        self.scans = []
+        self.scanned = {}
+        self.table.setRowCount(0)
+        self.update_status()
+        self.scan_input.setFocus()
+
+    def set_busy(self, busy):
+        self.mark_seen_button.setEnabled(not busy)
+
+    def go_back(self):
+        main_window = self.window()
+        if hasattr(main_window, 'show_home'):
+            main_window.show_home()
+        else:
+            print("Error: MainWindow does not have a show_home method")
@@ -0,0 +1,165 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Free-text columns get an n-gram index, low-cardinality ones an exact map
+text_fields = ("Item", "Description", "S/N")
+exact_fields = ("Location", "Status", "Funding")
+gram_size = 3
+# Scanned tags are looked up by exact serial number
+serial_field = "S/N"
+
+def _grams(text):
+    return {text[i:i + gram_size] for i in range(len(text) - gram_size + 1)}
+
+class InventorySearchIndex:
+    """In-memory index over the mapped inventory fields, answering the same
+    case-insensitive "contains" searches as substringof without a round trip.
+    Results come back in ID order with exact matches first, then prefix
+    matches."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.items = {}
+        self.ready = False
+        self._values = {}
+        self._serials = {}
+        self._grams = {field: {} for field in text_fields}
+        self._exact = {field: {} for field in exact_fields}
+        # Objects with build(items) and update(items, deleted_ids) that follow
+        # every change to the index, e.g. the analytics aggregates
+        self.watchers = []
+
+    def watch(self, watcher):
+        with self._lock:
+            self.watchers.append(watcher)
+            if self.ready:
+                watcher.build(list(self.items.values()))
+
+    def build(self, items):
+        # Build into a fresh index and swap it in, so searches never see a half-built one
+        fresh = InventorySearchIndex()
+        for item in items:
+            fresh._add(item)
+        with self._lock:
+            self.items = fresh.items
+            self._values = fresh._values
+            self._serials = fresh._serials
+            self._grams = fresh._grams
+            self._exact = fresh._exact
+            self.ready = True
+            for watcher in self.watchers:
+                watcher.build(list(self.items.values()))
+        logger.debug(f"Search index built over {len(self.items)} items")
+
+    def _add(self, item):
+        item_id = int(item['ID'])
+        self.items[item_id] = item
+        values = {}
+        for field, value in item.items():
+            text = '' if value is None else str(value).lower()
+            values[field] = text
+            if field in self._grams:
+                for gram in _grams(text):
+                    self._grams[field].setdefault(gram, set()).add(item_id)
+            elif field in self._exact:
+                self._exact[field].setdefault(text, set()).add(item_id)
+        self._values[item_id] = values
+        serial = values.get(serial_field, '').strip()
+        if serial:
+            self._serials.setdefault(serial, set()).add(item_id)
+
+    def _remove(self, item_id):
+        values = self._values.pop(item_id, None)
+        self.items.pop(item_id, None)
+        if values is None:
+            return
+        serial = values.get(serial_field, '').strip()
+        ids = self._serials.get(serial)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self._serials[serial]
+        for field, postings in self._grams.items():
+            for gram in _grams(values.get(field, '')):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del postings[gram]
+        for field, postings in self._exact.items():
+            ids = postings.get(values.get(field, ''))
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del postings[values.get(field, '')]
+
+    def update(self, items, deleted_ids=()):
+        with self._lock:
+            for item_id in deleted_ids:
+                self._remove(int(item_id))
+            for item in items:
+                self._remove(int(item['ID']))
+                self._add(item)
+            for watcher in self.watchers:
+                watcher.update(items, deleted_ids)
+
+    def update_fields(self, item_id, properties):
+        with self._lock:
+            item = self.items.get(int(item_id))
+            if item is None:
+                return
+            self.update([dict(item, **properties)])
+
+    def get(self, item_id):
+        return self.items.get(int(item_id))
+
+    def snapshot(self):
+        # Every item in ID order, copied under the lock so a sync running at
+        # the same time can't change the dict mid-iteration
+        with self._lock:
+            return [self.items[item_id] for item_id in sorted(self.items)]
+
+    def find_serial(self, value):
+        # IDs of the items whose S/N is exactly value (ignoring case and
+        # surrounding spaces); more than one means the tag is duplicated
+        with self._lock:
+            return sorted(self._serials.get(str(value).strip().lower(), ()))
+
+    def search(self, field, value):
+        query = str(value).lower()
+        with self._lock:
+            if not query:
+                return sorted(self.items)
+
+            if field in self._exact:
+                # Few distinct values, so matching every key is cheap. An exact
+                # key hit is only ranked first: "room 1" still finds "Room 10".
+                candidates = set()
+                for key, ids in self._exact[field].items():
+                    if query in key:
+                        candidates |= ids
+            elif field in self._grams and len(query) >= gram_size:
+                postings = self._grams[field]
+                candidates = None
+                for gram in sorted(_grams(query), key=lambda g: len(postings.get(g, ()))):
+                    ids = postings.get(gram)
+                    if not ids:
+                        return []
+                    candidates = set(ids) if candidates is None else candidates & ids
+                    if not candidates:
+                        return []
+            else:
+                candidates = self._values.keys()
+
+            values = self._values
+            matches = [item_id for item_id in candidates if query in values[item_id].get(field, '')]
+
+            def rank(item_id):
+                text = values[item_id].get(field, '')
+                return (text != query, not text.startswith(query), item_id)
+
+            # Ranked under the lock too; an update may remove the values meanwhile
+            matches.sort(key=rank)
+        return matches
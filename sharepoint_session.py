@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+import weakref
+import requests
+from requests import HTTPError
+from office365.runtime.auth.user_credential import UserCredential
+from office365.runtime.client_request_exception import ClientRequestException
+from office365.runtime.odata.v3.batch_request import ODataBatchV3Request
+from office365.runtime.odata.v3.json_light_format import JsonLightFormat
+from office365.runtime.odata.request import ODataRequest
+from office365.runtime.http.http_method import HttpMethod
+from office365.runtime.http.request_options import RequestOptions
+from office365.runtime.types.event_handler import EventHandler
+from office365.sharepoint.client_context import ClientContext
+from office365.sharepoint.webs.context_web_information import ContextWebInformation
+from metrics import metrics
+from request_scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# SharePoint Online sign-in cookies last a few hours; re-authenticate well
+# before that so a long-running session never sends an expired token.
+TOKEN_LIFETIME = 60 * 60  # seconds
+REFRESH_MARGIN = 5 * 60  # seconds
+
+class _Lease:
+    # Held in a thread-local; when the thread ends it is collected and its
+    # finalizer gives the object back to the pool
+    __slots__ = ("state", "__weakref__")
+
+    def __init__(self, state):
+        self.state = state
+
+class ThreadLocalPool:
+    """Objects used by one thread at a time (a requests.Session, a
+    ClientContext). A thread keeps the one it got until it ends, when it goes
+    back to the pool, so short-lived worker threads reuse them instead of
+    each building its own. At most max_idle are kept idle, and only those
+    reusable says are fit; the rest are closed. reset() closes the idle
+    ones, and the ones in use as their threads give them back or next ask
+    for one."""
+
+    def __init__(self, create, close=None, max_idle=8, reusable=None):
+        self._create = create
+        self._close = close
+        self._reusable = reusable
+        self.max_idle = max_idle
+        # Reentrant: a finalizer may give an object back on a thread holding it
+        self._lock = threading.RLock()
+        self._idle = []
+        self._local = threading.local()
+        self._generation = 0
+
+    def get(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is not None and lease.state["generation"] == self._generation:
+            return lease.state["value"]
+        with self._lock:
+            generation = self._generation
+            value = self._idle.pop() if self._idle else None
+        if value is None:
+            value = self._create()
+        state = {"value": value, "generation": generation}
+        # Replacing an outdated lease gives its object back right away
+        self._local.lease = _Lease(state)
+        weakref.finalize(self._local.lease, self._give_back, state)
+        return value
+
+    def discard(self):
+        # Close this thread's object instead of reusing it, e.g. after a failure
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            lease.state["generation"] = None
+            del self._local.lease
+
+    def _give_back(self, state):
+        reusable = self._reusable is None or self._reusable(state["value"])
+        with self._lock:
+            if reusable and state["generation"] == self._generation and len(self._idle) < self.max_idle:
+                self._idle.append(state["value"])
+                return
+        if self._close is not None:
+            self._close(state["value"])
+
+    def reset(self):
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        if self._close is not None:
+            for value in idle:
+                self._close(value)
+
+# The SDK sends with requests.get/post, which open a new connection (and TLS
+# handshake) for every call; a Session keeps connections to the site alive
+# and reuses them. A Session isn't safe to share between threads.
+_http_sessions = ThreadLocalPool(requests.Session, lambda session: session.close())
+
+def http_session():
+    # This thread's requests.Session
+    return _http_sessions.get()
+
+def close_http_sessions():
+    # On sign-in and sign-out, so no connection outlives the session it served
+    _http_sessions.reset()
+
+def pooled_send(request):
+    """The transport for RequestScheduler.attach: what
+    ClientRequest.execute_request_direct does after beforeExecute, over
+    http_session()."""
+    options = {"headers": request.headers, "auth": request.auth, "verify": request.verify,
+               "proxies": request.proxies}
+    if request.method == HttpMethod.Get:
+        options["stream"] = request.stream
+    elif request.method == HttpMethod.Put or (request.method == HttpMethod.Post and
+                                              (request.is_bytes or request.is_file)):
+        options["data"] = request.data
+    elif request.method != HttpMethod.Delete:
+        options["json"] = request.data
+    return http_session().request(request.method, request.url, **options)
+
+def scheduled(client_request):
+    # Pooled connections, with throttling retries and priorities
+    return scheduler.attach(client_request, pooled_send)
+
+def _count_response(response):
+    # Response sizes for the metrics; $batch requests go through a separate
+    # request object and aren't counted here
+    metrics.add_bytes(len(response.content or b""))
+
+def query_entity(query):
+    # The object a query creates (its return type) or updates (its binding)
+    return query.binding_type if query.return_type is None else query.return_type
+
+class PerItemBatchRequest(ODataBatchV3Request):
+    """A $batch request that processes every sub-response. The SDK's raises
+    on the first failed one, which leaves the outcome of the rest unknown;
+    this records each failure in failures (query -> ClientRequestException)
+    and carries on."""
+
+    def __init__(self, json_format):
+        super().__init__(json_format)
+        self.failures = {}
+
+    def process_response(self, response, query):
+        for sub_qry, sub_resp in self._extract_response(response, query):
+            try:
+                sub_resp.raise_for_status()
+            except HTTPError as e:
+                self.failures[sub_qry] = ClientRequestException(*e.args, response=e.response)
+                continue
+            ODataRequest.process_response(self, sub_resp, sub_qry)
+
+class ScheduledClientContext(ClientContext):
+    """ClientContext whose requests, single, $batch and the form digest's
+    /contextinfo, go through the request scheduler for throttling retries
+    and priorities, over this thread's pooled HTTP session."""
+
+    def pending_request(self):
+        if self._pending_request is None:
+            scheduled(super().pending_request())
+        return self._pending_request
+
+    def _run_batch(self, batch_request, items_per_batch, success_callback=None):
+        scheduled(batch_request)
+        batch_request.beforeExecute += self._authenticate_request
+        batch_request.beforeExecute += self._ensure_form_digest
+        while self.has_pending_request:
+            qry = self._get_next_query(items_per_batch)
+            batch_request.execute_query(qry)
+            if callable(success_callback):
+                success_callback(items_per_batch)
+        return batch_request
+
+    def execute_batch(self, items_per_batch=100, success_callback=None):
+        # As ClientContext.execute_batch, with the batch request scheduled
+        self._run_batch(ODataBatchV3Request(JsonLightFormat()), items_per_batch, success_callback)
+        return self
+
+    def execute_batch_each(self, items_per_batch=100):
+        """Send the pending queries as $batch requests and return
+        [(entity, ClientRequestException)] for the sub-requests that failed,
+        entity being the object each query created or updated. The others
+        were applied. A failure of a $batch request as a whole still raises."""
+        batch_request = self._run_batch(PerItemBatchRequest(JsonLightFormat()), items_per_batch)
+        return [(query_entity(query), error) for query, error in batch_request.failures.items()]
+
+    def _get_context_web_information(self):
+        # As ClientContext._get_context_web_information, with the digest
+        # request scheduled; it is sent before the first write of each context
+        client = scheduled(ODataRequest(JsonLightFormat()))
+        client.beforeExecute += self._authenticate_request
+        for e in self.pending_request().beforeExecute:
+            if not EventHandler.is_system(e):
+                client.beforeExecute += e
+        request = RequestOptions("{0}/contextInfo".format(self.service_root_url()))
+        request.method = HttpMethod.Post
+        response = client.execute_request_direct(request)
+        try:
+            response.raise_for_status()
+        except HTTPError as e:
+            raise ClientRequestException(*e.args, response=e.response)
+        json_format = JsonLightFormat()
+        json_format.function = "GetContextWebInformation"
+        return_value = ContextWebInformation()
+        client.map_json(response.json(), return_value, json_format)
+        return return_value
+
+class SharePointSession:
+    """One authenticated connection to the site, created at login and shared
+    by every screen. Each thread uses its own ClientContext (the SDK's pending
+    query queue is not thread safe), but they all reuse the same auth context,
+    so a normal workflow signs in once instead of once per request. Contexts
+    are pooled, so a worker thread picks up one whose form digest is already
+    fetched."""
+
+    def __init__(self, site_url, username, password):
+        self.site_url = site_url
+        self.username = username
+        # Profile of the signed-in user (id, name, email, login), set at login
+        self.current_user = None
+        self._credentials = UserCredential(username, password)
+        self._lock = threading.Lock()
+        self._contexts = ThreadLocalPool(self._new_context, reusable=lambda ctx: not ctx.has_pending_request)
+        self._auth_context = None
+        self._generation = 0
+        self._expires_at = 0
+
+    def _new_context(self):
+        ctx = ScheduledClientContext(self.site_url, self._auth_context)
+        ctx.pending_request().afterExecute += _count_response
+        return ctx
+
+    def authenticate(self, seen_generation=None):
+        with self._lock:
+            # Another thread already refreshed while we waited for the lock
+            if seen_generation is not None and seen_generation != self._generation:
+                return None
+
+            with metrics.timed("authenticate"):
+                ctx = ScheduledClientContext(self.site_url).with_credentials(self._credentials)
+                ctx.pending_request().afterExecute += _count_response
+                web = ctx.web
+                ctx.load(web)
+                ctx.execute_query()
+
+            self._auth_context = ctx.authentication_context
+            self._generation += 1
+            self._expires_at = time.monotonic() + TOKEN_LIFETIME
+            # Contexts made with the old sign-in are dropped as they come back
+            self._contexts.reset()
+            close_http_sessions()
+            logger.debug(f"Authenticated {self.username} (generation {self._generation})")
+        return ctx
+
+    def needs_refresh(self):
+        return time.monotonic() >= self._expires_at - REFRESH_MARGIN
+
+    def discard_context(self):
+        # Drop this thread's context, e.g. after a failed batch left queries queued
+        self._contexts.discard()
+
+    def context(self):
+        if self.needs_refresh():
+            self.authenticate(self._generation)
+        return self._contexts.get()
+
+    def close(self):
+        # Signing out or in as someone else: nothing of this session is reused
+        self._contexts.reset()
+        close_http_sessions()
@@ -1,27 +1,39 @@
 import logging
-from office365.runtime.auth.user_credential import UserCredential
-from office365.sharepoint.client_context import ClientContext
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from office365.runtime.client_request_exception import ClientRequestException
+from office365.runtime.http.http_method import HttpMethod
+from sharepoint_session import SharePointSession, query_entity
+from list_schema import inventory_schema, ticket_schema
+from odata_filter import Condition, eq, contains, all_of, split_for_server
+from metrics import metrics, instrumented
+from request_scheduler import carry_priority
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # SharePoint configuration
 site_url = 'https://academiedavinci.sharepoint.com/sites/ADVTechHelp'
 inventory_list_name = 'Inventory'
 
-def test_sharepoint_connection(username, password):
+class ItemConflictError(Exception):
+    """Raised when an item changed on the server since it was loaded."""
+
+def _item_etag(item):
+    # List item ETags are the quoted owshiddenversion, which bumps on every update
+    version = item.properties.get('owshiddenversion')
+    return f'"{version}"' if version is not None else None
+
+@instrumented("login")
+def open_sharepoint_session(username, password):
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
-        web = ctx.web
-        ctx.load(web)
-        ctx.execute_query()
-        return True
+        session = SharePointSession(site_url, username, password)
+        # The current user is resolved by the warm-up after login
+        session.authenticate()
+        return session
     except ClientRequestException as e:
         logger.error(f"ClientRequestException: {str(e)}")
-        if isinstance(e.response, HttpResponse):
+        if e.response is not None:
             logger.error(f"Response status code: {e.response.status_code}")
             logger.error(f"Response content: {e.response.content}")
         if "AADSTS50126" in str(e):
@@ -32,143 +44,554 @@ def test_sharepoint_connection(username, password):
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise ValueError(f"An unexpected error occurred: {str(e)}")
 
-def get_sharepoint_list_items(username, password, list_name, page_size=100, page_number=1, field=None, value=None):
+# Page cursors for server-side paging, keyed by (list_name, search_filter, residual, page_size).
+# cursors[n] is the last item ID before page n + 1, which is what SharePoint's
+# "Paged=TRUE&p_ID=<id>" skiptoken encodes, so page 1 always starts after ID 0.
+# Least recently used listings are dropped past max_page_cursors, since every
+# typed search gets an entry.
+_page_cursors = OrderedDict()
+_page_cursors_lock = threading.Lock()
+max_page_cursors = 32
+
+def _page_query(target_list, search_filter, after_id, page_size):
+    query_filter = f"ID gt {after_id}"
+    if search_filter:
+        query_filter = f"({search_filter}) and {query_filter}"
+    return target_list.items.filter(query_filter).order_by("ID").top(page_size).select(inventory_schema.select)
+
+def _listing_query(field, value, query):
+    # The screens' one-field search is a "contains", as substringof was;
+    # query adds any other conditions
+    if field and value:
+        search = contains(field, value)
+        query = search if query is None else all_of(search, query)
+    return query
+
+def _listing_filter(field, value, query):
+    """(OData filter, residual query) for a listing. Only indexed
+    eq/startswith tests go to SharePoint, the residual is checked here on
+    what comes back."""
+    return split_for_server(_listing_query(field, value, query), inventory_schema)
+
+def needs_scan(field, value, query=None):
+    """True if SharePoint can't answer the search from its indexes, so
+    without a local index it means walking the list."""
+    return _listing_filter(field, value, query)[1] is not None
+
+def _scan_matches(target_list, search_filter, residual, paging, wanted, scan_size=2000):
+    # Walk the list by ID (always indexed, so safe past the view threshold),
+    # reading only the columns the residual needs, until wanted IDs match or
+    # the list ends. Later pages carry on from where the last walk stopped.
+    names = {"ID"}
+    for field in residual.fields():
+        info = inventory_schema.field_info(field)
+        if info is not None:
+            names.add(info[0])
+    ids = paging["ids"]
+    while not paging["done"] and len(ids) < wanted:
+        page = _page_query(target_list, search_filter, paging["after_id"], scan_size).select(sorted(names)).get().execute_query()
+        for item in page:
+            if residual.matches(inventory_schema.decode(item.properties)):
+                ids.append(item.properties['ID'])
+        if len(page) < scan_size:
+            paging["done"] = True
+        else:
+            paging["after_id"] = page[len(page) - 1].properties['ID']
+
+def _items_by_ids(target_list, ids):
+    if not ids:
+        return []
+    query_filter = " or ".join(f"ID eq {item_id}" for item_id in ids)
+    return target_list.items.filter(query_filter).order_by("ID").top(len(ids)).select(inventory_schema.select).get().execute_query()
+
+def _load_page_cursors(ctx, target_list, search_filter, page_size, residual=None):
+    if residual is not None:
+        # Part of the search is answered locally: matching IDs are collected
+        # by a scan that only goes as far as the pages asked for so far, and
+        # each page is then fetched by ID
+        return {"ids": [], "after_id": 0, "done": False, "lock": threading.Lock()}
+
+    if search_filter:
+        # There is no item count for a filtered view, so fetch only the IDs
+        # once per search; that gives both the count and every page cursor.
+        ids = [item.properties['ID'] for item in
+               target_list.items.filter(search_filter).select(["ID"]).get_all().execute_query()]
+        cursors = [0] + ids[page_size - 1::page_size]
+        return {"cursors": cursors, "total": len(ids), "lock": threading.Lock()}
+
+    ctx.load(target_list, ["ItemCount"])
+    ctx.execute_query()
+    return {"cursors": [0], "total": target_list.item_count, "lock": threading.Lock()}
+
+def _page_cursors_for(cursor_key, reset, load):
+    with _page_cursors_lock:
+        paging = None if reset else _page_cursors.get(cursor_key)
+        if paging is not None:
+            _page_cursors.move_to_end(cursor_key)
+            return paging
+    # Loaded outside the lock, so other listings aren't held up by the request
+    paging = load()
+    with _page_cursors_lock:
+        _page_cursors[cursor_key] = paging
+        _page_cursors.move_to_end(cursor_key)
+        while len(_page_cursors) > max_page_cursors:
+            _page_cursors.popitem(last=False)
+    return paging
+
+def _find_page_cursor(target_list, search_filter, cursors, page_number, page_size):
+    # Walk forward from the last known cursor, fetching IDs only
+    while len(cursors) < page_number:
+        ids = _page_query(target_list, search_filter, cursors[-1], page_size).select(["ID"]).get().execute_query()
+        if len(ids) == 0:
+            break
+        cursors.append(ids[len(ids) - 1].properties['ID'])
+    return cursors[min(page_number, len(cursors)) - 1]
+
+def _indexed_page(search_index, query, page_size, page_number):
+    """Page page_number of the items matching query, answered from the
+    local search index in ID order, as the server pages are."""
+    if isinstance(query, Condition) and query.op == "contains":
+        ids = sorted(search_index.search(query.field, query.value))
+    else:
+        ids = [int(item['ID']) for item in search_index.snapshot() if query.matches(item)]
+    total_pages = max((len(ids) + page_size - 1) // page_size, 1)
+    page_number = min(max(page_number, 1), total_pages)
+    start = (page_number - 1) * page_size
+    items = [search_index.get(item_id) for item_id in ids[start:start + page_size]]
+    return [item for item in items if item is not None], page_number < total_pages, page_number, total_pages
+
+def _map_list_item(item):
+    return inventory_schema.decode(item.properties, _item_etag(item))
+
+@instrumented("list_items", count=lambda result: len(result[0]))
+def get_sharepoint_list_items(session, list_name, page_size=100, page_number=1, field=None, value=None, query=None,
+                              search_index=None):
+    """One page of the list as (items, has_next, page_number, total_pages).
+    A search SharePoint can't answer from an index is answered from
+    search_index when it is ready; otherwise the list is scanned only as
+    far as this page needs, so total_pages is a lower bound until the scan
+    reaches the end."""
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
+        search_filter, residual = _listing_filter(field, value, query)
+        if residual is not None and search_index is not None and search_index.ready:
+            return _indexed_page(search_index, _listing_query(field, value, query), page_size, page_number)
+
+        ctx = session.context()
         target_list = ctx.web.lists.get_by_title(list_name)
-        items_query = target_list.items
-
-        if field and value:
-            field_mappings = {
-                "Item": "Title",
-                "Description": "field_1",
-                "S/N": "field_2",
-                "Location": "field_3",
-                "Condition": "Condition",
-                "Assigned To": "AssignedTo",
-                "Date": "field_4",
-                "Cost": "field_5",
-                "Funding": "field_6",
-                "Status": "field_7"
-            }
-            internal_field_name = field_mappings.get(field, field)
-            items_query = items_query.filter(f"substringof('{value}', {internal_field_name})")
-
-        all_items = items_query.get_all().execute_query()
-        logger.debug(f"Retrieved items: {all_items}")
-        total_items_count = len(all_items)
-        total_pages = (total_items_count + page_size - 1) // page_size
-
-        start_index = (page_number - 1) * page_size
-        end_index = start_index + page_size
-        paged_items = all_items[start_index:end_index]
-
-        field_mappings = {
-            "Title": "Item",
-            "field_1": "Description",
-            "field_2": "S/N",
-            "field_3": "Location",
-            "Condition": "Condition",
-            "AssignedTo": "Assigned To",
-            "field_4": "Date",
-            "field_5": "Cost",
-            "field_6": "Funding",
-            "field_7": "Status"
-        }
 
-        mapped_items = []
-        for item in paged_items:
-            mapped_item = {"ID": item.properties.get('ID', ''), "Item ID": item.properties.get('ID', '')}
-            for internal_name, display_name in field_mappings.items():
-                mapped_item[display_name] = item.properties.get(internal_name, '')
-            mapped_items.append(mapped_item)
+        # Page 1 starts a new listing or search, so refresh the count and cursors
+        cursor_key = (list_name, search_filter, repr(residual), page_size)
+        paging = _page_cursors_for(cursor_key, page_number == 1,
+                                   lambda: _load_page_cursors(ctx, target_list, search_filter, page_size, residual))
+
+        if "ids" in paging:
+            page_number = max(page_number, 1)
+            # One match past this page tells whether there is a next one. A
+            # prefetch of the next page may be scanning the same listing.
+            with paging["lock"]:
+                _scan_matches(target_list, search_filter, residual, paging, page_number * page_size + 1)
+                matched = len(paging["ids"])
+                if paging["done"]:
+                    total_pages = max((matched + page_size - 1) // page_size, 1)
+                    page_number = min(page_number, total_pages)
+                else:
+                    total_pages = page_number + 1
+                start = (page_number - 1) * page_size
+                page_ids = paging["ids"][start:start + page_size]
+            paged_items = _items_by_ids(target_list, page_ids)
+        else:
+            total_items_count = paging["total"]
+            total_pages = max((total_items_count + page_size - 1) // page_size, 1)
+            page_number = min(max(page_number, 1), total_pages)
+
+            # A prefetch of the next page may be walking the same cursors
+            with paging["lock"]:
+                after_id = _find_page_cursor(target_list, search_filter, paging["cursors"], page_number, page_size)
+            paged_items = _page_query(target_list, search_filter, after_id, page_size).get().execute_query()
+
+            # Remember where the next page starts, unless another page got there first
+            if len(paged_items) > 0:
+                with paging["lock"]:
+                    if len(paging["cursors"]) == page_number:
+                        paging["cursors"].append(paged_items[len(paged_items) - 1].properties['ID'])
+        logger.debug(f"Retrieved {len(paged_items)} items for page {page_number} of {total_pages}")
 
+        mapped_items = [_map_list_item(item) for item in paged_items]
         return mapped_items, page_number < total_pages, page_number, total_pages
 
     except Exception as e:
         logger.error(f"Error in get_sharepoint_list_items: {str(e)}", exc_info=True)
         raise
 
-def get_sharepoint_item(username, password, list_name, item_id):
+def serial_is_indexed():
+    # Only then is an exact S/N lookup one small request rather than a walk of the list
+    return inventory_schema.field_info("S/N")[2]
+
+def find_items_by_serial(session, serial):
+    """Items whose S/N is exactly serial. Callers check serial_is_indexed()
+    first, and otherwise wait for the local search index."""
+    items, _, _, _ = get_sharepoint_list_items(session, inventory_list_name, page_size=10, query=eq("S/N", serial))
+    return items
+
+def iter_sharepoint_list_items(session, list_name, page_size=500, field=None, value=None, query=None):
+    """Yield mapped items one page at a time, so callers can stream the whole
+    list without holding it in memory. Pages are filtered locally by any
+    part of the search SharePoint can't answer from an index, so some may
+    be short or empty."""
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
+        ctx = session.context()
         target_list = ctx.web.lists.get_by_title(list_name)
-        
-        item = target_list.items.get_by_id(item_id).get().execute_query()
-
-        field_mappings = {
-            "Title": "Item",
-            "field_1": "Description",
-            "field_2": "S/N",
-            "field_3": "Location",
-            "Condition": "Condition",
-            "AssignedTo": "Assigned To",
-            "field_4": "Date",
-            "field_5": "Cost",
-            "field_6": "Funding",
-            "field_7": "Status"
-        }
 
-        mapped_item = {}
-        for internal_name, display_name in field_mappings.items():
-            mapped_item[display_name] = item.properties.get(internal_name, '')
+        search_filter, residual = _listing_filter(field, value, query)
 
-        logger.debug(f"Retrieved item (ID: {item_id}): {mapped_item}")
-        return mapped_item
+        after_id = 0
+        while True:
+            with metrics.timed("list_page") as operation:
+                page = _page_query(target_list, search_filter, after_id, page_size).get().execute_query()
+                operation.items = len(page)
+            if len(page) == 0:
+                return
+            after_id = page[len(page) - 1].properties['ID']
+            items = [_map_list_item(item) for item in page]
+            yield [item for item in items if residual.matches(item)] if residual is not None else items
+            if len(page) < page_size:
+                return
     except Exception as e:
-        logger.error(f"Error in get_sharepoint_item: {str(e)}", exc_info=True)
+        logger.error(f"Error in iter_sharepoint_list_items: {str(e)}", exc_info=True)
         raise
 
-def update_sharepoint_item(username, password, list_name, item_id, updated_properties):
+@instrumented("list_changes", count=lambda result: len(result[0]))
+def get_sharepoint_list_changes(session, list_name, modified_since=None, schema=inventory_schema):
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
+        ctx = session.context()
         target_list = ctx.web.lists.get_by_title(list_name)
-        item = target_list.items.get_by_id(item_id)
 
-        field_mappings = {
-            "Item": "Title",
-            "Description": "field_1",
-            "S/N": "field_2",
-            "Location": "field_3",
-            "Condition": "Condition",
-            "Assigned To": "AssignedTo",
-            "Date": "field_4",
-            "Cost": "field_5",
-            "Funding": "field_6",
-            "Status": "field_7"
-        }
+        items_query = target_list.items.select(schema.select + ["Modified"])
+        if modified_since:
+            # Modified has one-second resolution, so "gt" would skip an edit made
+            # in the same second as the last synced row; the rows at the
+            # watermark come back again and the upsert makes that harmless
+            items_query = items_query.filter(f"Modified ge datetime'{modified_since}'")
+        changed_items = items_query.get_all().execute_query()
 
-        for display_name, value in updated_properties.items():
-            internal_name = field_mappings.get(display_name)
-            if internal_name:
-                if internal_name == "AssignedTo":
-                    # Handle person field
-                    if value:
-                        item.set_property(f"{internal_name}Id", int(value))
-                    else:
-                        item.set_property(f"{internal_name}Id", None)
-                elif internal_name == "field_5":  # Cost field
-                    item.set_property(internal_name, float(value) if value else None)
-                elif internal_name == "field_4":  # Date field
-                    # Ensure date is in the correct format
-                    item.set_property(internal_name, value if value else None)
-                else:
-                    item.set_property(internal_name, value)
+        mapped_items = [schema.decode(item.properties, _item_etag(item)) for item in changed_items]
+        latest_modified = max([item.properties.get('Modified', '') for item in changed_items] + [modified_since or ''])
+
+        if modified_since:
+            # Deletions never show up in a Modified query, so compare ID sets
+            current_ids = [item.properties['ID'] for item in
+                           target_list.items.select(["ID"]).get_all().execute_query()]
+        else:
+            current_ids = [item["ID"] for item in mapped_items]
+
+        logger.debug(f"Retrieved {len(mapped_items)} changed items from {list_name} since {modified_since}")
+        return mapped_items, current_ids, latest_modified
+    except Exception as e:
+        logger.error(f"Error in get_sharepoint_list_changes: {str(e)}", exc_info=True)
+        raise
+
+@instrumented("get_item", count=lambda result: 1)
+def get_sharepoint_item(session, list_name, item_id):
+    try:
+        ctx = session.context()
+        target_list = ctx.web.lists.get_by_title(list_name)
+        
+        item = target_list.items.get_by_id(item_id).select(inventory_schema.select).get().execute_query()
+        mapped_item = _map_list_item(item)
+
+        logger.debug(f"Retrieved item (ID: {item_id})")
+        return mapped_item
+    except Exception as e:
+        logger.error(f"Error in get_sharepoint_item: {str(e)}", exc_info=True)
+        raise
+
+def _set_item_properties(item, updated_properties):
+    for internal_name, value in inventory_schema.encode(updated_properties).items():
+        item.set_property(internal_name, value)
 
+@instrumented("update_item", count=lambda result: 1)
+def update_sharepoint_item(session, list_name, item_id, updated_properties, etag=None):
+    """Write updated_properties to the item. With an etag the update is
+    conditional (If-Match) and raises ItemConflictError if someone else saved
+    the item first. Returns the item's new ETag when the server reports it."""
+    response_etag = {}
+
+    def set_if_match(request):
+        # The SDK sends If-Match: * on updates; narrow it to the loaded version
+        if request.method == HttpMethod.Post:
+            request.set_header("IF-MATCH", etag)
+
+    def capture_etag(response):
+        response_etag["value"] = response.headers.get("ETag")
+
+    ctx = None
+    try:
+        ctx = session.context()
+        if etag:
+            ctx.pending_request().beforeExecute += set_if_match
+        ctx.pending_request().afterExecute += capture_etag
+
+        target_list = ctx.web.lists.get_by_title(list_name)
+        item = target_list.items.get_by_id(item_id)
+        _set_item_properties(item, updated_properties)
         item.update()
         ctx.execute_query()
-        logger.debug(f"Updated item (ID: {item_id})")
+        logger.debug(f"Updated item (ID: {item_id}) fields: {list(updated_properties)}")
+        return response_etag.get("value")
+    except ClientRequestException as e:
+        if e.response is not None and e.response.status_code == 412:
+            logger.warning(f"Update conflict on item {item_id}: ETag {etag} is stale")
+            session.discard_context()
+            raise ItemConflictError("This item was changed by someone else since you opened it.")
+        logger.error(f"Error in update_sharepoint_item: {str(e)}", exc_info=True)
+        raise
     except Exception as e:
         logger.error(f"Error in update_sharepoint_item: {str(e)}", exc_info=True)
         raise
+    finally:
+        # The context is reused, so don't leave the hooks behind
+        if ctx is not None:
+            if etag:
+                ctx.pending_request().beforeExecute -= set_if_match
+            ctx.pending_request().afterExecute -= capture_etag
+
+def _update_batch(session, list_name, batch, etags):
+    # Send batch ([(item ID, properties, encoded properties)]) as one $batch
+    # request; returns item ID -> ClientRequestException for the failed updates
+    ctx = session.context()
+    target_list = ctx.web.lists.get_by_title(list_name)
+    entities = {}
+    for item_id, _, encoded in batch:
+        item = target_list.items.get_by_id(item_id)
+        for internal_name, value in encoded.items():
+            item.set_property(internal_name, value)
+        item.update()
+        entities[id(item)] = (item, item_id)
 
-def add_issue_to_sharepoint(username, password, list_name, title, description, priority, user_id, item_id=None):
+    def set_if_match(request):
+        # Each part is built with its query current; narrow the SDK's
+        # If-Match: * to the version the caller loaded, where it has one
+        query = ctx.current_query
+        entry = entities.get(id(query_entity(query))) if query is not None else None
+        etag = etags.get(entry[1]) if entry is not None else None
+        if etag and request.url == query.url:
+            request.set_header("IF-MATCH", etag)
+
+    ctx.pending_request().beforeExecute += set_if_match
+    try:
+        failures = ctx.execute_batch_each()
+    finally:
+        ctx.pending_request().beforeExecute -= set_if_match
+    return {entities[id(item)][1]: error for item, error in failures}
+
+@instrumented("update_batch")
+def _update_batch_or_items(session, list_name, batch, etags):
+    metrics.add_items(len(batch))
+    try:
+        failures = _update_batch(session, list_name, batch, etags)
+    except Exception as e:
+        logger.warning(f"Batch of {len(batch)} updates failed, retrying one at a time: {str(e)}")
+        session.discard_context()
+        failures = {item_id: e for item_id, _, _ in batch}
+
+    # Only the updates that failed are sent again, on their own; a version
+    # conflict would only fail again
+    errors = {}
+    retry = []
+    for item_id, updated_properties, _ in batch:
+        if item_id not in failures:
+            continue
+        response = getattr(failures[item_id], "response", None)
+        if response is not None and response.status_code == 412:
+            errors[item_id] = "Changed by someone else since it was loaded; not updated."
+        else:
+            retry.append((item_id, updated_properties))
+    if retry:
+        metrics.add_retry(len(retry))
+    for item_id, updated_properties in retry:
+        try:
+            update_sharepoint_item(session, list_name, item_id, updated_properties, etag=etags.get(item_id))
+        except Exception as e:
+            errors[item_id] = str(e)
+            session.discard_context()
+    return errors
+
+@instrumented("update_items")
+def update_sharepoint_items(session, list_name, updates, batch_size=50, max_workers=4, progress=None, etags=None):
+    """Apply many item updates through $batch requests, a few batches at a
+    time. updates maps item ID -> display-name properties, as for
+    update_sharepoint_item. With etags (item ID -> ETag) those items are
+    only updated if they are still at that version. Returns a dict of item
+    ID -> error message for the items that could not be updated; values
+    their field can't take are reported without being sent."""
+    etags = etags or {}
+    errors = {}
+    update_list = []
+    for item_id, updated_properties in updates.items():
+        try:
+            update_list.append((item_id, updated_properties, inventory_schema.encode(updated_properties)))
+        except ValueError as e:
+            errors[item_id] = str(e)
+    metrics.add_items(len(update_list))
+    batches = [update_list[i:i + batch_size] for i in range(0, len(update_list), batch_size)]
+    done = 0
+    # The pool's threads send at the caller's priority, not as interactive work
+    send_batch = carry_priority(_update_batch_or_items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(send_batch, session, list_name, batch, etags): batch for batch in batches}
+        for future in as_completed(futures):
+            errors.update(future.result())
+            done += len(futures[future])
+            if progress is not None:
+                progress(done, len(update_list))
+    logger.debug(f"Bulk updated {len(updates) - len(errors)} of {len(updates)} items in {list_name}")
+    return errors
+
+@instrumented("get_items", count=len)
+def get_sharepoint_items(session, list_name, item_ids, chunk_size=50):
+    # The mapped items with these IDs, read by ID a chunk at a time; IDs
+    # that no longer exist are left out
+    ctx = session.context()
+    target_list = ctx.web.lists.get_by_title(list_name)
+    item_ids = sorted(int(item_id) for item_id in item_ids)
+    items = []
+    for start in range(0, len(item_ids), chunk_size):
+        items.extend(_map_list_item(item) for item in _items_by_ids(target_list, item_ids[start:start + chunk_size]))
+    return items
+
+def update_and_reload_items(session, list_name, updates, **kwargs):
+    """update_sharepoint_items, then read the updated items back, since
+    $batch responses carry no ETags and the local copies need the new
+    versions for the next conditional save. Returns (errors, items), with
+    items None if the read back failed."""
+    errors = update_sharepoint_items(session, list_name, updates, **kwargs)
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
+        items = get_sharepoint_items(session, list_name, [item_id for item_id in updates if item_id not in errors])
+    except Exception as e:
+        logger.warning(f"Could not read back {len(updates) - len(errors)} updated items: {str(e)}")
+        items = None
+    return errors, items
+
+def _existing_values(session, list_name, internal_name, values):
+    ctx = session.context()
+    target_list = ctx.web.lists.get_by_title(list_name)
+    quoted = (str(value).replace("'", "''") for value in values)
+    query_filter = " or ".join(f"{internal_name} eq '{value}'" for value in quoted)
+    found = target_list.items.filter(query_filter).select([internal_name]).get_all().execute_query()
+    return {item.properties.get(internal_name) for item in found}
+
+def existing_serials(session, list_name, serials):
+    """The given S/Ns that already exist in the list, lowercased. One
+    filtered request, so callers check serial_is_indexed() first."""
+    serials = [serial for serial in serials if serial]
+    if not serials:
+        return set()
+    found = _existing_values(session, list_name, inventory_schema.internal_name("S/N"), serials)
+    return {str(value).strip().lower() for value in found if value}
+
+def _add_item(session, list_name, encoded):
+    try:
+        ctx = session.context()
+        ctx.web.lists.get_by_title(list_name).add_item(encoded).execute_query()
+        return None
+    except Exception as e:
+        session.discard_context()
+        return str(e)
+
+@instrumented("add_items", count=len)
+def add_sharepoint_items(session, list_name, items, unique_field=None):
+    """Create items (display-name properties) in one $batch request. Returns
+    a list with None for each created item or the error message for each
+    failed one. Values are encoded first, so a bad one fails only its own
+    row, and only the creates the batch reports as failed are retried on
+    their own. If the batch fails as a whole, which of its creates went
+    through is unknown: with unique_field set, the ones the list now has are
+    counted as created if the field is indexed, and reported as failed
+    rather than risk creating them twice if it isn't."""
+    results = [None] * len(items)
+    encoded = {}
+    for index, properties in enumerate(items):
+        try:
+            encoded[index] = inventory_schema.encode(properties)
+        except ValueError as e:
+            results[index] = str(e)
+    if not encoded:
+        return results
+
+    retry = []
+    try:
+        ctx = session.context()
+        target_list = ctx.web.lists.get_by_title(list_name)
+        created = {id(target_list.add_item(properties)): index for index, properties in encoded.items()}
+        failures = ctx.execute_batch_each()
+        retry = [created[id(item)] for item, _ in failures]
+        logger.debug(f"Created {len(encoded) - len(retry)} of {len(encoded)} items in {list_name} in one batch")
+    except Exception as e:
+        logger.warning(f"Batch of {len(encoded)} creates failed: {str(e)}")
+        session.discard_context()
+        retry = _unconfirmed_creates(session, list_name, items, encoded, unique_field, results, str(e))
+
+    if retry:
+        metrics.add_retry(len(retry))
+    for index in retry:
+        results[index] = _add_item(session, list_name, encoded[index])
+    return results
+
+def _unconfirmed_creates(session, list_name, items, encoded, unique_field, results, error):
+    # The indexes of a failed batch's creates that are safe to send again
+    if not unique_field:
+        return list(encoded)
+    values = [items[index][unique_field] for index in encoded if items[index].get(unique_field)]
+    existing = None
+    if values and inventory_schema.field_info(unique_field)[2]:
+        try:
+            existing = _existing_values(session, list_name, inventory_schema.internal_name(unique_field), values)
+        except Exception as e:
+            logger.warning(f"Could not check which creates went through: {str(e)}")
+            session.discard_context()
+    elif not values:
+        existing = set()
+
+    retry = []
+    for index in encoded:
+        value = items[index].get(unique_field)
+        if existing is None:
+            # Without an index the check would walk the whole list
+            results[index] = f"{error} (it may have been created; check the list before importing it again)"
+        elif value and value in existing:
+            results[index] = None
+        else:
+            retry.append(index)
+    return retry
+
+@instrumented("field_metadata", count=len)
+def get_list_field_metadata(session, list_name, internal_names):
+    # Internal name -> {"type": TypeAsString, "indexed": bool} for the given columns of a list
+    ctx = session.context()
+    target_list = ctx.web.lists.get_by_title(list_name)
+    query_filter = " or ".join(f"InternalName eq '{name}'" for name in internal_names)
+    fields = target_list.fields.filter(query_filter).select(["InternalName", "TypeAsString", "Indexed"]).get().execute_query()
+    return {
+        field.properties['InternalName']: {"type": field.properties['TypeAsString'],
+                                           "indexed": bool(field.properties.get('Indexed'))}
+        for field in fields
+    }
+
+def refresh_list_schema(session, schema, path, list_name=inventory_list_name):
+    """Check the list's field types and indexes against the saved schema and
+    update it if they changed. Returns True if the schema changed."""
+    metadata = get_list_field_metadata(session, list_name, [field.internal_name for field in schema.fields])
+    version = schema.fingerprint(metadata)
+    if version == schema.version:
+        return False
+    changed = schema.apply_metadata(metadata, version)
+    schema.save(path, metadata)
+    return changed
+
+@instrumented("add_issue", count=lambda result: 1)
+def add_issue_to_sharepoint(session, list_name, title, description, priority, user_id, item_id=None):
+    try:
+        ctx = session.context()
         target_list = ctx.web.lists.get_by_title(list_name)
         
         item_properties = {
@@ -177,25 +600,53 @@ def add_issue_to_sharepoint(username, password, list_name, title, description, p
             'Priority': priority,
             'PersonReportingIssueId': user_id
         }
+        if item_id:
+            # Links the ticket to the Inventory item it was reported against
+            item_properties.update(ticket_schema.encode({'Inventory Item': item_id}))
     
         created_item = target_list.add_item(item_properties).execute_query()
         
         logger.debug(f"Created issue in Tickets list: {title}")
+        return ticket_schema.decode(created_item.properties, _item_etag(created_item))
 
     except Exception as e:
         logger.error(f"Error in add_issue_to_sharepoint: {str(e)}", exc_info=True)
         raise
 
-def get_user_id(username, password, user_email):
+def _user_profile(user):
+    return {
+        "id": user.properties.get('Id'),
+        "name": user.properties.get('Title', ''),
+        "email": user.properties.get('Email', ''),
+        "login": user.properties.get('LoginName', '')
+    }
+
+def get_current_user(session):
+    # Resolved once per session, at login
+    if session.current_user is not None:
+        return session.current_user
     try:
-        user_credentials = UserCredential(username, password)
-        ctx = ClientContext(site_url).with_credentials(user_credentials)
-        
+        ctx = session.context()
         current_user = ctx.web.current_user.get().execute_query()
-        logger.debug(f"Current user: {current_user.properties}")
-        
-        return current_user.id
+        session.current_user = _user_profile(current_user)
+        logger.debug(f"Current user: {session.current_user['name']} (ID: {session.current_user['id']})")
+        return session.current_user
+    except Exception as e:
+        logger.error(f"Error in get_current_user: {str(e)}", exc_info=True)
+        raise
+
+def get_user_id(session):
+    return get_current_user(session)["id"]
 
+@instrumented("site_users", count=len)
+def get_site_users(session):
+    try:
+        ctx = session.context()
+        users = ctx.web.site_users.get().execute_query()
+        # PrincipalType 1 is a person; skip groups and system accounts
+        profiles = [_user_profile(user) for user in users if user.properties.get('PrincipalType') == 1]
+        logger.debug(f"Retrieved {len(profiles)} site users")
+        return profiles
     except Exception as e:
-        logger.error(f"Error in get_user_id: {str(e)}", exc_info=True)
+        logger.error(f"Error in get_site_users: {str(e)}", exc_info=True)
         raise
@@ -0,0 +1,53 @@
+import pytest
+import sharepoint_utils
+from benchmarks.mock_sharepoint import MockSharePoint
+from benchmarks.run import BenchmarkSession
+from list_schema import inventory_schema
+
+@pytest.fixture
+def mock(monkeypatch):
+    # Creates whose S/N is REJECT fail, as a bad value would on SharePoint
+    create = MockSharePoint.create
+
+    def rejecting_create(self, target, body):
+        if body.get(inventory_schema.internal_name("S/N")) == "REJECT":
+            raise ValueError("Rejected")
+        return create(self, target, body)
+
+    monkeypatch.setattr(MockSharePoint, "create", rejecting_create)
+    with MockSharePoint(inventory_size=20, ticket_count=1) as server:
+        yield server
+
+def test_add_items_reports_each_failed_create(mock):
+    session = BenchmarkSession(mock.url)
+    items = [{"Item": "Laptop", "S/N": "NEW1"}, {"Item": "Laptop", "S/N": "REJECT"},
+             {"Item": "Laptop", "S/N": "NEW3", "Cost": "a lot"}, {"Item": "Laptop", "S/N": "NEW4"}]
+    results = sharepoint_utils.add_sharepoint_items(session, "Inventory", items, unique_field="S/N")
+    assert results[0] is None and results[3] is None
+    assert "Rejected" in results[1]
+    assert results[2].startswith("Cost:")
+    serials = [item.get("field_2") for item in mock.lists["inventory"].items]
+    # Created once each, with no second attempt at the ones that went through
+    assert serials.count("NEW1") == 1 and serials.count("NEW4") == 1
+    assert "REJECT" not in serials and "NEW3" not in serials
+
+def test_update_items_retries_only_failed_updates(mock):
+    session = BenchmarkSession(mock.url)
+    inventory = mock.lists["inventory"]
+    fresh = f'"{inventory.by_id[2]["owshiddenversion"]}"'
+    updates = {item_id: {"Location": "Library"} for item_id in range(1, 7)}
+    updates[5] = {"Cost": "a lot"}
+    updates[99] = {"Location": "Library"}
+    requests_before = mock.requests
+
+    errors = sharepoint_utils.update_sharepoint_items(session, "Inventory", updates,
+                                                      etags={1: '"999"', 2: fresh})
+    assert sorted(errors) == [1, 5, 99]
+    assert "someone else" in errors[1]
+    assert errors[5].startswith("Cost:")
+    # The bad value was never sent; the stale version was left as it was
+    assert inventory.by_id[1]["field_3"] != "Library"
+    assert all(inventory.by_id[item_id]["field_3"] == "Library" for item_id in (2, 3, 4, 6))
+    # The batch, the digest for it and one retry of the missing item; the
+    # conflict isn't retried and the rest isn't sent again
+    assert mock.requests - requests_before <= 4
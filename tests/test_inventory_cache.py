@@ -0,0 +1,20 @@
+from datetime import date
+from decimal import Decimal
+from inventory_cache import InventoryCache
+from list_schema import inventory_schema
+
+def test_cached_rows_have_the_server_types(tmp_path):
+    cache = InventoryCache(str(tmp_path / "cache.sqlite3"))
+    record = inventory_schema.decode({"ID": 4, "Title": "Laptop", "field_4": "2024-03-01T08:00:00Z",
+                                      "field_5": 1299.5, "AssignedToId": 12}, etag='"3"')
+    cache.upsert_items([record])
+    item = cache.get_item(4)
+    for name in ("Item", "Date", "Cost", "Assigned To", "Location", "ETag"):
+        assert item[name] == record[name]
+        assert type(item[name]) is type(record[name])
+    assert item["Date"] == date(2024, 3, 1) and item["Cost"] == Decimal("1299.5")
+
+    # Values saved from a form as text read back typed too
+    cache.update_fields(4, {"Cost": "15", "Assigned To": "", "Date": "2024-04-02"})
+    item = cache.get_item(4)
+    assert (item["Cost"], item["Assigned To"], item["Date"]) == (Decimal("15"), "", date(2024, 4, 2))
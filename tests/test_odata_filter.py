@@ -0,0 +1,77 @@
+from decimal import Decimal
+from list_schema import FieldDef, ListSchema
+from odata_filter import eq, startswith, contains, all_of, any_of, split_for_server
+
+# S/N, Date, Cost, Assigned To and Location are indexed; Item isn't
+schema = ListSchema((
+    FieldDef("Item", "Title", "Text", "item"),
+    FieldDef("S/N", "field_2", "Text", "sn", indexed=True),
+    FieldDef("Location", "field_3", "Choice", "location", indexed=True),
+    FieldDef("Assigned To", "AssignedTo", "User", "assigned_to", indexed=True),
+    FieldDef("Date", "field_4", "DateTime", "date", indexed=True),
+    FieldDef("Cost", "field_5", "Currency", "cost", indexed=True),
+))
+
+def test_quotes_are_doubled():
+    assert eq("S/N", "O'Brien's").render(schema) == "field_2 eq 'O''Brien''s'"
+    assert startswith("S/N", "'").render(schema) == "startswith(field_2, '''')"
+
+def test_operators_in_values_stay_inside_the_literal():
+    rendered = eq("S/N", "x' or ID gt 0 or field_2 eq 'y").render(schema)
+    assert rendered == "field_2 eq 'x'' or ID gt 0 or field_2 eq ''y'"
+
+def test_typed_literals():
+    assert eq("Cost", "$1,250.50").render(schema) == "field_5 eq 1250.5"
+    assert eq("Assigned To", "12").render(schema) == "AssignedToId eq 12"
+    assert eq("ID", " 42 ").render(schema) == "ID eq 42"
+    assert eq("Date", "2024-03-01T10:00:00Z").render(schema) == \
+        "(field_4 ge datetime'2024-03-01T00:00:00Z' and field_4 le datetime'2024-03-01T23:59:59Z')"
+
+def test_unparseable_values_are_not_sent():
+    assert eq("Cost", "a lot").render(schema) is None
+    assert eq("Assigned To", "Jane").render(schema) is None
+    assert eq("Date", "March 1").render(schema) is None
+
+def test_local_only_conditions():
+    # Contains can't use an index; Item isn't indexed; unknown fields aren't in the schema
+    assert contains("S/N", "123").render(schema) is None
+    assert eq("Item", "Laptop").render(schema) is None
+    assert eq("Colour", "red").render(schema) is None
+    assert startswith("Cost", "12").render(schema) is None
+
+def test_split_fully_indexed_query():
+    query = all_of(eq("S/N", "A1"), eq("Location", "Library"))
+    assert split_for_server(query, schema) == ("(field_2 eq 'A1' and field_3 eq 'Library')", None)
+
+def test_split_keeps_local_parts_of_an_and():
+    local = contains("Item", "laptop")
+    server_filter, residual = split_for_server(all_of(eq("Location", "Library"), local, eq("Cost", "100")), schema)
+    assert server_filter == "field_3 eq 'Library' and field_5 eq 100.0"
+    assert residual.conditions == (local,)
+
+def test_split_checks_an_or_with_local_parts_locally():
+    query = any_of(eq("S/N", "A1"), contains("Item", "laptop"))
+    assert split_for_server(query, schema) == (None, query)
+
+def test_split_nested_groups():
+    inner = any_of(eq("S/N", "A1"), eq("S/N", "B2"))
+    local = contains("Item", "dell")
+    server_filter, residual = split_for_server(all_of(inner, local), schema)
+    assert server_filter == "(field_2 eq 'A1' or field_2 eq 'B2')"
+    assert residual.conditions == (local,)
+
+def test_split_nothing():
+    assert split_for_server(None, schema) == (None, None)
+    query = contains("Item", "x")
+    assert split_for_server(query, schema) == (None, query)
+
+def test_matches_is_case_insensitive():
+    item = {"Item": "Dell Laptop", "S/N": "AB12", "Cost": Decimal("1250.50")}
+    assert contains("Item", "laptop").matches(item)
+    assert startswith("Item", "dell").matches(item)
+    assert eq("S/N", "ab12").matches(item)
+    assert eq("Cost", "$1,250.5").matches(item)
+    assert not eq("Item", "dell").matches(item)
+    assert all_of(contains("Item", "dell"), eq("S/N", "AB12")).matches(item)
+    assert any_of(eq("S/N", "zz"), contains("Item", "lap")).matches(item)
+    assert not contains("Location", "x").matches(item)
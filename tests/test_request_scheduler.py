@@ -0,0 +1,193 @@
+import threading
+import time
+from email.utils import formatdate
+import pytest
+import request_scheduler
+from request_scheduler import RequestScheduler, INTERACTIVE, BACKGROUND, background, carry_priority, retry_after_seconds
+
+class FakeResponse:
+    def __init__(self, status_code=200, retry_after=None):
+        self.status_code = status_code
+        self.headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+
+def responses(*statuses):
+    # A send function answering with the given responses in turn
+    queue = list(statuses)
+    sent = []
+
+    def send(request):
+        sent.append(request)
+        return queue.pop(0)
+    return send, sent
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(FakeResponse(429, 5)) == 5
+    assert retry_after_seconds(FakeResponse(429, "-3")) == 0
+    assert retry_after_seconds(FakeResponse(429)) is None
+    assert retry_after_seconds(FakeResponse(429, "soon")) is None
+    later = retry_after_seconds(FakeResponse(429, formatdate(time.time() + 30, usegmt=True)))
+    assert 28 <= later <= 30
+
+def test_backoff_is_jittered_and_capped():
+    scheduler = RequestScheduler(base_delay=1.0, max_delay=8.0)
+    for attempt, delay in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (10, 8.0)]:
+        for _ in range(50):
+            assert delay / 2 <= scheduler.backoff(attempt) <= delay
+
+def test_throttled_request_is_retried(monkeypatch):
+    slept = []
+    monkeypatch.setattr(request_scheduler.time, "sleep", slept.append)
+    scheduler = RequestScheduler(base_delay=1.0)
+    send, sent = responses(FakeResponse(503), FakeResponse(429), FakeResponse(200))
+    assert scheduler.send(send, "request").status_code == 200
+    assert sent == ["request"] * 3
+    # Without a Retry-After the delay doubles each attempt
+    assert len(slept) == 2
+    assert 0.5 <= slept[0] <= 1.0
+    assert 1.0 <= slept[1] <= 2.0
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(request_scheduler.time, "sleep", lambda seconds: None)
+    scheduler = RequestScheduler(max_attempts=3)
+    send, sent = responses(*[FakeResponse(429) for _ in range(5)])
+    assert scheduler.send(send, "request").status_code == 429
+    assert len(sent) == 3
+
+def test_other_errors_are_not_retried():
+    scheduler = RequestScheduler()
+    send, sent = responses(FakeResponse(500), FakeResponse(200))
+    assert scheduler.send(send, "request").status_code == 500
+    assert len(sent) == 1
+
+def test_retry_after_is_honoured_past_max_delay():
+    scheduler = RequestScheduler(max_delay=0.01)
+    send, sent = responses(FakeResponse(429, 0.3), FakeResponse(200))
+    started = time.monotonic()
+    assert scheduler.send(send, "request").status_code == 200
+    assert time.monotonic() - started >= 0.3
+
+def test_retry_after_pauses_other_requests():
+    scheduler = RequestScheduler()
+    scheduler._pause(0.3)
+    send, _ = responses(FakeResponse(200))
+    started = time.monotonic()
+    scheduler.send(send, "request")
+    assert time.monotonic() - started >= 0.3
+
+class Blocking:
+    """A send function that holds its slot until released, recording the
+    order requests started in."""
+
+    def __init__(self):
+        self.started = []
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        with self.lock:
+            self.started.append(request)
+        self.release.wait(5)
+        return FakeResponse(200)
+
+def start(scheduler, send, request, priority):
+    def run():
+        with scheduler.priority(priority):
+            scheduler.send(send, request)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.01)
+
+def test_background_cannot_take_reserved_slots():
+    scheduler = RequestScheduler(max_in_flight=3, reserved_interactive=2)
+    send = Blocking()
+    threads = [start(scheduler, send, "background 1", BACKGROUND),
+               start(scheduler, send, "background 2", BACKGROUND)]
+    wait_until(lambda: send.started == ["background 1"])
+
+    # The second background request waits, but interactive ones still get through
+    threads += [start(scheduler, send, "interactive 1", INTERACTIVE),
+                start(scheduler, send, "interactive 2", INTERACTIVE)]
+    wait_until(lambda: len(send.started) == 3)
+    time.sleep(0.05)
+    assert sorted(send.started[1:]) == ["interactive 1", "interactive 2"]
+
+    send.release.set()
+    for thread in threads:
+        thread.join(2)
+    assert send.started[-1] == "background 2"
+
+def test_interactive_requests_go_first():
+    scheduler = RequestScheduler(max_in_flight=1, reserved_interactive=0)
+    send = Blocking()
+    threads = [start(scheduler, send, "first", BACKGROUND)]
+    wait_until(lambda: send.started == ["first"])
+
+    threads.append(start(scheduler, send, "background", BACKGROUND))
+    wait_until(lambda: len(scheduler._waiting) == 1)
+    threads.append(start(scheduler, send, "interactive", INTERACTIVE))
+    wait_until(lambda: len(scheduler._waiting) == 2)
+
+    send.release.set()
+    for thread in threads:
+        thread.join(2)
+    assert send.started == ["first", "interactive", "background"]
+
+def test_background_decorator_sets_priority():
+    seen = []
+
+    @background
+    def prefetch():
+        seen.append(request_scheduler.scheduler.current_priority())
+
+    prefetch()
+    assert seen == [BACKGROUND]
+    assert request_scheduler.scheduler.current_priority() == INTERACTIVE
+
+def test_carry_priority_runs_on_another_thread_at_the_callers():
+    seen = []
+
+    def batch():
+        seen.append(request_scheduler.scheduler.current_priority())
+
+    with request_scheduler.scheduler.priority(BACKGROUND):
+        task = carry_priority(batch)
+    thread = threading.Thread(target=task)
+    thread.start()
+    thread.join(2)
+    assert seen == [BACKGROUND]
+
+@pytest.mark.parametrize("writers", [1, 4])
+def test_concurrent_first_writes_do_not_deadlock(monkeypatch, writers):
+    # Each fresh context fetches a form digest before its first write. That
+    # /contextinfo request is scheduled too, so it must not need a second
+    # slot while the write holds one
+    import sharepoint_session
+    import sharepoint_utils
+    from benchmarks.mock_sharepoint import MockSharePoint
+    from benchmarks.run import BenchmarkSession
+
+    monkeypatch.setattr(sharepoint_session, "scheduler", RequestScheduler(max_in_flight=writers, reserved_interactive=0))
+    barrier = threading.Barrier(writers)
+    finished = []
+
+    def write(session, item_id):
+        barrier.wait(2)
+        sharepoint_utils.update_sharepoint_item(session, "Inventory", item_id, {"Location": "Library"})
+        finished.append(item_id)
+
+    with MockSharePoint(inventory_size=10, ticket_count=1, latency=0.05) as mock:
+        session = BenchmarkSession(mock.url)
+        threads = [threading.Thread(target=write, args=(session, item_id), daemon=True)
+                   for item_id in range(1, writers + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+    assert sorted(finished) == list(range(1, writers + 1))
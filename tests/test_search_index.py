@@ -0,0 +1,39 @@
+import threading
+from search_index import InventorySearchIndex
+
+def item(item_id, **fields):
+    return dict({"ID": item_id}, **fields)
+
+def test_exact_field_search_ranks_exact_then_prefix():
+    index = InventorySearchIndex()
+    index.build([item(1, Location="Room 10"), item(2, Location="Back room 1"), item(3, Location="Room 1"),
+                 item(4, Location="Library")])
+    assert index.search("Location", "room 1") == [3, 1, 2]
+
+def test_snapshot_is_in_id_order():
+    index = InventorySearchIndex()
+    index.build([item(3, Item="Laptop"), item(1, Item="Monitor")])
+    index.update([item(2, Item="Dock")], deleted_ids=[3])
+    assert [entry["ID"] for entry in index.snapshot()] == [1, 2]
+
+def test_search_while_items_change():
+    index = InventorySearchIndex()
+    index.build([item(item_id, Item=f"Laptop {item_id}") for item_id in range(1, 500)])
+    stop = threading.Event()
+
+    def churn():
+        # What a sync does: replace and delete items while searches run
+        while not stop.is_set():
+            index.update([item(item_id, Item=f"Laptop {item_id}") for item_id in range(1, 250)],
+                         deleted_ids=range(250, 500))
+            index.update([item(item_id, Item=f"Laptop {item_id}") for item_id in range(250, 500)])
+
+    thread = threading.Thread(target=churn, daemon=True)
+    thread.start()
+    try:
+        for _ in range(200):
+            assert all(entry["Item"].startswith("Laptop") for entry in index.snapshot())
+            index.search("Item", "laptop 1")
+    finally:
+        stop.set()
+        thread.join(2)
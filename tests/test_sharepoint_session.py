@@ -0,0 +1,78 @@
+import gc
+import threading
+from office365.runtime.auth.authentication_context import AuthenticationContext
+import sharepoint_utils
+from benchmarks.mock_sharepoint import MockSharePoint
+from benchmarks.run import BenchmarkToken
+from sharepoint_session import SharePointSession, ThreadLocalPool
+
+def in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join(2)
+    gc.collect()
+    return result[0]
+
+class Resource:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_threads_reuse_what_ended_threads_gave_back():
+    pool = ThreadLocalPool(Resource, Resource.close)
+    first = in_thread(pool.get)
+    assert in_thread(pool.get) is first
+    assert not first.closed
+    # A thread keeps its own while it runs
+    assert pool.get() is pool.get()
+
+def test_discarded_and_reset_objects_are_closed():
+    pool = ThreadLocalPool(Resource, Resource.close)
+    discarded = pool.get()
+    pool.discard()
+    assert discarded.closed
+    current = pool.get()
+    assert current is not discarded
+
+    idle = in_thread(pool.get)
+    pool.reset()
+    assert idle.closed
+    # The one in use is replaced, and closed, when its thread next asks
+    assert not current.closed
+    assert pool.get() is not current
+    gc.collect()
+    assert current.closed
+
+def test_unfit_objects_are_not_reused():
+    pool = ThreadLocalPool(Resource, Resource.close, reusable=lambda resource: False)
+    first = in_thread(pool.get)
+    assert first.closed
+    assert in_thread(pool.get) is not first
+
+def test_bulk_updates_reuse_contexts_and_their_digests():
+    with MockSharePoint(inventory_size=200, ticket_count=1) as mock:
+        digests = []
+        route = mock.route
+
+        def counting_route(method, target, body, headers):
+            if target.lower().endswith("/_api/contextinfo"):
+                digests.append(target)
+            return route(method, target, body, headers)
+
+        mock.route = counting_route
+        session = SharePointSession(mock.url, "bench@example.org", "")
+        session._auth_context = AuthenticationContext(mock.url)
+        session._auth_context.with_access_token(lambda: BenchmarkToken())
+        session._expires_at = float("inf")
+
+        updates = {item_id: {"Location": "Library"} for item_id in range(1, 201)}
+        for _ in range(3):
+            assert sharepoint_utils.update_sharepoint_items(session, "Inventory", updates,
+                                                            batch_size=50, max_workers=4) == {}
+            gc.collect()
+        # One digest per pooled context, not one per executor thread per call
+        assert len(digests) <= 4
+        session.close()
@@ -0,0 +1,150 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from inventory_cache import cache_path
+from list_schema import ticket_schema
+
+logger = logging.getLogger(__name__)
+
+tickets_list_name = "Tickets"
+# Tickets in any other status (or none yet) are open
+closed_statuses = ("Closed", "Resolved")
+
+# Display name -> cache column
+columns = {field.display_name: field.cache_column for field in ticket_schema.fields}
+columns["ETag"] = "etag"
+
+_open_clause = f"(t.status IS NULL OR t.status NOT IN ({', '.join('?' for _ in closed_statuses)}))"
+
+class TicketStore:
+    """On-disk copy of the Tickets list, kept in the inventory cache's
+    database so tickets can be joined to their items. Delta syncs by Modified
+    keep it current, and open-ticket counts per item or location are indexed
+    queries here instead of scans of the list."""
+
+    def __init__(self, path=cache_path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            column_defs = ", ".join(f"{column} {'INTEGER' if column == 'item_id' else 'TEXT'}"
+                                    for column in columns.values())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS tickets (id INTEGER PRIMARY KEY, {column_defs})")
+            conn.execute("CREATE INDEX IF NOT EXISTS tickets_item ON tickets (item_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call keeps the store usable from sync threads
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _has_items(self, conn):
+        # The items table belongs to InventoryCache and may not exist yet
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items'").fetchone() is not None
+
+    def _row_to_ticket(self, row):
+        ticket = {"ID": row[0]}
+        for display_name, value in zip(columns, row[1:]):
+            ticket[display_name] = "" if value is None else value
+        # Name and location of the linked item, from the inventory cache
+        ticket["Item"] = row[len(columns) + 1] or ""
+        ticket["Location"] = row[len(columns) + 2] or ""
+        return ticket
+
+    def tickets(self, item_id=None, open_only=True):
+        where = []
+        params = []
+        if item_id is not None:
+            where.append("t.item_id = ?")
+            params.append(int(item_id))
+        if open_only:
+            where.append(_open_clause)
+            params.extend(closed_statuses)
+        where = f"WHERE {' AND '.join(where)}" if where else ""
+
+        selected = ", ".join(f"t.{column}" for column in columns.values())
+        with self._connect() as conn:
+            if self._has_items(conn):
+                source = "tickets t LEFT JOIN items i ON i.id = t.item_id"
+                extra = "i.item, i.location"
+            else:
+                source = "tickets t"
+                extra = "NULL, NULL"
+            rows = conn.execute(f"SELECT t.id, {selected}, {extra} FROM {source} {where} ORDER BY t.id DESC",
+                                params).fetchall()
+        return [self._row_to_ticket(row) for row in rows]
+
+    def open_count(self, item_id):
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM tickets t WHERE t.item_id = ? AND {_open_clause}",
+                                [int(item_id), *closed_statuses]).fetchone()[0]
+
+    def open_counts_by_item(self):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT t.item_id, COUNT(*) FROM tickets t "
+                                f"WHERE t.item_id IS NOT NULL AND {_open_clause} GROUP BY t.item_id",
+                                closed_statuses).fetchall()
+        return dict(rows)
+
+    def open_counts_by_location(self):
+        # [(location, count)], busiest first; tickets without an item are left out
+        with self._connect() as conn:
+            if not self._has_items(conn):
+                return []
+            rows = conn.execute(f"SELECT COALESCE(i.location, ''), COUNT(*) FROM tickets t "
+                                f"JOIN items i ON i.id = t.item_id WHERE {_open_clause} "
+                                f"GROUP BY i.location ORDER BY COUNT(*) DESC, i.location",
+                                closed_statuses).fetchall()
+        return rows
+
+    def get_state(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _to_row(self, ticket):
+        row = [int(ticket["ID"])]
+        for display_name, column in columns.items():
+            value = ticket.get(display_name)
+            if column == "item_id":
+                row.append(int(value) if value not in ("", None) else None)
+            else:
+                row.append(None if value is None else str(value))
+        return row
+
+    def upsert_tickets(self, tickets):
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO tickets (id, {', '.join(columns.values())}) VALUES ({placeholders})",
+                             [self._to_row(ticket) for ticket in tickets])
+
+    def apply_changes(self, changed_tickets, current_ids, modified):
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO tickets (id, {', '.join(columns.values())}) VALUES ({placeholders})",
+                             [self._to_row(ticket) for ticket in changed_tickets])
+
+            cached_ids = {row[0] for row in conn.execute("SELECT id FROM tickets")}
+            deleted_ids = cached_ids - {int(ticket_id) for ticket_id in current_ids}
+            conn.executemany("DELETE FROM tickets WHERE id = ?", [(ticket_id,) for ticket_id in deleted_ids])
+
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('tickets_modified', ?)", (modified,))
+        logger.debug(f"Ticket sync: {len(changed_tickets)} changed, {len(deleted_ids)} deleted")
+        return len(changed_tickets), len(deleted_ids)
+
+    def sync(self, session, list_name=tickets_list_name):
+        from sharepoint_utils import get_sharepoint_list_changes
+        modified_since = self.get_state("tickets_modified")
+        changed_tickets, current_ids, modified = get_sharepoint_list_changes(session, list_name, modified_since,
+                                                                             schema=ticket_schema)
+        return self.apply_changes(changed_tickets, current_ids, modified)
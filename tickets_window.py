@@ -0,0 +1,150 @@
+import logging
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QMessageBox)
+from PyQt6.QtCore import pyqtSignal, Qt
+from PyQt6.QtGui import QColor, QPalette, QFont
+from workers import JobRunner
+
+logger = logging.getLogger(__name__)
+
+class TicketsWindow(QWidget):
+    """Tickets from the local ticket store, either all of them or those
+    linked to one item. The store answers at once; a refresh pulls only the
+    tickets changed since the last one."""
+
+    item_selected = pyqtSignal(int)
+
+    headers = ["ID", "Title", "Priority", "Status", "Reported By", "Item", "Location", "Created"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.session = None
+        self.store = None
+        self.user_directory = None
+        self.item_id = None
+        self.rows = []
+        self.jobs = JobRunner(self)
+        self.jobs.busy_changed.connect(self.set_busy)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Tickets")
+        self.setFixedSize(800, 600)
+
+        # Set default font for the entire widget
+        self.setFont(QFont("Arial", 14))
+
+        # Set background color
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QPalette.ColorRole.Window, QColor("#f0f0f0"))
+        self.setPalette(palette)
+
+        layout = QVBoxLayout()
+
+        header_layout = QHBoxLayout()
+        self.heading = QLabel("All Tickets")
+        header_layout.addWidget(self.heading)
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItems(["Open", "All"])
+        self.filter_combo.currentIndexChanged.connect(self.reload)
+        header_layout.addWidget(self.filter_combo)
+        layout.addLayout(header_layout)
+
+        self.table = QTableWidget(0, len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.doubleClicked.connect(self.open_item)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(self.refresh)
+        button_layout.addWidget(self.refresh_button)
+        self.back_button = QPushButton("Back")
+        self.back_button.clicked.connect(self.go_back)
+        button_layout.addWidget(self.back_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def set_session(self, session):
+        self.session = session
+
+    def set_store(self, store):
+        self.store = store
+
+    def set_user_directory(self, user_directory):
+        self.user_directory = user_directory
+
+    def show_all(self):
+        self.item_id = None
+        self.heading.setText("All Tickets")
+        self.reload()
+        self.refresh()
+
+    def show_item(self, item_id):
+        self.item_id = int(item_id)
+        self.heading.setText(f"Tickets for item {self.item_id}")
+        self.reload()
+        self.refresh()
+
+    def reload(self):
+        # Local queries only, so this is safe to run on every change
+        if self.store is None:
+            return
+        open_only = self.filter_combo.currentText() == "Open"
+        self.rows = self.store.tickets(self.item_id, open_only)
+        if self.item_id is not None and self.rows and self.rows[0]["Item"]:
+            self.heading.setText(f"Tickets for {self.rows[0]['Item']}")
+
+        self.table.setRowCount(len(self.rows))
+        for row, ticket in enumerate(self.rows):
+            reported_by = ticket["Reported By"]
+            if self.user_directory is not None:
+                reported_by = self.user_directory.display(reported_by)
+            values = [ticket["ID"], ticket["Title"], ticket["Priority"], ticket["Status"] or "Open",
+                      reported_by, ticket["Item"] or ticket["Inventory Item"], ticket["Location"], ticket["Created"]]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+
+        if self.item_id is None:
+            counts = self.store.open_counts_by_location()
+            summary = ", ".join(f"{location or 'No location'} ({count})" for location, count in counts)
+            self.summary_label.setText(f"Open by location: {summary}" if summary else "No open tickets.")
+        else:
+            self.summary_label.setText(f"{self.store.open_count(self.item_id)} open ticket(s) for this item.")
+
+    def refresh(self):
+        if self.session is None or self.store is None:
+            return
+        self.jobs.submit("refresh", self.store.sync, self.session,
+                         on_result=lambda _: self.reload(),
+                         on_error=lambda e: QMessageBox.warning(self, "Error", f"Could not refresh tickets: {str(e)}"))
+
+    def open_item(self, index):
+        item_id = self.rows[index.row()]["Inventory Item"]
+        if item_id:
+            self.item_selected.emit(int(item_id))
+
+    def set_busy(self, busy):
+        self.refresh_button.setEnabled(not busy)
+        if busy:
+            self.setCursor(Qt.CursorShape.BusyCursor)
+        else:
+            self.unsetCursor()
+
+    def go_back(self):
+        main_window = self.window()
+        if self.item_id is not None and hasattr(main_window, 'show_item_dashboard_with_item'):
+            main_window.show_item_dashboard_with_item(self.item_id)
+        elif hasattr(main_window, 'show_home'):
+            main_window.show_home()
+        else:
+            print("Error: MainWindow does not have a show_home method")
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+from inventory_cache import cache_dir
+
+logger = logging.getLogger(__name__)
+
+users_path = os.path.join(cache_dir, "site_users.json")
+
+class UserDirectory:
+    """Site users, loaded from disk at startup and refreshed in the background
+    after login, so person fields can be shown and entered by name without a
+    lookup round trip."""
+
+    def __init__(self, path=users_path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.by_id = {}
+        self._by_key = {}
+        try:
+            with open(path) as f:
+                self._index(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def _index(self, users):
+        by_id = {}
+        by_key = {}
+        for user in users:
+            by_id[int(user["id"])] = user
+            for key in (user.get("name"), user.get("email"), user.get("login")):
+                if key:
+                    by_key.setdefault(key.lower(), []).append(user)
+        with self._lock:
+            self.by_id = by_id
+            self._by_key = by_key
+
+    def refresh(self, session):
+        from sharepoint_utils import get_site_users
+        users = get_site_users(session)
+        self._index(users)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(users, f)
+        os.replace(temp_path, self.path)
+        return len(users)
+
+    def names(self):
+        return sorted(user["name"] for user in self.by_id.values() if user.get("name"))
+
+    def display(self, user_id):
+        # Name for a stored user ID, or the ID itself if the user is unknown
+        if user_id in ("", None):
+            return ""
+        try:
+            user = self.by_id.get(int(user_id))
+        except (TypeError, ValueError):
+            return str(user_id)
+        return user["name"] if user else str(user_id)
+
+    def resolve(self, text):
+        """User ID for a name, email, login or raw ID. Returns None for an
+        empty value and raises ValueError if the text is unknown or ambiguous."""
+        text = str(text).strip()
+        if not text:
+            return None
+        if text.isdigit():
+            return int(text)
+
+        with self._lock:
+            matches = self._by_key.get(text.lower())
+            if not matches:
+                # Accept an unambiguous prefix of a name or email
+                matches = [user for key, users in self._by_key.items() if key.startswith(text.lower()) for user in users]
+        unique = {user["id"]: user for user in matches or []}
+        if len(unique) == 1:
+            return int(next(iter(unique)))
+        if not unique:
+            raise ValueError(f"No site user matches '{text}'.")
+        raise ValueError(f"'{text}' matches several users: {', '.join(sorted(user['name'] for user in unique.values()))}")
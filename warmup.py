@@ -0,0 +1,30 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def _run_stage(name, fn):
+    started = time.perf_counter()
+    try:
+        with metrics.timed(f"warmup_{name}"):
+            result = fn()
+        return name, time.perf_counter() - started, result, None
+    except Exception as e:
+        logger.warning(f"Warm-up stage {name} failed: {str(e)}")
+        return name, time.perf_counter() - started, None, e
+
+def warm_up(stages, max_workers=4):
+    """Run the post-login stages (name -> callable taking no arguments) at
+    the same time, at most max_workers at once. Returns name -> (seconds,
+    result, error); a failed stage doesn't stop the others."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_stage, name, fn) for name, fn in stages.items()]
+        results = {name: (seconds, result, error)
+                   for name, seconds, result, error in (future.result() for future in futures)}
+    timings = ", ".join(f"{name} {seconds * 1000:.0f} ms{' (failed)' if error else ''}"
+                        for name, (seconds, _, error) in results.items())
+    logger.info(f"Warm-up: {timings}; {(time.perf_counter() - started) * 1000:.0f} ms in all")
+    return results
@@ -0,0 +1,110 @@
+import logging
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+class WorkerSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    progress = pyqtSignal(object)
+    done = pyqtSignal()
+
+class Worker(QRunnable):
+    """Runs one blocking call (usually a sharepoint_utils function) on the
+    thread pool. A cancelled worker either never starts or has its result
+    dropped; a request already on the wire can't be interrupted."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            if self.cancelled:
+                return
+            try:
+                result = self.fn(*self.args, **self.kwargs)
+            except Exception as e:
+                if not self.cancelled:
+                    logger.error(f"Background job {self.fn.__name__} failed: {str(e)}")
+                    self.signals.error.emit(e)
+                return
+            if not self.cancelled:
+                self.signals.result.emit(result)
+        finally:
+            self.signals.done.emit()
+
+class JobRunner(QObject):
+    """Submits jobs for one screen. A job submitted under a key supersedes the
+    previous job with that key, so a rapid Next click or a new search never
+    shows stale results. busy_changed drives the screen's busy state."""
+
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.jobs = {}
+        # Workers keep a Python reference until they finish, even if cancelled
+        self.running = set()
+        self.busy = False
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_progress=None, **kwargs):
+        self.cancel(key, update_busy=False)
+
+        worker = Worker(fn, *args, **kwargs)
+        if on_progress is not None:
+            # fn reports progress through a progress= callback, delivered on the GUI thread
+            worker.kwargs["progress"] = worker.signals.progress.emit
+            worker.signals.progress.connect(lambda value: None if worker.cancelled else on_progress(value))
+        # Re-check on delivery: a job can be superseded after it emitted
+        if on_result is not None:
+            worker.signals.result.connect(lambda result: None if worker.cancelled else on_result(result))
+        if on_error is not None:
+            worker.signals.error.connect(lambda error: None if worker.cancelled else on_error(error))
+        worker.signals.done.connect(lambda: self.job_done(key, worker))
+
+        self.jobs[key] = worker
+        self.running.add(worker)
+        self.pool.start(worker)
+        self.update_busy()
+        return worker
+
+    def cancel(self, key, update_busy=True):
+        worker = self.jobs.pop(key, None)
+        if worker is None:
+            return
+        worker.cancel()
+        if self.pool.tryTake(worker):
+            # Never started, so it won't report done by itself
+            self.running.discard(worker)
+        if update_busy:
+            self.update_busy()
+
+    def cancel_all(self):
+        for key in list(self.jobs):
+            self.cancel(key)
+
+    def job_done(self, key, worker):
+        self.running.discard(worker)
+        if self.jobs.get(key) is worker:
+            del self.jobs[key]
+            self.update_busy()
+
+    def update_busy(self):
+        # Superseded jobs still running in the background don't count as busy
+        busy = bool(self.jobs)
+        if busy != self.busy:
+            self.busy = busy
+            self.busy_changed.emit(busy)
+
+    def is_running(self, key):
+        return key in self.jobs